@@ -4,10 +4,11 @@
 不需要交互，直接显示所有用户信息
 """
 
+import argparse
 import sys
 import os
 import asyncio
-from datetime import datetime
+from typing import Optional
 
 # 添加后端路径
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src', 'backend'))
@@ -19,8 +20,8 @@ except ImportError as e:
     print("请确保在 MatterAI_Agent 项目根目录运行此脚本")
     sys.exit(1)
 
-async def list_all_users():
-    """列出所有用户"""
+async def list_all_users(verified: Optional[bool] = None, admin: Optional[bool] = None, limit: Optional[int] = None):
+    """列出所有用户（按页从数据库读取，边读边输出）"""
     print("🔍 MatterAI Agent 用户列表")
     print("="*80)
     
@@ -29,36 +30,25 @@ async def list_all_users():
         await db_manager.initialize()
         print("✅ 数据库连接成功\n")
         
-        # 查询所有用户
-        query = """
-        SELECT id, name, email, is_admin, email_verified, verification_email, created_at, updated_at
-        FROM users 
-        ORDER BY created_at DESC;
-        """
-        
-        async with db_manager.pool.acquire() as connection:
-            results = await connection.fetch(query)
-        
-        if not results:
-            print("📭 数据库中暂无用户")
-            return
-        
-        print(f"📊 共找到 {len(results)} 个用户:\n")
-        
         # 表头
         print(f"{'序号':<4} {'姓名':<20} {'邮箱':<30} {'状态':<15} {'注册时间':<20}")
         print("-" * 95)
         
         # 用户信息
-        for i, user in enumerate(results, 1):
+        i = 0
+        async for user in db_manager.iter_users(verified=verified, admin=admin):
+            if limit is not None and i >= limit:
+                print(f"     ... 仅显示前 {limit} 个用户")
+                break
+            i += 1
             # 格式化状态
             status_parts = []
-            if user['is_admin']:
+            if user['isAdmin']:
                 status_parts.append("👑管理员")
             else:
                 status_parts.append("👤用户")
             
-            if user['email_verified']:
+            if user['emailVerified']:
                 status_parts.append("✅已验证")
             else:
                 status_parts.append("❌未验证")
@@ -66,7 +56,7 @@ async def list_all_users():
             status = " ".join(status_parts)
             
             # 格式化时间
-            created_time = user['created_at'].strftime("%Y-%m-%d %H:%M")
+            created_time = user['createdAt'].strftime("%Y-%m-%d %H:%M")
             
             # 截断长文本
             name = user['name'][:18] + ".." if len(user['name']) > 20 else user['name']
@@ -75,10 +65,14 @@ async def list_all_users():
             print(f"{i:<4} {name:<20} {email:<30} {status:<15} {created_time:<20}")
             
             # 如果有绑定中的邮箱，显示在下一行
-            if user['verification_email']:
-                print(f"     {'→ 绑定中:':<20} {user['verification_email']:<30}")
+            if user['verificationEmail']:
+                print(f"     {'→ 绑定中:':<20} {user['verificationEmail']:<30}")
         
         print("-" * 95)
+        if i == 0:
+            print("📭 没有符合条件的用户")
+        else:
+            print(f"📊 共显示 {i} 个用户")
         print(f"\n💡 使用完整管理工具: python user_management_debug.py")
         
     except Exception as e:
@@ -91,9 +85,21 @@ async def list_all_users():
         except:
             pass
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="快速查看用户列表")
+    parser.add_argument("--verified", choices=["yes", "no"], help="只显示已验证 / 未验证的用户")
+    parser.add_argument("--admin", choices=["yes", "no"], help="只显示管理员 / 普通用户")
+    parser.add_argument("--limit", type=int, help="最多显示的用户数")
+    args = parser.parse_args()
+    
+    def flag(value):
+        return None if value is None else value == "yes"
+    
+    return flag(args.verified), flag(args.admin), args.limit
+
 if __name__ == "__main__":
     try:
-        asyncio.run(list_all_users())
+        asyncio.run(list_all_users(*parse_args()))
     except KeyboardInterrupt:
         print("\n👋 程序被中断")
     except Exception as e:
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Session Archival Script for MatterAI Agent
+Moves sessions that have been idle for N days into cold storage.
+- Events (and compaction snapshots) go to one zstd blob per session (local disk or S3-compatible)
+- The sessions row is kept as a stub, archived sessions are restored when opened
+- Runs in batches with progress reporting; safe to interrupt and re-run
+"""
+
+import asyncio
+import sys
+import os
+import time
+
+# Add the current directory to Python path to import database module
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from database import DB_CONFIG
+from async_session_service import AsyncDatabaseSessionService
+from session_archive import SESSION_ARCHIVE_BACKEND, SESSION_ARCHIVE_IDLE_DAYS, SessionArchiver
+from session_compaction import SessionCompactor
+
+class SessionArchivalJob:
+    def __init__(self, idle_days: int, batch_size: int = 100):
+        self.idle_days = idle_days
+        self.batch_size = batch_size
+        database_url = f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
+        self.storage = AsyncDatabaseSessionService(database_url)
+        self.archiver = SessionArchiver(self.storage)
+
+    async def run(self):
+        """Archive idle sessions batch by batch"""
+        print("🚀 Starting session archival process...")
+
+        try:
+            await self.storage.initialize()
+            # The snapshot table must exist since archives include compaction snapshots
+            await SessionCompactor(self.storage).initialize()
+            await self.archiver.initialize()
+
+            total = await self.archiver.count_idle_sessions(self.idle_days)
+            print(f"📊 Archival Summary:")
+            print(f"   Idle threshold: {self.idle_days} days")
+            print(f"   Sessions to archive: {total}")
+            print(f"   Archive backend: {SESSION_ARCHIVE_BACKEND}")
+
+            if not total:
+                print("✅ No idle sessions to archive")
+                return
+
+            archived = 0
+            skipped = 0
+            failed = set()
+            events = 0
+            raw_bytes = 0
+            archived_bytes = 0
+            started = time.time()
+            batch_number = 0
+
+            while True:
+                candidates = [
+                    c for c in await self.archiver.find_idle_sessions(self.idle_days, self.batch_size + len(failed))
+                    if c not in failed
+                ][:self.batch_size]
+                if not candidates:
+                    break
+                batch_number += 1
+
+                for app_name, user_id, session_id in candidates:
+                    try:
+                        record = await self.archiver.archive_session(app_name, user_id, session_id)
+                    except Exception as e:
+                        print(f"❌ Failed to archive session {session_id}: {e}")
+                        failed.add((app_name, user_id, session_id))
+                        continue
+                    if record is None:
+                        print(f"⚠️ Skipping session that became active: {session_id}")
+                        failed.add((app_name, user_id, session_id))
+                        skipped += 1
+                        continue
+                    archived += 1
+                    events += record.event_count
+                    raw_bytes += record.raw_bytes
+                    archived_bytes += record.archived_bytes
+
+                elapsed = time.time() - started
+                print(f"📝 Batch {batch_number}: {archived}/{total} sessions archived "
+                      f"({events} events, {archived / elapsed if elapsed else 0:.1f} sessions/s)")
+
+            ratio = raw_bytes / archived_bytes if archived_bytes else 0
+            print(f"✅ Archival completed successfully!")
+            print(f"   Sessions archived: {archived}")
+            print(f"   Sessions skipped (active): {skipped}")
+            print(f"   Sessions failed: {len(failed) - skipped}")
+            print(f"   Events moved: {events}")
+            print(f"   Size: {raw_bytes / 1024 / 1024:.1f} MB -> {archived_bytes / 1024 / 1024:.1f} MB (x{ratio:.1f})")
+
+        except Exception as e:
+            print(f"❌ Archival failed: {e}")
+            raise
+        finally:
+            await self.storage.close()
+
+async def main():
+    """Main entry point"""
+    # Get idle days and batch size from command line or use defaults
+    try:
+        idle_days = int(sys.argv[1]) if len(sys.argv) > 1 else SESSION_ARCHIVE_IDLE_DAYS
+        batch_size = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    except ValueError:
+        print("Usage: python archive_sessions.py [idle_days] [batch_size]")
+        sys.exit(1)
+
+    print(f"🎯 Archiving sessions idle for more than {idle_days} days")
+
+    # Confirm archival
+    response = input("⚠️ This will move session events out of the database. Continue? (y/N): ")
+    if response.lower() != 'y':
+        print("❌ Archival cancelled")
+        sys.exit(0)
+
+    job = SessionArchivalJob(idle_days, batch_size)
+    await job.run()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,322 @@
+"""
+Async-native session storage for MatterAI Agent
+Same tables and semantics as ADK's DatabaseSessionService, but every query runs on an
+async SQLAlchemy engine (asyncpg), so loading one user's history never blocks the event loop.
+"""
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, List, Optional
+
+from dotenv import load_dotenv
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+from google.adk.sessions.database_session_service import (
+    Base,
+    StorageAppState,
+    StorageEvent,
+    StorageSession,
+    StorageUserState,
+    _extract_state_delta,
+    _merge_state,
+)
+from sqlalchemy import Index, delete, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
+
+from database import DB_POOL_CONFIG
+from session_store import (
+    RECENT_SESSIONS_INDEX,
+    SESSION_HISTORY_PAGE_EVENTS,
+    SessionKey,
+    SessionVersion,
+    StaleSessionError,
+    collect_state_deltas,
+    recent_sessions_query,
+)
+
+load_dotenv()
+
+# Session storage pool configuration (defaults follow the auth pool settings)
+SESSION_DB_POOL_SIZE = int(os.getenv("SESSION_DB_POOL_SIZE", str(DB_POOL_CONFIG['min_size'])))
+SESSION_DB_MAX_OVERFLOW = int(
+    os.getenv("SESSION_DB_MAX_OVERFLOW", str(max(DB_POOL_CONFIG['max_size'] - DB_POOL_CONFIG['min_size'], 0)))
+)
+SESSION_DB_POOL_TIMEOUT = float(os.getenv("SESSION_DB_POOL_TIMEOUT", str(DB_POOL_CONFIG['acquire_timeout'])))
+SESSION_DB_STATEMENT_TIMEOUT_MS = int(
+    os.getenv("SESSION_DB_STATEMENT_TIMEOUT_MS", str(DB_POOL_CONFIG['statement_timeout_ms']))
+)
+
+
+def to_async_url(db_url: str) -> str:
+    """postgresql://... -> postgresql+asyncpg://..."""
+    scheme, sep, rest = db_url.partition("://")
+    if scheme in ("postgresql", "postgres", "postgresql+psycopg2"):
+        return f"postgresql+asyncpg{sep}{rest}"
+    return db_url
+
+
+class AsyncDatabaseSessionService(BaseSessionService):
+    """Session service on an async SQLAlchemy engine, drop-in for VersionedDatabaseSessionService"""
+
+    def __init__(
+        self,
+        db_url: str,
+        pool_size: int = SESSION_DB_POOL_SIZE,
+        max_overflow: int = SESSION_DB_MAX_OVERFLOW,
+        pool_timeout: float = SESSION_DB_POOL_TIMEOUT,
+        statement_timeout_ms: int = SESSION_DB_STATEMENT_TIMEOUT_MS,
+    ):
+        async_url = to_async_url(db_url)
+        connect_args = {}
+        if async_url.startswith("postgresql+asyncpg"):
+            connect_args["server_settings"] = {"statement_timeout": str(statement_timeout_ms)}
+        self.db_engine: AsyncEngine = create_async_engine(
+            async_url,
+            pool_size=pool_size,
+            max_overflow=max_overflow,
+            pool_timeout=pool_timeout,
+            pool_pre_ping=True,
+            connect_args=connect_args,
+        )
+        self.session_factory = async_sessionmaker(self.db_engine, expire_on_commit=False)
+
+    async def initialize(self):
+        """Create ADK's session tables (and our per-session events index) if they don't exist"""
+        async with self.db_engine.begin() as connection:
+            await connection.run_sync(Base.metadata.create_all)
+            await connection.run_sync(
+                lambda sync_connection: Index(
+                    "idx_events_session_time",
+                    StorageEvent.app_name, StorageEvent.user_id, StorageEvent.session_id, StorageEvent.timestamp,
+                ).create(sync_connection, checkfirst=True)
+            )
+            await connection.run_sync(
+                lambda sync_connection: RECENT_SESSIONS_INDEX.create(sync_connection, checkfirst=True)
+            )
+        print(f"✅ Async session storage initialized (pool_size={self.db_engine.pool.size()}, "
+              f"max_overflow={self.db_engine.pool._max_overflow})")
+
+    async def close(self):
+        await self.db_engine.dispose()
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        async with self.session_factory() as sql_session:
+            storage_app_state = await sql_session.get(StorageAppState, (app_name))
+            storage_user_state = await sql_session.get(StorageUserState, (app_name, user_id))
+
+            app_state = storage_app_state.state if storage_app_state else {}
+            user_state = storage_user_state.state if storage_user_state else {}
+
+            if not storage_app_state:
+                storage_app_state = StorageAppState(app_name=app_name, state={})
+                sql_session.add(storage_app_state)
+            if not storage_user_state:
+                storage_user_state = StorageUserState(app_name=app_name, user_id=user_id, state={})
+                sql_session.add(storage_user_state)
+
+            app_state_delta, user_state_delta, session_state = _extract_state_delta(state)
+            app_state.update(app_state_delta)
+            user_state.update(user_state_delta)
+            if app_state_delta:
+                storage_app_state.state = app_state
+            if user_state_delta:
+                storage_user_state.state = user_state
+
+            storage_session = StorageSession(app_name=app_name, user_id=user_id, id=session_id, state=session_state)
+            sql_session.add(storage_session)
+            await sql_session.commit()
+            await sql_session.refresh(storage_session)
+
+            merged_state = _merge_state(app_state, user_state, session_state)
+            return storage_session.to_session(state=merged_state)
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        async with self.session_factory() as sql_session:
+            storage_session = await sql_session.get(StorageSession, (app_name, user_id, session_id))
+            if storage_session is None:
+                return None
+
+            query = (
+                select(StorageEvent)
+                .where(
+                    StorageEvent.app_name == app_name,
+                    StorageEvent.user_id == user_id,
+                    StorageEvent.session_id == session_id,
+                )
+                .order_by(StorageEvent.timestamp.desc())
+            )
+            if config and config.after_timestamp:
+                query = query.where(StorageEvent.timestamp >= datetime.fromtimestamp(config.after_timestamp))
+            if config and config.num_recent_events:
+                query = query.limit(config.num_recent_events)
+            storage_events = (await sql_session.execute(query)).scalars().all()
+
+            storage_app_state = await sql_session.get(StorageAppState, (app_name))
+            storage_user_state = await sql_session.get(StorageUserState, (app_name, user_id))
+            app_state = storage_app_state.state if storage_app_state else {}
+            user_state = storage_user_state.state if storage_user_state else {}
+
+            merged_state = _merge_state(app_state, user_state, storage_session.state)
+            events = [e.to_event() for e in reversed(storage_events)]
+            return storage_session.to_session(state=merged_state, events=events)
+
+    async def iter_session_events(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        after: Optional[float] = None,
+        page_size: int = SESSION_HISTORY_PAGE_EVENTS,
+    ) -> AsyncIterator[List[Event]]:
+        """Keyset pages on (timestamp, id); no connection is held while a page is being consumed"""
+        async with self.session_factory() as sql_session:
+            if await sql_session.get(StorageSession, (app_name, user_id, session_id)) is None:
+                return
+        query = (
+            select(StorageEvent)
+            .where(
+                StorageEvent.app_name == app_name,
+                StorageEvent.user_id == user_id,
+                StorageEvent.session_id == session_id,
+            )
+            .order_by(StorageEvent.timestamp, StorageEvent.id)
+            .limit(page_size)
+        )
+        if after is not None:
+            query = query.where(StorageEvent.timestamp > datetime.fromtimestamp(after))
+        position = None
+        while True:
+            page_query = query
+            if position is not None:
+                page_query = query.where(tuple_(StorageEvent.timestamp, StorageEvent.id) > position)
+            async with self.session_factory() as sql_session:
+                rows = (await sql_session.execute(page_query)).scalars().all()
+            if rows or position is None:
+                yield [row.to_event() for row in rows]
+            if len(rows) < page_size:
+                return
+            position = (rows[-1].timestamp, rows[-1].id)
+
+    async def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        async with self.session_factory() as sql_session:
+            result = await sql_session.execute(
+                select(StorageSession).where(
+                    StorageSession.app_name == app_name,
+                    StorageSession.user_id == user_id,
+                )
+            )
+            return ListSessionsResponse(sessions=[s.to_session() for s in result.scalars().all()])
+
+    async def list_recent_sessions(self, *, app_name: str, user_id: str, limit: int) -> ListSessionsResponse:
+        """The user's most recently updated sessions, newest first, sorted and limited in the database"""
+        async with self.session_factory() as sql_session:
+            result = await sql_session.execute(recent_sessions_query(app_name, user_id, limit))
+            return ListSessionsResponse(sessions=[s.to_session() for s in result.scalars().all()])
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        async with self.session_factory() as sql_session:
+            await sql_session.execute(
+                delete(StorageSession).where(
+                    StorageSession.app_name == app_name,
+                    StorageSession.user_id == user_id,
+                    StorageSession.id == session_id,
+                )
+            )
+            await sql_session.commit()
+
+    async def delete_sessions(self, keys: List[SessionKey]) -> None:
+        """Delete many sessions and their events in one transaction"""
+        if not keys:
+            return
+        async with self.session_factory() as sql_session:
+            await sql_session.execute(
+                delete(StorageEvent).where(
+                    tuple_(StorageEvent.app_name, StorageEvent.user_id, StorageEvent.session_id).in_(keys)
+                )
+            )
+            await sql_session.execute(
+                delete(StorageSession).where(
+                    tuple_(StorageSession.app_name, StorageSession.user_id, StorageSession.id).in_(keys)
+                )
+            )
+            await sql_session.commit()
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        session.last_update_time = await self._write_events(session, [event], session.last_update_time)
+        # Also update the in-memory session
+        await super().append_event(session=session, event=event)
+        return event
+
+    async def append_events(self, session: Session, events: List[Event], last_update_time: float) -> float:
+        """
+        Persist several events of one session in a single transaction.
+        The in-memory session must already contain the events; returns the new storage update time.
+        """
+        return await self._write_events(session, events, last_update_time)
+
+    async def _write_events(self, session: Session, events: List[Event], last_update_time: float) -> float:
+        async with self.session_factory() as sql_session:
+            storage_session = await sql_session.get(StorageSession, (session.app_name, session.user_id, session.id))
+            if storage_session is None:
+                raise StaleSessionError(f"Session not found: {session.id}")
+            if storage_session.update_timestamp_tz > last_update_time:
+                raise StaleSessionError(f"Session {session.id} was modified by another writer, refusing stale write")
+
+            storage_app_state = await sql_session.get(StorageAppState, (session.app_name))
+            storage_user_state = await sql_session.get(StorageUserState, (session.app_name, session.user_id))
+            app_state = storage_app_state.state if storage_app_state else {}
+            user_state = storage_user_state.state if storage_user_state else {}
+            session_state = storage_session.state
+
+            app_state_delta, user_state_delta, session_state_delta = collect_state_deltas(events)
+            if app_state_delta:
+                app_state.update(app_state_delta)
+                storage_app_state.state = app_state
+            if user_state_delta:
+                user_state.update(user_state_delta)
+                storage_user_state.state = user_state
+            if session_state_delta:
+                session_state.update(session_state_delta)
+                storage_session.state = session_state
+
+            for event in events:
+                sql_session.add(StorageEvent.from_event(session, event))
+
+            await sql_session.commit()
+            await sql_session.refresh(storage_session)
+            return storage_session.update_timestamp_tz
+
+    async def get_session_version(self, *, app_name: str, user_id: str, session_id: str) -> Optional[SessionVersion]:
+        """Return (update_time, latest event id) of a session, None if it does not exist"""
+        async with self.session_factory() as sql_session:
+            storage_session = await sql_session.get(StorageSession, (app_name, user_id, session_id))
+            if storage_session is None:
+                return None
+            latest_event_id = (await sql_session.execute(
+                select(StorageEvent.id)
+                .where(
+                    StorageEvent.app_name == app_name,
+                    StorageEvent.user_id == user_id,
+                    StorageEvent.session_id == session_id,
+                )
+                .order_by(StorageEvent.timestamp.desc())
+                .limit(1)
+            )).scalar()
+            return storage_session.update_timestamp_tz, latest_event_id
@@ -1,9 +1,10 @@
 import uvicorn
 from fastapi import FastAPI
-from .auth_routes import router as auth_router
+from .auth_routes import router as auth_router, jwks_router
 
 app = FastAPI(title="认证 API 测试", description="用户认证系统的独立测试")
 app.include_router(auth_router)
+app.include_router(jwks_router)
 
 if __name__ == "__main__":
     print("启动认证 API 服务...")
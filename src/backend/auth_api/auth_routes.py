@@ -1,26 +1,64 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Body
-from fastapi.responses import RedirectResponse
+import csv
+import io
+import json
+import os
+import time
+import uuid
+from fastapi import APIRouter, HTTPException, Depends, status, Body, Query, Request
+from fastapi.responses import JSONResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 from auth_api.models import (
     UserCreate, UserLogin, UserPasswordChange, TokenResponse,
     SendVerificationCodeRequest, VerifyCodeRequest, 
-    RegisterWithVerificationRequest, PasswordResetRequest, EmailBindingRequest
+    RegisterWithVerificationRequest, PasswordResetRequest, EmailBindingRequest,
+    RefreshTokenRequest, LogoutRequest
 )
-from auth_api.user_utils import create_user, verify_user, change_password, get_user_by_email
+from auth_api.user_utils import create_user, verify_user, change_password, get_user_by_email, get_user_profile_by_email
 from auth_api.email_service import email_service
-
-# Secret key for JWT encoding/decoding - in production, use a secure environment variable
-SECRET_KEY = "your-secret-key-should-be-very-long-and-secure"
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 1 week
+from auth_api.token_cache import verified_token_cache
+from auth_api.rate_limit import auth_rate_limiter
+from auth_api.token_revocation import TokenRevocationFilter
+from auth_api.login_audit import login_audit
+from auth_api.jwt_keys import JWT_ALGORITHM, JWT_SECRET_KEY, JWTKeyRing
+from database import db_manager, decode_user_cursor, USER_LIST_DEFAULT_LIMIT, USER_LIST_MAX_LIMIT
+from request_coalescing import request_coalescer
+
+# Secret key for HS256 tokens (JWT_ALGORITHM=HS256, or legacy/SSO tokens with JWT_ACCEPT_HS256=true)
+SECRET_KEY = JWT_SECRET_KEY
+ALGORITHM = JWT_ALGORITHM
+# Signs with the current RS256 key and verifies every live key (see auth_api/jwt_keys.py)
+jwt_key_ring = JWTKeyRing(SECRET_KEY)
+# Maximum number of tokens per batch /verify request
+VERIFY_BATCH_LIMIT = 100
+# Access tokens are short-lived; clients renew them with a rotating refresh token via /auth/refresh
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "15"))
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
+
+# Revoked access tokens (logout, password change); also applied to cached verifications
+token_revocation = TokenRevocationFilter(ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+verified_token_cache.revocation_checks.append(token_revocation.is_revoked)
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
+# Unprefixed routes (mounted at the application root)
+jwks_router = APIRouter(tags=["Authentication"])
+
+
+@jwks_router.get("/.well-known/jwks.json")
+async def get_jwks(request: Request):
+    """Public keys for verifying access tokens (cached by clients, revalidated by ETag)"""
+    keys, etag = jwt_key_ring.jwks()
+    headers = {"Cache-Control": "public, max-age=300", "ETag": etag}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return JSONResponse(keys, headers=headers)
+
 @router.get("/debug/email-exists")
 async def debug_email_exists(email: str):
     """调试：检查邮箱是否存在（标准化后）"""
@@ -41,11 +79,39 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    # iat lets a password change revoke older tokens, jti lets logout revoke this one
+    to_encode.update({"exp": expire, "iat": datetime.utcnow(), "jti": uuid.uuid4().hex})
+    encoded_jwt = jwt_key_ring.encode(to_encode)
     return encoded_jwt
 
 
+def refresh_token_expiry() -> datetime:
+    return datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+
+
+def issue_sso_access_token(user: dict, sso_payload: dict) -> dict:
+    """Access token only (no refresh token) for an SSO sign-in; it never outlives the SSO token"""
+    expires_delta = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    if sso_payload.get("exp"):
+        remaining = datetime.fromtimestamp(sso_payload["exp"], timezone.utc) - datetime.now(timezone.utc)
+        expires_delta = min(expires_delta, max(remaining, timedelta(0)))
+    access_token = create_access_token(
+        data={"sub": user["email"], "id": user["id"], "isAdmin": user["isAdmin"]},
+        expires_delta=expires_delta
+    )
+    return {"token": access_token, "expires_in": int(expires_delta.total_seconds())}
+
+
+async def issue_tokens(user: dict) -> dict:
+    """Access token plus a refresh token starting a new rotation family"""
+    access_token = create_access_token(
+        data={"sub": user["email"], "id": user["id"], "isAdmin": user["isAdmin"]},
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    refresh_token = await db_manager.create_refresh_token(user["id"], refresh_token_expiry())
+    return {"token": access_token, "refresh_token": refresh_token, "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60}
+
+
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     """Get current user from token"""
@@ -55,11 +121,9 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
         headers={"WWW-Authenticate": "Bearer"},
     )
     
+    # Tokens already verified (and not yet expired or revoked) skip signature verification
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise credentials_exception
+        payload = verify_token_payload(token)
     except JWTError:
         raise credentials_exception
     
@@ -67,12 +131,43 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     return payload
 
 
+def verify_token_payload(token: str) -> dict:
+    """Verified, unrevoked payload (from the verified-token cache when possible); raises JWTError"""
+    payload = verified_token_cache.get(token)
+    if payload is not None:
+        return payload
+    payload = jwt_key_ring.decode(token)
+    if not payload.get("sub") or token_revocation.is_revoked(payload):
+        raise JWTError("Invalid token")
+    verified_token_cache.put(token, payload)
+    return payload
+
+
+def verify_token_result(token: str) -> dict:
+    try:
+        payload = verify_token_payload(token)
+        return {"user_id": payload["sub"], "status": "verified"}
+    except jwt.ExpiredSignatureError:
+        return {"user_id": None, "status": "expired"}
+    except JWTError:
+        return {"user_id": None, "status": "invalid"}
+
+
 @router.post("/verify")
 async def verify_token(token: str = None, token_data: dict = Body(None)):
     """
     验证 Token 并返回用户信息
-    接受查询参数或请求体中的token
+    接受查询参数或请求体中的token；请求体为 {"tokens": [...]} 时批量验证，逐个返回结果
     """
+    # 批量验证
+    if token_data and "tokens" in token_data:
+        tokens = token_data["tokens"]
+        if not isinstance(tokens, list) or not all(isinstance(t, str) for t in tokens):
+            raise HTTPException(status_code=400, detail="tokens must be a list of strings")
+        if len(tokens) > VERIFY_BATCH_LIMIT:
+            raise HTTPException(status_code=400, detail=f"At most {VERIFY_BATCH_LIMIT} tokens per request")
+        return {"results": [verify_token_result(t) for t in tokens]}
+    
     # 从请求体中获取token (如果提供)
     if token_data and "token" in token_data:
         token = token_data["token"]
@@ -81,16 +176,12 @@ async def verify_token(token: str = None, token_data: dict = Body(None)):
         raise HTTPException(status_code=400, detail="Token is required")
         
     print(token)
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id = payload.get("sub")  # 假设 sub 是用户 ID
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        return {"user_id": user_id, "status": "verified"}
-    except jwt.ExpiredSignatureError:
+    result = verify_token_result(token)
+    if result["status"] == "expired":
         raise HTTPException(status_code=401, detail="Token expired")
-    except jwt.InvalidTokenError:
+    if result["status"] != "verified":
         raise HTTPException(status_code=401, detail="Invalid token")
+    return result
 
 
 @router.post("/register", response_model=TokenResponse)
@@ -99,14 +190,7 @@ async def register_user(user_data: UserCreate):
     try:
         normalized_email = user_data.email.strip().lower()
         print(f"Received registration request for: {normalized_email}")
-        # Pre-check: email already exists
-        existing = await get_user_by_email(normalized_email)
-        if existing:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="该邮箱已注册"
-            )
-        
+
         user = await create_user(
             name=user_data.name or normalized_email.split('@')[0],
             email=normalized_email,
@@ -116,11 +200,7 @@ async def register_user(user_data: UserCreate):
         print(f"User created successfully, generating token for: {user['email']}")
         
         # Create access token
-        access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = create_access_token(
-            data={"sub": user["email"], "id": user["id"], "isAdmin": user["isAdmin"]},
-            expires_delta=access_token_expires
-        )
+        tokens = await issue_tokens(user)
         
         print(f"Registration complete for: {user['email']}")
         
@@ -128,7 +208,9 @@ async def register_user(user_data: UserCreate):
             "id": user["id"],
             "email": user["email"],
             "name": user["name"],
-            "token": access_token,
+            "token": tokens["token"],
+            "refresh_token": tokens["refresh_token"],
+            "expires_in": tokens["expires_in"],
             "isAdmin": user["isAdmin"]
         }
     except ValueError as e:
@@ -146,35 +228,83 @@ async def register_user(user_data: UserCreate):
 
 
 @router.post("/login", response_model=TokenResponse)
-async def login_user(user_data: UserLogin):
+async def login_user(user_data: UserLogin, http_request: Request):
     """Login a user"""
+    # Throttle before any database lookup or password hashing
+    await auth_rate_limiter.check("login", http_request, user_data.email)
     user = await verify_user(email=user_data.email, password=user_data.password)
     
     if not user:
+        login_audit.record("login", http_request, email=user_data.email, success=False)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
+    # Only failed logins count towards the per-email limit
+    await auth_rate_limiter.succeeded("login", user_data.email)
+    
     # Create access token
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    tokens = await issue_tokens(user)
+    login_audit.record("login", http_request, user_id=user["id"], email=user["email"])
+    print("登录成功, access_token:",tokens["token"])
+    return {
+        "id": user["id"],
+        "email": user["email"],
+        "name": user["name"],
+        "token": tokens["token"],
+        "refresh_token": tokens["refresh_token"],
+        "expires_in": tokens["expires_in"],
+        "isAdmin": user["isAdmin"]
+    }
+
+
+@router.post("/refresh", response_model=TokenResponse)
+async def refresh_access_token(request: RefreshTokenRequest):
+    """Exchange a refresh token for a new access token and a new (rotated) refresh token"""
+    rotated = await db_manager.rotate_refresh_token(request.refresh_token, refresh_token_expiry())
+    if rotated is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
+    user, refresh_token = rotated
     access_token = create_access_token(
         data={"sub": user["email"], "id": user["id"], "isAdmin": user["isAdmin"]},
-        expires_delta=access_token_expires
+        expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
-    print("登录成功, access_token:",access_token)
     return {
         "id": user["id"],
         "email": user["email"],
         "name": user["name"],
         "token": access_token,
-        "isAdmin": user["isAdmin"]
+        "refresh_token": refresh_token,
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        "isAdmin": user["isAdmin"],
+        "emailVerified": user["emailVerified"]
     }
 
 
+@router.post("/logout")
+async def logout_user(request: LogoutRequest = Body(None), token: Optional[str] = Depends(optional_oauth2_scheme)):
+    """Revoke the refresh token family and the presented access token"""
+    if request and request.refresh_token:
+        await db_manager.revoke_refresh_token_family(request.refresh_token)
+    if token:
+        try:
+            payload = jwt_key_ring.decode(token)
+            await token_revocation.revoke_token(payload)
+            verified_token_cache.invalidate(token)
+        except JWTError:
+            pass
+    return {"message": "Logged out"}
+
+
 @router.post("/change-password", status_code=status.HTTP_200_OK)
-async def update_password(password_data: UserPasswordChange, current_user: dict = Depends(get_current_user)):
+async def update_password(password_data: UserPasswordChange, http_request: Request, current_user: dict = Depends(get_current_user)):
     """Change user password"""
     # Verify that the user is changing their own password
     if current_user["sub"].lower() != password_data.email.lower():
@@ -195,7 +325,12 @@ async def update_password(password_data: UserPasswordChange, current_user: dict
             detail="Current password is incorrect"
         )
     
-    return {"message": "Password changed successfully"}
+    # Every other device is signed out (refresh tokens were revoked with the password change);
+    # this client continues with a fresh token pair
+    await token_revocation.revoke_user(current_user["id"])
+    login_audit.record("password_change", http_request, user_id=current_user["id"], email=current_user["sub"])
+    tokens = await issue_tokens({"email": current_user["sub"], "id": current_user["id"], "isAdmin": current_user.get("isAdmin", False)})
+    return {"message": "Password changed successfully", **tokens}
 
 
 @router.get("/me", response_model=dict)
@@ -205,8 +340,11 @@ async def get_user_me(current_user: dict = Depends(get_current_user)):
         # Import the database manager
         from database import db_manager
         
-        # Get complete user info from database
-        user = await db_manager.get_user_by_id(current_user["id"])
+        # Get complete user info from database (identical concurrent requests share one query)
+        user = await request_coalescer.run(
+            ("auth_me", current_user["id"]),
+            lambda: db_manager.get_user_by_id(current_user["id"]),
+        )
         
         if not user:
             raise HTTPException(
@@ -233,10 +371,86 @@ async def get_user_me(current_user: dict = Depends(get_current_user)):
         )
 
 
+USER_EXPORT_FIELDS = [
+    "id", "name", "email", "isAdmin", "emailVerified", "verificationEmail", "createdAt", "updatedAt", "lastLoginAt"
+]
+
+
+async def user_export_lines(users, export_format: str):
+    """Serialize users one row at a time (CSV with header, or NDJSON)"""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=USER_EXPORT_FIELDS)
+    if export_format == "csv":
+        writer.writeheader()
+    async for user in users:
+        row = {k: v.isoformat() if isinstance(v, datetime) else v for k, v in user.items()}
+        if export_format == "csv":
+            writer.writerow(row)
+        else:
+            buffer.write(json.dumps(row, ensure_ascii=False) + "\n")
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+@router.get("/admin/users")
+async def list_users(
+    current_user: dict = Depends(get_current_user),
+    limit: int = Query(USER_LIST_DEFAULT_LIMIT, ge=1, le=USER_LIST_MAX_LIMIT),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    verified: Optional[bool] = Query(None),
+    admin: Optional[bool] = Query(None),
+    created_from: Optional[datetime] = Query(None, description="注册时间下限（含）"),
+    created_to: Optional[datetime] = Query(None, description="注册时间上限（不含）"),
+    format: str = Query("json", pattern="^(json|csv|ndjson)$"),
+):
+    """
+    管理员：分页查看用户（按注册时间倒序，游标分页）
+    format=csv/ndjson 时从游标处开始流式导出全部匹配用户，内存占用与用户数无关
+    """
+    if not current_user.get("isAdmin"):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    if cursor:
+        try:
+            decode_user_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    
+    filters = {"verified": verified, "admin": admin, "created_from": created_from, "created_to": created_to}
+    if format != "json":
+        print(f"📤 用户导出 by={current_user['id']} format={format} filters={filters}")
+        filename = f"users_{time.strftime('%Y%m%d%H%M%S')}.{format}"
+        return StreamingResponse(
+            user_export_lines(db_manager.iter_users(cursor=cursor, **filters), format),
+            media_type="text/csv" if format == "csv" else "application/x-ndjson",
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+    
+    users, next_cursor = await db_manager.list_users_page(limit=limit, cursor=cursor, **filters)
+    return {"users": users, "next_cursor": next_cursor}
+
+
+@router.get("/admin/users/{user_id}/logins")
+async def get_user_logins(
+    user_id: str,
+    current_user: dict = Depends(get_current_user),
+    limit: int = Query(50, ge=1, le=500),
+):
+    """管理员：查看用户最近的登录 / SSO / 密码变更记录"""
+    if not current_user.get("isAdmin"):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    if login_audit.pool is None:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Login audit log is disabled")
+    return {"user_id": user_id, "events": await login_audit.get_user_events(user_id, limit)}
+
+
 # Email verification endpoints
 @router.post("/send-verification-code")
-async def send_verification_code(request: SendVerificationCodeRequest):
+async def send_verification_code(request: SendVerificationCodeRequest, http_request: Request):
     """Send verification code to email"""
+    await auth_rate_limiter.check("send-verification-code", http_request, request.email)
     try:
         result = await email_service.send_verification_code(
             email=request.email, 
@@ -251,9 +465,22 @@ async def send_verification_code(request: SendVerificationCodeRequest):
         )
 
 
+@router.get("/email-status/{message_id}")
+async def get_email_status(message_id: str):
+    """Delivery status of a queued email (message_id from /send-verification-code)"""
+    delivery = email_service.get_delivery_status(message_id)
+    if delivery is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="邮件不存在或状态已过期"
+        )
+    return delivery
+
+
 @router.post("/verify-code")
-async def verify_verification_code(request: VerifyCodeRequest):
+async def verify_verification_code(request: VerifyCodeRequest, http_request: Request):
     """Verify verification code"""
+    await auth_rate_limiter.check("verify-code", http_request, request.email)
     try:
         result = email_service.verify_code(
             email=request.email,
@@ -274,13 +501,6 @@ async def register_with_verification(request: RegisterWithVerificationRequest):
     """Register user with email verification"""
     try:
         normalized_email = request.email.strip().lower()
-        # Pre-check: email already exists
-        existing = await get_user_by_email(normalized_email)
-        if existing:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="该邮箱已注册"
-            )
 
         # First verify the verification code
         verify_result = email_service.verify_code(
@@ -304,17 +524,15 @@ async def register_with_verification(request: RegisterWithVerificationRequest):
         )
         
         # Create access token
-        access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        access_token = create_access_token(
-            data={"sub": user["email"], "id": user["id"], "isAdmin": user["isAdmin"]},
-            expires_delta=access_token_expires
-        )
+        tokens = await issue_tokens(user)
         
         return {
             "id": user["id"],
             "email": user["email"],
             "name": user["name"],
-            "token": access_token,
+            "token": tokens["token"],
+            "refresh_token": tokens["refresh_token"],
+            "expires_in": tokens["expires_in"],
             "isAdmin": user["isAdmin"],
             "emailVerified": user["emailVerified"]
         }
@@ -333,7 +551,7 @@ async def register_with_verification(request: RegisterWithVerificationRequest):
 
 
 @router.post("/reset-password")
-async def reset_password(request: PasswordResetRequest):
+async def reset_password(request: PasswordResetRequest, http_request: Request):
     """Reset password with email verification"""
     try:
         # Verify the verification code
@@ -364,6 +582,12 @@ async def reset_password(request: PasswordResetRequest):
                 detail="密码重置失败，请确保邮箱已验证"
             )
         
+        # 吊销该用户已签发的访问令牌（刷新令牌已随密码重置一并吊销）
+        user = await get_user_profile_by_email(request.email)
+        if user:
+            await token_revocation.revoke_user(user["id"])
+        login_audit.record("password_reset", http_request, user_id=user["id"] if user else None, email=request.email)
+        
         return {"message": "密码重置成功"}
         
     except ValueError as e:
@@ -434,7 +658,7 @@ async def bind_email(request: EmailBindingRequest, current_user: dict = Depends(
 
 # SSO (Single Sign-On) endpoints
 @router.get("/sso")
-async def sso_login(token: str, redirect_to: str = "/"):
+async def sso_login(token: str, http_request: Request, redirect_to: str = "/"):
     """
     单点登录接口 - A网站跳转B网站免登录
     接收A网站的token，验证后重定向到B网站前端
@@ -448,11 +672,11 @@ async def sso_login(token: str, redirect_to: str = "/"):
 
     try:
         print(f"🔍 开始验证token...")
-        print(f"🔑 使用SECRET_KEY: {SECRET_KEY[:10]}...")
+        print(f"🔑 HS256密钥: {'已配置' if SECRET_KEY else '未配置'}")
         print(f"🔑 使用ALGORITHM: {ALGORITHM}")
 
-        # 验证token
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        # 验证token（含吊销检查：已登出或已改密的token不能用于SSO）
+        payload = verify_token_payload(token)
         print(f"✅ Token解码成功!")
         print(f"📄 Token payload: {payload}")
 
@@ -481,7 +705,7 @@ async def sso_login(token: str, redirect_to: str = "/"):
         print(f"🔍 验证用户是否存在: {user_email}")
 
         # 验证用户是否存在
-        user = await get_user_by_email(user_email)
+        user = await get_user_profile_by_email(user_email)
         if not user:
             print(f"❌ 数据库中未找到用户: {user_email}")
             # 构建错误重定向URL
@@ -498,16 +722,11 @@ async def sso_login(token: str, redirect_to: str = "/"):
 
         print(f"🔐 生成新的SSO token...")
 
-        # 生成新的token（更安全的做法）
-        new_token_data = {"sub": user["email"], "id": user["id"], "isAdmin": user["isAdmin"]}
-        print(f"📄 新token数据: {new_token_data}")
-
-        new_token = create_access_token(
-            data=new_token_data,
-            expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-        )
+        # 生成新的token（更安全的做法），有效期不超过原SSO token
+        new_token = issue_sso_access_token(user, payload)["token"]
 
         print(f"✅ 新token生成成功! (前20字符): {new_token[:20]}...")
+        login_audit.record("sso", http_request, user_id=user["id"], email=user["email"])
 
         # 安全重定向，只允许内部路径
         safe_redirect = redirect_to if redirect_to.startswith('/') else '/'
@@ -562,7 +781,7 @@ async def sso_login(token: str, redirect_to: str = "/"):
         else:
             error_url = f"{frontend_base_url}/auth?error=token_expired"
         return RedirectResponse(url=error_url)
-    except jwt.InvalidTokenError as e:
+    except JWTError as e:
         print(f"❌ SSO Token无效: {e}")
         print(f"   Token: {token}")
         print(f"   Error详情: {str(e)}")
@@ -593,7 +812,7 @@ async def sso_login(token: str, redirect_to: str = "/"):
 
 
 @router.post("/sso/verify", response_model=TokenResponse)
-async def verify_sso_token(sso_token: str = Body(..., embed=True)):
+async def verify_sso_token(http_request: Request, sso_token: str = Body(..., embed=True)):
     """
     验证SSO token并返回用户信息
     前端收到sso_token后调用此接口验证并获取用户信息
@@ -605,11 +824,11 @@ async def verify_sso_token(sso_token: str = Body(..., embed=True)):
 
     try:
         print(f"🔑 使用配置:")
-        print(f"   SECRET_KEY: {SECRET_KEY[:10]}...")
+        print(f"   HS256密钥: {'已配置' if SECRET_KEY else '未配置'}")
         print(f"   ALGORITHM: {ALGORITHM}")
 
-        # 验证token
-        payload = jwt.decode(sso_token, SECRET_KEY, algorithms=[ALGORITHM])
+        # 验证token（含吊销检查：已登出或已改密的token不能用于SSO）
+        payload = verify_token_payload(sso_token)
         print(f"✅ SSO Token解码成功!")
         print(f"📄 Payload内容: {payload}")
 
@@ -633,7 +852,7 @@ async def verify_sso_token(sso_token: str = Body(..., embed=True)):
 
         # 获取完整用户信息
         print(f"🔍 从数据库查询用户: {user_email}")
-        user = await get_user_by_email(user_email)
+        user = await get_user_profile_by_email(user_email)
         if not user:
             print(f"❌ 数据库中未找到用户: {user_email}")
             raise HTTPException(
@@ -649,11 +868,15 @@ async def verify_sso_token(sso_token: str = Body(..., embed=True)):
         print(f"   isAdmin: {user['isAdmin']}")
         print(f"   emailVerified: {user.get('emailVerified', False)}")
 
+        # 只签发访问令牌（有效期不超过SSO token）：SSO token 不能换取长期有效的刷新令牌
+        tokens = issue_sso_access_token(user, payload)
+        login_audit.record("sso", http_request, user_id=user["id"], email=user["email"])
         response_data = {
             "id": user["id"],
             "email": user["email"],
             "name": user["name"],
-            "token": sso_token,
+            "token": tokens["token"],
+            "expires_in": tokens["expires_in"],
             "isAdmin": user["isAdmin"],
             "emailVerified": user.get("emailVerified", False)
         }
@@ -671,7 +894,7 @@ async def verify_sso_token(sso_token: str = Body(..., embed=True)):
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="SSO token expired"
         )
-    except jwt.InvalidTokenError as e:
+    except JWTError as e:
         print(f"❌ SSO Token无效: {e}")
         print(f"   Token: {sso_token}")
         print(f"   Error详情: {str(e)}")
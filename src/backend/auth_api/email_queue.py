@@ -0,0 +1,271 @@
+"""
+Outbound email queue for MatterAI Agent
+Request handlers enqueue messages and return immediately; EMAIL_QUEUE_WORKERS background tasks
+deliver them. Failed deliveries are retried with exponential backoff (with jitter) up to
+EMAIL_MAX_ATTEMPTS times; permanent SMTP rejections (5xx) and exhausted messages are appended to
+the dead-letter log (JSON lines). Delivery status is kept for EMAIL_STATUS_TTL_SECONDS so
+clients can poll it by message id. The queue is in-process: messages still pending at shutdown
+are dead-lettered after a short drain.
+"""
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import aiosmtplib
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Queue configuration
+EMAIL_QUEUE_WORKERS = int(os.getenv("EMAIL_QUEUE_WORKERS", "2"))
+EMAIL_QUEUE_SIZE = int(os.getenv("EMAIL_QUEUE_SIZE", "1000"))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", "5"))
+EMAIL_RETRY_BASE_SECONDS = float(os.getenv("EMAIL_RETRY_BASE_SECONDS", "2"))
+EMAIL_RETRY_MAX_SECONDS = float(os.getenv("EMAIL_RETRY_MAX_SECONDS", "120"))
+EMAIL_STATUS_TTL_SECONDS = float(os.getenv("EMAIL_STATUS_TTL_SECONDS", "3600"))
+EMAIL_DRAIN_SECONDS = float(os.getenv("EMAIL_DRAIN_SECONDS", "10"))
+EMAIL_DEAD_LETTER_PATH = os.getenv(
+    "EMAIL_DEAD_LETTER_PATH", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "email_dead_letter.jsonl")
+)
+
+FINISHED_STATUSES = {"sent", "failed"}
+
+
+def is_permanent_failure(error: Exception) -> bool:
+    """SMTP 5xx replies (refused recipient, rejected sender, bad credentials) will not succeed on retry"""
+    if isinstance(error, aiosmtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, aiosmtplib.SMTPResponseException) and 500 <= error.code < 600
+
+
+class _EmailJob:
+    def __init__(self, to: str, subject: str, html: str, kind: str, on_failure: Optional[Callable[[], None]]):
+        self.id = uuid.uuid4().hex
+        self.to = to
+        self.subject = subject
+        self.html = html
+        self.kind = kind
+        self.on_failure = on_failure
+        self.status = "queued"  # queued | sending | retrying | sent | failed
+        self.attempts = 0
+        self.last_error: Optional[str] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.next_attempt_at: Optional[float] = None
+        self.done = asyncio.Event()
+
+
+class EmailQueue:
+    """In-process outbound queue: worker tasks, exponential-backoff retries and a dead-letter log"""
+
+    def __init__(
+        self,
+        sender: Callable[[str, str, str], Awaitable[Any]],
+        workers: int = EMAIL_QUEUE_WORKERS,
+        queue_size: int = EMAIL_QUEUE_SIZE,
+        max_attempts: int = EMAIL_MAX_ATTEMPTS,
+        dead_letter_path: str = EMAIL_DEAD_LETTER_PATH,
+    ):
+        # sender(to, subject, html) must raise when delivery fails
+        self.sender = sender
+        self.workers = max(1, workers)
+        self.queue_size = queue_size
+        self.max_attempts = max(1, max_attempts)
+        self.dead_letter_path = dead_letter_path
+        self._queue: Optional[asyncio.Queue] = None
+        self._jobs: Dict[str, _EmailJob] = {}
+        self._tasks: List[asyncio.Task] = []
+        # message id -> pending backoff timer
+        self._retry_timers: Dict[str, asyncio.TimerHandle] = {}
+        self._closing = False
+        self.enqueued = 0
+        self.sent = 0
+        self.retries = 0
+        self.dead_lettered = 0
+        self.rejected = 0
+
+    def start(self):
+        """Start the worker tasks (called lazily on first enqueue as well)"""
+        if self._queue is None:
+            self._queue = asyncio.Queue()
+        self._closing = False
+        self._tasks = [task for task in self._tasks if not task.done()]
+        for _ in range(self.workers - len(self._tasks)):
+            self._tasks.append(asyncio.create_task(self._worker()))
+
+    async def close(self, drain_seconds: float = EMAIL_DRAIN_SECONDS):
+        """Let workers finish what is queued (bounded), then stop; undelivered messages are dead-lettered"""
+        self._closing = True
+        for timer in self._retry_timers.values():
+            timer.cancel()
+        self._retry_timers.clear()
+        if self._queue is not None and self._tasks:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=drain_seconds)
+            except asyncio.TimeoutError:
+                pass
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        for job in list(self._jobs.values()):
+            if job.status not in FINISHED_STATUSES:
+                self._dead_letter(job, "shutdown before delivery")
+
+    def _active(self) -> int:
+        return sum(1 for job in self._jobs.values() if job.status not in FINISHED_STATUSES)
+
+    def _prune(self):
+        # Jobs are kept in creation order; drop finished ones once their status has expired
+        cutoff = time.time() - EMAIL_STATUS_TTL_SECONDS
+        for message_id, job in list(self._jobs.items()):
+            if job.created_at >= cutoff:
+                break
+            if job.status in FINISHED_STATUSES:
+                del self._jobs[message_id]
+
+    def enqueue(
+        self,
+        to: str,
+        subject: str,
+        html: str,
+        kind: str = "email",
+        on_failure: Optional[Callable[[], None]] = None,
+    ) -> Optional[str]:
+        """Queue a message; returns its message id, or None when the queue is full.
+        on_failure is called once if the message ends up dead-lettered."""
+        self._prune()
+        if self._active() >= self.queue_size:
+            self.rejected += 1
+            return None
+        self.start()
+        job = _EmailJob(to, subject, html, kind, on_failure)
+        self._jobs[job.id] = job
+        self._queue.put_nowait(job.id)
+        self.enqueued += 1
+        return job.id
+
+    async def _worker(self):
+        while True:
+            message_id = await self._queue.get()
+            try:
+                job = self._jobs.get(message_id)
+                if job is not None and job.status not in FINISHED_STATUSES:
+                    await self._attempt(job)
+            except Exception as e:
+                print(f"❌ Email worker error: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _attempt(self, job: _EmailJob):
+        job.status = "sending"
+        job.attempts += 1
+        job.updated_at = time.time()
+        try:
+            await self.sender(job.to, job.subject, job.html)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            if is_permanent_failure(e) or job.attempts >= self.max_attempts:
+                self._dead_letter(job, error)
+                return
+            # Exponential backoff with jitter so a recovering SMTP server is not hit in lockstep
+            delay = min(EMAIL_RETRY_MAX_SECONDS, EMAIL_RETRY_BASE_SECONDS * 2 ** (job.attempts - 1))
+            delay *= random.uniform(0.5, 1.0)
+            job.status = "retrying"
+            job.last_error = error
+            job.next_attempt_at = time.time() + delay
+            job.updated_at = time.time()
+            self.retries += 1
+            print(f"⚠️ Email {job.id} to {job.to} failed (attempt {job.attempts}), retrying in {delay:.1f}s: {error}")
+            self._retry_timers[job.id] = asyncio.get_running_loop().call_later(delay, self._requeue, job.id)
+            return
+        job.status = "sent"
+        job.last_error = None
+        job.next_attempt_at = None
+        job.updated_at = time.time()
+        job.html = ""  # delivered; keep only the status
+        self.sent += 1
+        job.done.set()
+
+    def _requeue(self, message_id: str):
+        self._retry_timers.pop(message_id, None)
+        job = self._jobs.get(message_id)
+        if job is not None and not self._closing:
+            job.status = "queued"
+            job.next_attempt_at = None
+            self._queue.put_nowait(message_id)
+
+    def _dead_letter(self, job: _EmailJob, error: str):
+        job.status = "failed"
+        job.last_error = error
+        job.next_attempt_at = None
+        job.updated_at = time.time()
+        job.html = ""
+        self.dead_lettered += 1
+        print(f"❌ Email {job.id} to {job.to} dead-lettered after {job.attempts} attempts: {error}")
+        # Subject and body are not logged: verification emails carry the code
+        entry = {
+            "message_id": job.id,
+            "to": job.to,
+            "kind": job.kind,
+            "attempts": job.attempts,
+            "error": error,
+            "created_at": datetime.fromtimestamp(job.created_at, timezone.utc).isoformat(),
+            "failed_at": datetime.fromtimestamp(job.updated_at, timezone.utc).isoformat(),
+        }
+        try:
+            with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"⚠️ Could not write email dead-letter log {self.dead_letter_path}: {e}")
+        if job.on_failure is not None:
+            try:
+                job.on_failure()
+            except Exception as e:
+                print(f"⚠️ Email failure callback error: {e}")
+        job.done.set()
+
+    def status(self, message_id: str) -> Optional[Dict[str, Any]]:
+        """Delivery status of a queued message, or None if unknown or expired"""
+        job = self._jobs.get(message_id)
+        if job is None:
+            return None
+        result = {"message_id": job.id, "status": job.status, "attempts": job.attempts}
+        if job.next_attempt_at is not None:
+            result["next_attempt_in"] = max(0.0, round(job.next_attempt_at - time.time(), 1))
+        return result
+
+    async def wait(self, message_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Wait up to timeout seconds for a message to be sent or dead-lettered; returns its status"""
+        job = self._jobs.get(message_id)
+        if job is None:
+            return None
+        try:
+            await asyncio.wait_for(job.done.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.status(message_id)
+
+    def stats(self) -> Dict[str, Any]:
+        statuses: Dict[str, int] = {}
+        for job in self._jobs.values():
+            statuses[job.status] = statuses.get(job.status, 0) + 1
+        return {
+            "workers": sum(1 for task in self._tasks if not task.done()),
+            "queue_size": self.queue_size,
+            "statuses": statuses,
+            "enqueued": self.enqueued,
+            "sent": self.sent,
+            "retries": self.retries,
+            "dead_lettered": self.dead_lettered,
+            "rejected": self.rejected,
+        }
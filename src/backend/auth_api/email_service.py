@@ -7,11 +7,13 @@ import string
 import asyncio
 from datetime import datetime, timedelta
 from typing import Dict, Optional
-import aiosmtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from dotenv import load_dotenv
 
+from auth_api.email_queue import EmailQueue
+from auth_api.smtp_pool import SMTPConnectionPool
+
 load_dotenv()
 
 # Email configuration from environment variables
@@ -35,22 +37,15 @@ class EmailService:
     """Email service for sending verification codes"""
     
     def __init__(self):
-        self.smtp_config = {
-            'hostname': SMTP_HOST,
-            'port': SMTP_PORT,
-            'username': SMTP_USERNAME,
-            'password': SMTP_PASSWORD,
-            'use_tls': True,
-            'start_tls': True,
-            'timeout': 30
-        }
+        self.smtp_pool = SMTPConnectionPool(SMTP_HOST, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD)
+        self.outbox = EmailQueue(self.deliver)
     
     def generate_verification_code(self) -> str:
         """Generate a 6-digit verification code"""
         return ''.join(random.choices(string.digits, k=CODE_LENGTH))
     
-    async def send_email(self, to_email: str, subject: str, html_content: str) -> bool:
-        """Send email using SMTP"""
+    async def deliver(self, to_email: str, subject: str, html_content: str):
+        """Send email using SMTP; raises on failure (used by the outbound queue to decide on retries)"""
         # Mock mode for testing
         if EMAIL_MOCK_MODE:
             print(f"📧 [模拟模式] 邮件发送到: {to_email}")
@@ -61,87 +56,30 @@ class EmailService:
             if code_match:
                 print(f"🔢 [模拟模式] 验证码: {code_match.group(1)}")
             print("✅ [模拟模式] 邮件发送成功")
-            return True
+            return
+        
+        print(f"🔄 准备发送邮件到: {to_email}")
+        
+        message = MIMEMultipart('alternative')
+        message['Subject'] = subject
+        message['From'] = f"{FROM_NAME} <{FROM_EMAIL}>"
+        message['To'] = to_email
         
+        # Add HTML content
+        html_part = MIMEText(html_content, 'html', 'utf-8')
+        message.attach(html_part)
+        
+        # Pooled connection: the working transport (TLS / STARTTLS / SSL 465) is probed once and remembered
+        await self.smtp_pool.send(message)
+        print(f"✅ 邮件发送成功 ({self.smtp_pool.mode}): {to_email}")
+    
+    async def send_email(self, to_email: str, subject: str, html_content: str) -> bool:
+        """Send email using SMTP right away (bypassing the queue)"""
         try:
-            print(f"🔄 准备发送邮件到: {to_email}")
-            print(f"📧 SMTP服务器: {SMTP_HOST}:{SMTP_PORT}")
-            
-            message = MIMEMultipart('alternative')
-            message['Subject'] = subject
-            message['From'] = f"{FROM_NAME} <{FROM_EMAIL}>"
-            message['To'] = to_email
-            
-            # Add HTML content
-            html_part = MIMEText(html_content, 'html', 'utf-8')
-            message.attach(html_part)
-            
-            # Try multiple connection methods for QQ Mail
-            try:
-                # Method 1: Standard TLS connection
-                print("🔄 尝试标准TLS连接...")
-                await aiosmtplib.send(
-                    message,
-                    hostname=self.smtp_config['hostname'],
-                    port=self.smtp_config['port'],
-                    username=self.smtp_config['username'],
-                    password=self.smtp_config['password'],
-                    use_tls=True,
-                    start_tls=False,
-                    timeout=30
-                )
-                print(f"✅ 邮件发送成功 (标准TLS): {to_email}")
-                return True
-                
-            except Exception as e1:
-                print(f"⚠️ 标准TLS连接失败: {e1}")
-                
-                try:
-                    # Method 2: STARTTLS connection
-                    print("🔄 尝试STARTTLS连接...")
-                    await aiosmtplib.send(
-                        message,
-                        hostname=self.smtp_config['hostname'],
-                        port=self.smtp_config['port'],
-                        username=self.smtp_config['username'],
-                        password=self.smtp_config['password'],
-                        use_tls=False,
-                        start_tls=True,
-                        timeout=30
-                    )
-                    print(f"✅ 邮件发送成功 (STARTTLS): {to_email}")
-                    return True
-                    
-                except Exception as e2:
-                    print(f"⚠️ STARTTLS连接失败: {e2}")
-                    
-                    try:
-                        # Method 3: SSL connection on port 465
-                        print("🔄 尝试SSL连接 (端口465)...")
-                        await aiosmtplib.send(
-                            message,
-                            hostname=self.smtp_config['hostname'],
-                            port=465,
-                            username=self.smtp_config['username'],
-                            password=self.smtp_config['password'],
-                            use_tls=True,
-                            start_tls=False,
-                            timeout=30
-                        )
-                        print(f"✅ 邮件发送成功 (SSL 465): {to_email}")
-                        return True
-                        
-                    except Exception as e3:
-                        print(f"❌ 所有连接方法都失败了:")
-                        print(f"  - 标准TLS: {e1}")
-                        print(f"  - STARTTLS: {e2}")  
-                        print(f"  - SSL 465: {e3}")
-                        return False
-            
+            await self.deliver(to_email, subject, html_content)
+            return True
         except Exception as e:
             print(f"❌ 发送邮件失败 {to_email}: {e}")
-            import traceback
-            traceback.print_exc()
             return False
     
     def create_verification_email_template(self, code: str, purpose: str) -> str:
@@ -217,21 +155,28 @@ class EmailService:
         subject = f"MatterAI Agent 验证码 - {code}"
         html_content = self.create_verification_email_template(code, purpose)
         
-        # Send email
-        success = await self.send_email(email, subject, html_content)
+        def discard_code():
+            # Delivery finally failed: drop the code unless a newer one has been issued meanwhile
+            if verification_codes.get(email, {}).get('code') == code:
+                verification_codes.pop(email, None)
         
-        if success:
+        # Queue the email; workers deliver it (with retries) after the response has been sent
+        message_id = self.outbox.enqueue(email, subject, html_content, kind=f"verification:{purpose}", on_failure=discard_code)
+        
+        if message_id:
             return {
                 "success": True,
-                "message": f"验证码已发送到 {email}，请在 {CODE_EXPIRE_MINUTES} 分钟内完成验证",
-                "expires_in": CODE_EXPIRE_MINUTES * 60  # seconds
+                "message": f"验证码正在发送到 {email}，请在 {CODE_EXPIRE_MINUTES} 分钟内完成验证",
+                "expires_in": CODE_EXPIRE_MINUTES * 60,  # seconds
+                "message_id": message_id,
+                "delivery_status": "queued"
             }
         else:
-            # Remove failed code
+            # Queue full: remove the code that will never arrive
             verification_codes.pop(email, None)
             return {
                 "success": False,
-                "message": "验证码发送失败，请稍后重试"
+                "message": "邮件发送繁忙，请稍后重试"
             }
     
     def verify_code(self, email: str, code: str, purpose: str) -> Dict:
@@ -306,6 +251,23 @@ class EmailService:
         
         if expired_emails:
             print(f"🗑️ Cleaned up {len(expired_emails)} expired verification codes")
+    
+    def get_delivery_status(self, message_id: str) -> Optional[Dict]:
+        """Delivery status of a queued email (queued / sending / retrying / sent / failed)"""
+        return self.outbox.status(message_id)
+    
+    async def close(self):
+        """Drain the outbound queue, then close pooled SMTP connections"""
+        await self.outbox.close()
+        await self.smtp_pool.close()
+    
+    def stats(self) -> Dict:
+        return {
+            "mock_mode": EMAIL_MOCK_MODE,
+            "pending_codes": len(verification_codes),
+            "queue": self.outbox.stats(),
+            "smtp": self.smtp_pool.stats(),
+        }
 
 # Global email service instance
 email_service = EmailService()
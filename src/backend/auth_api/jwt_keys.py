@@ -0,0 +1,248 @@
+"""
+JWT signing keys for MatterAI Agent
+Access tokens are signed with RS256 by the newest RSA key in JWT_KEYS_DIR (one PEM file per key,
+named by key id); a new key is generated every JWT_KEY_ROTATION_DAYS and superseded keys keep
+verifying for JWT_KEY_GRACE_HOURS. Public keys are published as a JWKS so other services can
+verify tokens without the secret. Workers (and SSO partner sites) must share the key directory.
+A new key is published JWT_KEY_PUBLISH_SECONDS before it starts signing, so every worker has
+loaded it by the time tokens carrying its kid arrive. The directory is (re)read and rotated by a
+background task in a worker thread; encode/decode only read the keys held in memory.
+python-jose has no EdDSA support, hence RSA.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import secrets
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from dotenv import load_dotenv
+from jose import JWTError, jwk, jwt
+
+load_dotenv()
+
+# Key configuration
+JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "RS256")  # RS256 | HS256 (shared secret, no rotation)
+JWT_KEYS_DIR = os.getenv("JWT_KEYS_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "jwt_keys"))
+JWT_KEY_ROTATION_DAYS = float(os.getenv("JWT_KEY_ROTATION_DAYS", "30"))
+JWT_KEY_GRACE_HOURS = float(os.getenv("JWT_KEY_GRACE_HOURS", "24"))
+JWT_KEY_SIZE = int(os.getenv("JWT_KEY_SIZE", "2048"))
+# Also accept HS256 tokens signed with JWT_SECRET_KEY (tokens issued before the switch, SSO partners)
+JWT_ACCEPT_HS256 = os.getenv("JWT_ACCEPT_HS256", "false").lower() == "true"
+# Shared secret for HS256; required when JWT_ALGORITHM=HS256 or JWT_ACCEPT_HS256=true
+JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
+# How often the key directory is re-read to pick up keys rotated by other workers
+JWT_KEYS_RELOAD_SECONDS = float(os.getenv("JWT_KEYS_RELOAD_SECONDS", "300"))
+# A new key is published this long before it signs (must exceed the reload interval)
+JWT_KEY_PUBLISH_SECONDS = float(os.getenv("JWT_KEY_PUBLISH_SECONDS", str(2 * JWT_KEYS_RELOAD_SECONDS)))
+# Minimum interval between reloads triggered by tokens with an unknown kid
+JWT_UNKNOWN_KID_RELOAD_SECONDS = 5
+
+
+def _kid_created_at(kid: str) -> float:
+    try:
+        return float(kid.split("-", 1)[0])
+    except ValueError:
+        return 0.0
+
+
+class JWTKeyRing:
+    """RSA signing keys by kid; the newest signs, superseded ones verify until their grace period ends"""
+
+    def __init__(self, secret_key: Optional[str], keys_dir: str = JWT_KEYS_DIR, algorithm: str = JWT_ALGORITHM):
+        self.secret_key = secret_key
+        self.keys_dir = keys_dir
+        self.algorithm = algorithm
+        self._private_pems: Dict[str, str] = {}
+        self._public_pems: Dict[str, str] = {}
+        self._signing_kid: Optional[str] = None
+        self._jwks: Dict[str, Any] = {"keys": []}
+        self._jwks_etag = ""
+        self._loaded_at = 0.0
+        self._refresher: Optional[asyncio.Task] = None
+        self._reload: Optional[asyncio.Task] = None
+        self._reload_requested_at = 0.0
+        self.rotations = 0
+        self.reload_failures = 0
+
+    @property
+    def accepts_hs256(self) -> bool:
+        return self.algorithm == "HS256" or JWT_ACCEPT_HS256
+
+    async def initialize(self):
+        """Load (and if due, rotate) the keys in a worker thread, then start the periodic refresh"""
+        if self.accepts_hs256 and not self.secret_key:
+            raise RuntimeError("JWT_SECRET_KEY must be set when JWT_ALGORITHM=HS256 or JWT_ACCEPT_HS256=true")
+        await asyncio.to_thread(self.load)
+        self.start()
+
+    def start(self):
+        """Start the periodic key refresh"""
+        if self.algorithm == "RS256" and (self._refresher is None or self._refresher.done()):
+            self._refresher = asyncio.create_task(self._refresh_loop())
+
+    async def close(self):
+        for task in (self._refresher, self._reload):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(JWT_KEYS_RELOAD_SECONDS)
+            await self._reload_keys()
+
+    async def _reload_keys(self):
+        try:
+            # Disk reads, PEM parsing and RSA generation stay off the event loop
+            await asyncio.to_thread(self.load)
+        except Exception as e:
+            self.reload_failures += 1
+            print(f"❌ JWT key reload failed: {e}")
+
+    def _request_reload(self):
+        """Reload in the background for an unknown kid (rate limited so junk tokens cannot force disk reads)"""
+        now = time.monotonic()
+        if (self._reload and not self._reload.done()) or now - self._reload_requested_at < JWT_UNKNOWN_KID_RELOAD_SECONDS:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._reload_requested_at = now
+        self._reload = loop.create_task(self._reload_keys())
+
+    def _list_kids(self):
+        if not os.path.isdir(self.keys_dir):
+            return []
+        return sorted((name[:-4] for name in os.listdir(self.keys_dir) if name.endswith(".pem")), key=_kid_created_at)
+
+    def _rotate_once(self, wait: bool) -> Optional[str]:
+        """Generate a key unless another worker is doing it right now (lock file)"""
+        os.makedirs(self.keys_dir, exist_ok=True)
+        lock_path = os.path.join(self.keys_dir, "rotation.lock")
+        try:
+            fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if time.time() - os.path.getmtime(lock_path) < 60:
+                # Another worker is rotating; without any key of our own, wait for its key
+                for _ in range(50 if wait else 0):
+                    time.sleep(0.2)
+                    if not os.path.exists(lock_path):
+                        break
+                return None
+            os.remove(lock_path)  # stale lock from a crashed worker
+            return self._rotate_once(wait)
+        try:
+            os.close(fd)
+            return self._generate_key()
+        finally:
+            os.remove(lock_path)
+
+    def _generate_key(self) -> str:
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=JWT_KEY_SIZE)
+        pem = private_key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.PKCS8,
+            serialization.NoEncryption(),
+        )
+        kid = f"{int(time.time())}-{secrets.token_hex(4)}"
+        path = os.path.join(self.keys_dir, f"{kid}.pem")
+        # Write then rename so other workers never read a partial key
+        tmp_path = f"{path}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(pem)
+        os.replace(tmp_path, path)
+        self.rotations += 1
+        print(f"🔑 Generated JWT signing key {kid}")
+        return kid
+
+    def load(self):
+        """(Re)read the key directory, rotating first if the newest key is due; blocking, run it in a thread"""
+        if self.algorithm != "RS256":
+            return
+        kids = self._list_kids()
+        # The successor is generated early enough to be published before the current key expires
+        rotate_after = max(0.0, JWT_KEY_ROTATION_DAYS * 86400 - JWT_KEY_PUBLISH_SECONDS)
+        if not kids or time.time() - _kid_created_at(kids[-1]) > rotate_after:
+            self._rotate_once(wait=not kids)
+            kids = self._list_kids()
+            if not kids:
+                raise RuntimeError(f"No JWT signing key available in {self.keys_dir}")
+
+        # The newest published key signs (on first start the only key signs right away)
+        now = time.time()
+        published = [kid for kid in kids if now - _kid_created_at(kid) >= JWT_KEY_PUBLISH_SECONDS]
+        signing_kid = published[-1] if published else kids[0]
+        # A key stays valid for verification until JWT_KEY_GRACE_HOURS after its successor started signing
+        live = [
+            kid for kid, successor in zip(kids, kids[1:] + [None])
+            if successor is None
+            or now - _kid_created_at(successor) - JWT_KEY_PUBLISH_SECONDS < JWT_KEY_GRACE_HOURS * 3600
+            or kid == signing_kid
+        ]
+        private_pems, public_pems = {}, {}
+        for kid in live:
+            with open(os.path.join(self.keys_dir, f"{kid}.pem"), "rb") as f:
+                private_pem = f.read()
+            private_key = serialization.load_pem_private_key(private_pem, password=None)
+            private_pems[kid] = private_pem.decode()
+            public_pems[kid] = private_key.public_key().public_bytes(
+                serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+            ).decode()
+        # Keys first: readers take the kid, then its PEM, and the previous signing key stays live
+        self._private_pems, self._public_pems = private_pems, public_pems
+        self._signing_kid = signing_kid
+
+        keys = []
+        for kid, pem in public_pems.items():
+            key = jwk.construct(pem, "RS256").to_dict()
+            keys.append({**key, "kid": kid, "use": "sig", "alg": "RS256"})
+        self._jwks = {"keys": keys}
+        self._jwks_etag = '"' + hashlib.sha256(json.dumps(self._jwks, sort_keys=True).encode()).hexdigest()[:32] + '"'
+        self._loaded_at = now
+
+    def encode(self, claims: Dict[str, Any]) -> str:
+        if self.algorithm != "RS256":
+            return jwt.encode(claims, self.secret_key, algorithm=self.algorithm)
+        kid = self._signing_kid
+        if kid is None:
+            raise RuntimeError("JWT signing keys are not loaded")
+        return jwt.encode(claims, self._private_pems[kid], algorithm="RS256", headers={"kid": kid})
+
+    def decode(self, token: str) -> Dict[str, Any]:
+        """Verify signature and claims; raises JWTError (ExpiredSignatureError when expired)"""
+        header = jwt.get_unverified_header(token)
+        alg = header.get("alg")
+        if alg == "RS256" and self.algorithm == "RS256":
+            public_pem = self._public_pems.get(header.get("kid"))
+            if public_pem is None:
+                self._request_reload()
+                raise JWTError("Unknown signing key")
+            return jwt.decode(token, public_pem, algorithms=["RS256"])
+        if alg == "HS256" and self.accepts_hs256 and self.secret_key:
+            return jwt.decode(token, self.secret_key, algorithms=["HS256"])
+        raise JWTError("Unsupported token algorithm")
+
+    def jwks(self) -> Tuple[Dict[str, Any], str]:
+        """Public key set and its ETag"""
+        return self._jwks, self._jwks_etag
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "algorithm": self.algorithm,
+            "signing_kid": self._signing_kid,
+            "verification_kids": list(self._public_pems),
+            "accepts_hs256": self.accepts_hs256,
+            "loaded_at": self._loaded_at,
+            "rotations": self.rotations,
+            "reload_failures": self.reload_failures,
+        }
+
@@ -0,0 +1,223 @@
+"""
+Login audit log for MatterAI Agent
+Write-behind: login, SSO and password events are queued in memory by the request handler and
+flushed by a background task every LOGIN_AUDIT_FLUSH_INTERVAL_MS as one COPY into
+auth_audit_log plus one UPDATE of users.last_login_at, so logins never wait on the audit write.
+The queue is bounded; events that do not fit (or keep failing to write) are dropped and counted.
+"""
+import asyncio
+import os
+import time
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional
+
+from dotenv import load_dotenv
+from fastapi import Request
+
+from auth_api.rate_limit import AuthRateLimiter
+
+load_dotenv()
+
+# Audit configuration
+LOGIN_AUDIT_ENABLED = os.getenv("LOGIN_AUDIT_ENABLED", "true").lower() == "true"
+LOGIN_AUDIT_FLUSH_INTERVAL_MS = int(os.getenv("LOGIN_AUDIT_FLUSH_INTERVAL_MS", "250"))
+LOGIN_AUDIT_QUEUE_SIZE = int(os.getenv("LOGIN_AUDIT_QUEUE_SIZE", "10000"))
+LOGIN_AUDIT_BATCH_SIZE = int(os.getenv("LOGIN_AUDIT_BATCH_SIZE", "500"))
+LOGIN_AUDIT_MAX_RETRIES = 3
+
+# Successful events of these kinds update users.last_login_at
+LAST_LOGIN_EVENTS = {"login", "sso"}
+
+AUDIT_COLUMNS = ["user_id", "email", "event", "success", "ip", "user_agent", "created_at"]
+
+UPDATE_LAST_LOGIN_QUERY = """
+UPDATE users SET last_login_at = latest.at
+FROM (
+    SELECT user_id, max(at) AS at FROM unnest($1::integer[], $2::timestamptz[]) AS t(user_id, at)
+    GROUP BY user_id
+) latest
+WHERE users.id = latest.user_id AND (users.last_login_at IS NULL OR users.last_login_at < latest.at);
+"""
+
+
+def _user_id(value) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class LoginAuditLog:
+    """Bounded in-memory queue of auth events, flushed to Postgres in batches by a background task"""
+
+    def __init__(
+        self,
+        queue_size: int = LOGIN_AUDIT_QUEUE_SIZE,
+        flush_interval_ms: int = LOGIN_AUDIT_FLUSH_INTERVAL_MS,
+        batch_size: int = LOGIN_AUDIT_BATCH_SIZE,
+        enabled: bool = LOGIN_AUDIT_ENABLED,
+    ):
+        self.queue_size = queue_size
+        self.flush_interval = flush_interval_ms / 1000
+        self.batch_size = batch_size
+        self.enabled = enabled
+        self.pool = None
+        # (record tuple in AUDIT_COLUMNS order, failed write attempts)
+        self._queue: Deque[tuple] = deque()
+        self._flusher: Optional[asyncio.Task] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self.recorded = 0
+        self.flushed_events = 0
+        self.flushed_batches = 0
+        self.dropped: Dict[str, int] = {"queue_full": 0, "write_failed": 0}
+        self.last_flush_ms = 0.0
+
+    async def initialize(self, pool):
+        """Create the audit table and start the flusher"""
+        if not self.enabled:
+            return
+        async with pool.acquire() as connection:
+            await connection.execute("""
+            CREATE TABLE IF NOT EXISTS auth_audit_log (
+                id BIGSERIAL PRIMARY KEY,
+                user_id INTEGER,
+                email VARCHAR(255),
+                event VARCHAR(32) NOT NULL,
+                success BOOLEAN NOT NULL,
+                ip VARCHAR(64),
+                user_agent VARCHAR(512),
+                created_at TIMESTAMP WITH TIME ZONE NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_auth_audit_log_user_time ON auth_audit_log (user_id, created_at DESC);
+            CREATE INDEX IF NOT EXISTS idx_auth_audit_log_email_time ON auth_audit_log (lower(email), created_at DESC);
+            """)
+        self.pool = pool
+        self.start()
+        print("✅ Login audit log ready")
+
+    def start(self):
+        """Start the periodic flusher"""
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """Stop the periodic flusher and write everything still queued"""
+        if self._flusher and not self._flusher.done():
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+        if self.pool is not None:
+            await self.flush()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"❌ Login audit flush failed: {e}")
+
+    def record(
+        self,
+        event: str,
+        request: Optional[Request] = None,
+        user_id: Optional[Any] = None,
+        email: Optional[str] = None,
+        success: bool = True,
+    ):
+        """Queue an auth event (never blocks; dropped and counted when the queue is full)"""
+        if self.pool is None:
+            return
+        if len(self._queue) >= self.queue_size:
+            self.dropped["queue_full"] += 1
+            return
+        ip = AuthRateLimiter.client_ip(request) if request is not None else None
+        user_agent = request.headers.get("user-agent", "")[:512] if request is not None else None
+        record = (
+            _user_id(user_id),
+            email.strip().lower()[:255] if email else None,
+            event,
+            success,
+            ip,
+            user_agent,
+            datetime.now(timezone.utc),
+        )
+        self._queue.append((record, 0))
+        self.recorded += 1
+
+    async def flush(self):
+        """Write queued events in batches of LOGIN_AUDIT_BATCH_SIZE"""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            while self._queue:
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                if not await self._write(batch):
+                    return
+
+    async def _write(self, batch: List[tuple]) -> bool:
+        records = [record for record, _ in batch]
+        logins = [
+            (record[0], record[6]) for record in records
+            if record[0] is not None and record[3] and record[2] in LAST_LOGIN_EVENTS
+        ]
+        started = time.perf_counter()
+        try:
+            async with self.pool.acquire() as connection:
+                async with connection.transaction():
+                    await connection.copy_records_to_table("auth_audit_log", records=records, columns=AUDIT_COLUMNS)
+                    if logins:
+                        await connection.execute(
+                            UPDATE_LAST_LOGIN_QUERY, [user_id for user_id, _ in logins], [at for _, at in logins]
+                        )
+        except Exception as e:
+            # Retry later (ahead of newer events) unless retried too often or the queue filled up meanwhile
+            retry = [(record, attempts + 1) for record, attempts in batch if attempts + 1 < LOGIN_AUDIT_MAX_RETRIES]
+            room = max(0, self.queue_size - len(self._queue))
+            self.dropped["write_failed"] += len(batch) - min(len(retry), room)
+            self._queue.extendleft(reversed(retry[:room]))
+            print(f"⚠️ Login audit write of {len(batch)} events failed: {e}")
+            return False
+        self.flushed_batches += 1
+        self.flushed_events += len(batch)
+        self.last_flush_ms = round((time.perf_counter() - started) * 1000, 1)
+        return True
+
+    async def get_user_events(self, user_id: Any, limit: int = 50) -> List[Dict[str, Any]]:
+        """Most recent audit events of a user (queued events are written first)"""
+        await self.flush()
+        query = """
+        SELECT event, success, ip, user_agent, created_at FROM auth_audit_log
+        WHERE user_id = $1 ORDER BY created_at DESC LIMIT $2;
+        """
+        async with self.pool.acquire() as connection:
+            rows = await connection.fetch(query, _user_id(user_id), limit)
+        return [
+            {
+                "event": row['event'],
+                "success": row['success'],
+                "ip": row['ip'],
+                "userAgent": row['user_agent'],
+                "createdAt": row['created_at'],
+            }
+            for row in rows
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled and self.pool is not None,
+            "queued": len(self._queue),
+            "queue_size": self.queue_size,
+            "recorded": self.recorded,
+            "flushed_events": self.flushed_events,
+            "flushed_batches": self.flushed_batches,
+            "dropped": self.dropped,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+
+# Global login audit instance
+login_audit = LoginAuditLog()
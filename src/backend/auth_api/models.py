@@ -30,9 +30,17 @@ class TokenResponse(BaseModel):
     email: EmailStr
     name: Optional[str] = None
     token: str
+    refresh_token: Optional[str] = None
+    expires_in: Optional[int] = None
     isAdmin: bool = False
     emailVerified: bool = False
 
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
+class LogoutRequest(BaseModel):
+    refresh_token: Optional[str] = None
+
 # Email verification models
 class SendVerificationCodeRequest(BaseModel):
     email: EmailStr
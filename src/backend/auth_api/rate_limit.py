@@ -0,0 +1,219 @@
+"""
+Rate limiting for MatterAI Agent authentication endpoints
+Sliding-window limits per route, keyed by client IP and by email, checked before any password
+hashing or database work. Counters live in memory (per process) or in a shared Postgres table.
+For login, the per-email hit is refunded when the login succeeds, so only failed attempts count
+towards it and a known address cannot be locked out by its owner's own logins.
+"""
+import json
+import os
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from fastapi import HTTPException, Request, status
+
+load_dotenv()
+
+# route -> scope ("ip" | "email") -> [max requests, window seconds]
+DEFAULT_AUTH_RATE_LIMITS = {
+    "login": {"ip": [30, 60], "email": [10, 300]},
+    "send-verification-code": {"ip": [10, 600], "email": [3, 600]},
+    "verify-code": {"ip": [30, 60], "email": [10, 600]},
+}
+AUTH_RATE_LIMITS: Dict[str, Dict[str, List[float]]] = json.loads(
+    os.getenv("AUTH_RATE_LIMITS", json.dumps(DEFAULT_AUTH_RATE_LIMITS))
+)
+AUTH_RATE_LIMIT_BACKEND = os.getenv("AUTH_RATE_LIMIT_BACKEND", "memory")  # memory | postgres | off
+# Take the client IP from X-Forwarded-For (only behind a trusted reverse proxy)
+AUTH_RATE_LIMIT_TRUST_PROXY = os.getenv("AUTH_RATE_LIMIT_TRUST_PROXY", "false").lower() == "true"
+# Number of trusted proxies that append to X-Forwarded-For; the client is that many entries from the
+# right (entries further left are sent by the client itself and can be forged)
+AUTH_RATE_LIMIT_PROXY_HOPS = int(os.getenv("AUTH_RATE_LIMIT_PROXY_HOPS", "1"))
+# Routes whose email limit only counts failures (hits are refunded on success)
+EMAIL_FAILURES_ONLY_ROUTES = {"login"}
+
+# How often expired hits are swept (in checks)
+SWEEP_EVERY = 1000
+
+
+class MemoryRateLimitBackend:
+    """Sliding log of hit timestamps per key, in this process only"""
+
+    def __init__(self):
+        self._hits: Dict[str, Deque[float]] = {}
+
+    async def hit(self, key: str, limit: int, window: float) -> Optional[float]:
+        """Record a hit if under the limit; otherwise return seconds until the oldest hit leaves the window"""
+        now = time.monotonic()
+        hits = self._hits.setdefault(key, deque())
+        while hits and hits[0] <= now - window:
+            hits.popleft()
+        if len(hits) >= limit:
+            return hits[0] + window - now
+        hits.append(now)
+        return None
+
+    async def refund(self, key: str):
+        """Take back the latest hit of a key"""
+        hits = self._hits.get(key)
+        if hits:
+            hits.pop()
+
+    async def sweep(self, max_window: float):
+        cutoff = time.monotonic() - max_window
+        for key in [key for key, hits in self._hits.items() if not hits or hits[-1] <= cutoff]:
+            del self._hits[key]
+
+    def size(self) -> int:
+        return len(self._hits)
+
+
+class PostgresRateLimitBackend:
+    """Sliding log in an auth_rate_limit_hits table, shared by every worker using the pool"""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def initialize(self):
+        async with self.pool.acquire() as connection:
+            await connection.execute("""
+            CREATE TABLE IF NOT EXISTS auth_rate_limit_hits (
+                key VARCHAR(512) NOT NULL,
+                hit_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT clock_timestamp()
+            );
+            CREATE INDEX IF NOT EXISTS idx_auth_rate_limit_hits_key_time ON auth_rate_limit_hits (key, hit_at);
+            """)
+        print("✅ Auth rate limiter ready (postgres)")
+
+    async def hit(self, key: str, limit: int, window: float) -> Optional[float]:
+        # Under READ COMMITTED two concurrent statements would both count the same hits and both insert;
+        # a per-key advisory lock held until commit serialises them, so the count always sees the last hit
+        query = """
+        WITH recent AS (
+            SELECT count(*) AS hits, min(hit_at) AS oldest FROM auth_rate_limit_hits
+            WHERE key = $1 AND hit_at > clock_timestamp() - make_interval(secs => $2)
+        ), inserted AS (
+            INSERT INTO auth_rate_limit_hits (key) SELECT $1 FROM recent WHERE hits < $3 RETURNING 1
+        )
+        SELECT (SELECT count(*) FROM inserted) AS allowed,
+               EXTRACT(EPOCH FROM (oldest + make_interval(secs => $2) - clock_timestamp())) AS retry_after
+        FROM recent;
+        """
+        async with self.pool.acquire() as connection:
+            async with connection.transaction():
+                await connection.execute("SELECT pg_advisory_xact_lock(hashtext($1))", key)
+                row = await connection.fetchrow(query, key, float(window), int(limit))
+        if row['allowed']:
+            return None
+        return float(row['retry_after'] or window)
+
+    async def refund(self, key: str):
+        async with self.pool.acquire() as connection:
+            await connection.execute(
+                """
+                DELETE FROM auth_rate_limit_hits WHERE ctid = (
+                    SELECT ctid FROM auth_rate_limit_hits WHERE key = $1 ORDER BY hit_at DESC LIMIT 1
+                )
+                """,
+                key,
+            )
+
+    async def sweep(self, max_window: float):
+        async with self.pool.acquire() as connection:
+            await connection.execute(
+                "DELETE FROM auth_rate_limit_hits WHERE hit_at < clock_timestamp() - make_interval(secs => $1)",
+                float(max_window),
+            )
+
+    def size(self) -> Optional[int]:
+        return None
+
+
+class AuthRateLimiter:
+    """Per-route sliding-window limits by IP and email"""
+
+    def __init__(self, limits: Optional[Dict[str, Dict[str, List[float]]]] = None, backend_kind: str = AUTH_RATE_LIMIT_BACKEND):
+        self.limits = AUTH_RATE_LIMITS if limits is None else limits
+        self.backend_kind = backend_kind
+        self.backend = MemoryRateLimitBackend()
+        self.max_window = max((window for scopes in self.limits.values() for _, window in scopes.values()), default=0)
+        self.checks = 0
+        self.rejected: Dict[str, int] = {}
+
+    async def initialize(self, pool=None):
+        """Switch to the shared Postgres backend when AUTH_RATE_LIMIT_BACKEND=postgres"""
+        if self.backend_kind == "postgres":
+            if pool is None:
+                raise ValueError("AUTH_RATE_LIMIT_BACKEND=postgres requires a database pool")
+            backend = PostgresRateLimitBackend(pool)
+            await backend.initialize()
+            self.backend = backend
+
+    @staticmethod
+    def client_ip(request: Request) -> str:
+        if AUTH_RATE_LIMIT_TRUST_PROXY:
+            forwarded = request.headers.get("x-forwarded-for")
+            if forwarded:
+                entries = [entry.strip() for entry in forwarded.split(",") if entry.strip()]
+                if len(entries) >= AUTH_RATE_LIMIT_PROXY_HOPS:
+                    return entries[-AUTH_RATE_LIMIT_PROXY_HOPS]
+                if entries:
+                    # Fewer entries than hops: all were added by our proxies, the first is the client
+                    return entries[0]
+        return request.client.host if request.client else "unknown"
+
+    async def check(self, route: str, request: Request, email: Optional[str] = None):
+        """Raise 429 (with Retry-After) if this request exceeds any limit for the route"""
+        rules = self.limits.get(route)
+        if self.backend_kind == "off" or not rules:
+            return
+        self.checks += 1
+        if self.checks % SWEEP_EVERY == 0:
+            try:
+                await self.backend.sweep(self.max_window)
+            except Exception as e:
+                print(f"⚠️ Rate limit sweep failed: {e}")
+
+        subjects: List[Tuple[str, str]] = [("ip", self.client_ip(request))]
+        if email:
+            subjects.append(("email", email.strip().lower()))
+        for scope, value in subjects:
+            if scope not in rules:
+                continue
+            limit, window = rules[scope]
+            retry_after = await self.backend.hit(f"{route}:{scope}:{value}", int(limit), float(window))
+            if retry_after is not None:
+                self.rejected[route] = self.rejected.get(route, 0) + 1
+                print(f"🚫 Rate limited {route} by {scope}: {value}")
+                raise HTTPException(
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    detail="请求过于频繁，请稍后再试",
+                    headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
+                )
+
+    async def succeeded(self, route: str, email: Optional[str]):
+        """Refund the email hit of a successful attempt on routes that only limit failures"""
+        rules = self.limits.get(route)
+        if self.backend_kind == "off" or not rules or "email" not in rules or not email:
+            return
+        if route not in EMAIL_FAILURES_ONLY_ROUTES:
+            return
+        try:
+            await self.backend.refund(f"{route}:email:{email.strip().lower()}")
+        except Exception as e:
+            print(f"⚠️ Rate limit refund failed: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend_kind,
+            "limits": self.limits,
+            "checks": self.checks,
+            "rejected": self.rejected,
+            "tracked_keys": self.backend.size(),
+        }
+
+
+# Global rate limiter instance
+auth_rate_limiter = AuthRateLimiter()
@@ -0,0 +1,175 @@
+"""
+Pooled SMTP client for MatterAI Agent
+Keeps up to SMTP_POOL_SIZE authenticated connections open between messages, so a warm send is
+only the MAIL/RCPT/DATA exchange. The transport mode (implicit TLS, STARTTLS, or implicit TLS on
+port 465) is probed once, tried first from then on, and connections dropped by the server are
+replaced transparently.
+"""
+import asyncio
+import os
+import time
+from email.message import Message
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiosmtplib
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Pool configuration
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "2"))
+SMTP_TRANSPORT = os.getenv("SMTP_TRANSPORT", "auto")  # auto | tls | starttls | ssl465
+SMTP_CONNECT_TIMEOUT = float(os.getenv("SMTP_CONNECT_TIMEOUT", "10"))
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+# Servers close idle sessions after a few minutes; reconnect rather than reuse older ones
+SMTP_IDLE_SECONDS = float(os.getenv("SMTP_IDLE_SECONDS", "120"))
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", "100"))
+
+# mode -> (port or None for the configured port, use_tls, start_tls)
+TRANSPORT_MODES: Dict[str, Tuple[Optional[int], bool, bool]] = {
+    "tls": (None, True, False),
+    "starttls": (None, False, True),
+    "ssl465": (465, True, False),
+}
+
+# Errors after which a connection is unusable (the message can be retried on a fresh one)
+CONNECTION_ERRORS = (aiosmtplib.SMTPServerDisconnected, aiosmtplib.SMTPTimeoutError, ConnectionError, OSError)
+
+
+class _PooledConnection:
+    def __init__(self, client: aiosmtplib.SMTP):
+        self.client = client
+        self.last_used = time.monotonic()
+        self.messages = 0
+
+
+class SMTPConnectionPool:
+    """Authenticated SMTP connections reused across messages, with the working transport remembered"""
+
+    def __init__(
+        self,
+        hostname: str,
+        port: int,
+        username: Optional[str],
+        password: Optional[str],
+        size: int = SMTP_POOL_SIZE,
+        transport: str = SMTP_TRANSPORT,
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.size = max(1, size)
+        self.transport = transport
+        # The mode that last connected successfully
+        self.mode: Optional[str] = transport if transport in TRANSPORT_MODES else None
+        self._idle: List[_PooledConnection] = []
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.sent = 0
+        self.connections_opened = 0
+        self.reconnects = 0
+        self.failures = 0
+
+    def _candidate_modes(self) -> List[str]:
+        if self.transport in TRANSPORT_MODES:
+            return [self.transport]
+        # Port 465 speaks TLS from the first byte; 587/25 expect STARTTLS
+        modes = ["tls", "starttls", "ssl465"] if self.port == 465 else ["starttls", "tls", "ssl465"]
+        if self.mode in modes:
+            modes.remove(self.mode)
+            modes.insert(0, self.mode)
+        return modes
+
+    async def _connect(self) -> _PooledConnection:
+        errors = []
+        for mode in self._candidate_modes():
+            port, use_tls, start_tls = TRANSPORT_MODES[mode]
+            client = aiosmtplib.SMTP(
+                hostname=self.hostname,
+                port=port or self.port,
+                username=self.username,
+                password=self.password,
+                use_tls=use_tls,
+                start_tls=start_tls,
+                timeout=SMTP_TIMEOUT,
+            )
+            try:
+                # Connects, negotiates TLS and logs in
+                await client.connect(timeout=SMTP_CONNECT_TIMEOUT)
+            except aiosmtplib.SMTPAuthenticationError:
+                # Wrong credentials: another transport will not help
+                raise
+            except Exception as e:
+                errors.append(f"{mode}: {e}")
+                continue
+            if self.mode != mode:
+                print(f"📮 SMTP transport: {mode} ({self.hostname}:{port or self.port})")
+                self.mode = mode
+            self.connections_opened += 1
+            return _PooledConnection(client)
+        raise aiosmtplib.SMTPConnectError("; ".join(errors))
+
+    async def _acquire(self) -> Tuple[_PooledConnection, bool]:
+        """An idle connection if a fresh-enough one exists (reused=True), else a new one"""
+        now = time.monotonic()
+        while self._idle:
+            connection = self._idle.pop()
+            if connection.client.is_connected and now - connection.last_used < SMTP_IDLE_SECONDS:
+                return connection, True
+            connection.client.close()
+        return await self._connect(), False
+
+    def _release(self, connection: _PooledConnection):
+        if not connection.client.is_connected or connection.messages >= SMTP_MAX_MESSAGES_PER_CONNECTION:
+            connection.client.close()
+            return
+        connection.last_used = time.monotonic()
+        self._idle.append(connection)
+
+    async def send(self, message: Message):
+        """Send a message on a pooled connection; raises on failure"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.size)
+        async with self._semaphore:
+            while True:
+                connection, reused = await self._acquire()
+                try:
+                    await connection.client.send_message(message)
+                except CONNECTION_ERRORS:
+                    connection.client.close()
+                    if reused:
+                        # The server dropped the idle connection: retry once on a new one
+                        self.reconnects += 1
+                        continue
+                    self.failures += 1
+                    raise
+                except Exception:
+                    # Rejected message (e.g. refused recipient); the session itself is still usable
+                    self.failures += 1
+                    self._release(connection)
+                    raise
+                connection.messages += 1
+                self.sent += 1
+                self._release(connection)
+                return
+
+    async def close(self):
+        """QUIT every idle connection"""
+        idle, self._idle = self._idle, []
+        for connection in idle:
+            try:
+                await connection.client.quit()
+            except Exception:
+                connection.client.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "host": f"{self.hostname}:{self.port}",
+            "transport": self.mode or self.transport,
+            "pool_size": self.size,
+            "idle": len(self._idle),
+            "sent": self.sent,
+            "connections_opened": self.connections_opened,
+            "reconnects": self.reconnects,
+            "failures": self.failures,
+        }
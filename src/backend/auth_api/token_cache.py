@@ -0,0 +1,97 @@
+"""
+Verified JWT cache for MatterAI Agent
+Remembers the payload of tokens whose signature has already been checked, keyed by the token's
+SHA-256 digest (the raw token is never kept), until the token's own exp. Bounded LRU.
+"""
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Cache configuration
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+# Returns True if a (verified) payload has been revoked
+RevocationCheck = Callable[[Dict[str, Any]], bool]
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+class VerifiedTokenCache:
+    """LRU of verified JWT payloads, each valid until its exp claim"""
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        # Consulted on every hit so a revoked token stops working before it expires
+        self.revocation_checks: List[RevocationCheck] = []
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.revoked = 0
+
+    def _is_revoked(self, payload: Dict[str, Any]) -> bool:
+        return any(check(payload) for check in self.revocation_checks)
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Cached payload for an already verified token, or None (expired, revoked or unknown)"""
+        key = token_digest(token)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        payload, expires_at = entry
+        if time.time() >= expires_at:
+            del self._entries[key]
+            self.expired += 1
+            self.misses += 1
+            return None
+        if self._is_revoked(payload):
+            del self._entries[key]
+            self.revoked += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        # Callers get their own copy so a handler mutating it cannot poison the cache
+        return dict(payload)
+
+    def put(self, token: str, payload: Dict[str, Any]):
+        """Remember a payload whose signature and claims have just been verified"""
+        exp = payload.get("exp")
+        if not self.max_size or not isinstance(exp, (int, float)):
+            return
+        key = token_digest(token)
+        self._entries[key] = (dict(payload), float(exp))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, token: str):
+        self._entries.pop(token_digest(token), None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "expired": self.expired,
+            "revoked": self.revoked,
+        }
+
+
+# Global cache instance
+verified_token_cache = VerifiedTokenCache()
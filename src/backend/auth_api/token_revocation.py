@@ -0,0 +1,152 @@
+"""
+Access token revocation for MatterAI Agent
+Filter consulted on every authenticated request: single tokens are revoked by jti (logout), all
+of a user's tokens issued before a point in time by user id (password change or reset). Checks
+only read memory; with a database pool, revocations are also written to auth_token_revocations
+and every worker re-reads that table every TOKEN_REVOCATION_SYNC_SECONDS, so a revocation reaches
+the other workers within that interval and survives restarts. Entries only need to outlive the
+access token lifetime, so both the filter and the table stay small.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# How often revocations made by other workers are picked up
+TOKEN_REVOCATION_SYNC_SECONDS = float(os.getenv("TOKEN_REVOCATION_SYNC_SECONDS", "5"))
+
+
+class TokenRevocationFilter:
+    """Revoked jtis and per-user revocation cut-offs, each kept until the affected tokens expire"""
+
+    def __init__(self, max_token_lifetime_seconds: float, sync_seconds: float = TOKEN_REVOCATION_SYNC_SECONDS):
+        self.max_token_lifetime_seconds = max_token_lifetime_seconds
+        self.sync_seconds = sync_seconds
+        self.pool = None
+        self._revoked_jtis: Dict[str, float] = {}
+        self._users_revoked_before: Dict[str, int] = {}
+        self._syncer: Optional[asyncio.Task] = None
+        self.rejected = 0
+        self.sync_failures = 0
+
+    async def initialize(self, pool):
+        """Create the shared table, load the live revocations and start the periodic sync"""
+        async with pool.acquire() as connection:
+            await connection.execute("""
+            CREATE TABLE IF NOT EXISTS auth_token_revocations (
+                kind VARCHAR(8) NOT NULL,
+                subject VARCHAR(128) NOT NULL,
+                revoked_before BIGINT,
+                expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                PRIMARY KEY (kind, subject)
+            );
+            """)
+        self.pool = pool
+        await self.sync()
+        self.start()
+        print("✅ Token revocation list ready (postgres)")
+
+    def start(self):
+        """Start the periodic sync"""
+        if self._syncer is None or self._syncer.done():
+            self._syncer = asyncio.create_task(self._sync_loop())
+
+    async def close(self):
+        if self._syncer and not self._syncer.done():
+            self._syncer.cancel()
+            try:
+                await self._syncer
+            except asyncio.CancelledError:
+                pass
+
+    async def _sync_loop(self):
+        while True:
+            await asyncio.sleep(self.sync_seconds)
+            try:
+                await self.sync()
+            except Exception as e:
+                self.sync_failures += 1
+                print(f"❌ Token revocation sync failed: {e}")
+
+    async def sync(self):
+        """Merge the revocations recorded by every worker and drop expired rows"""
+        async with self.pool.acquire() as connection:
+            await connection.execute("DELETE FROM auth_token_revocations WHERE expires_at < now()")
+            rows = await connection.fetch(
+                "SELECT kind, subject, revoked_before, expires_at FROM auth_token_revocations"
+            )
+        for row in rows:
+            if row['kind'] == "jti":
+                self._revoked_jtis[row['subject']] = row['expires_at'].timestamp()
+            else:
+                cutoff = int(row['revoked_before'])
+                if cutoff > self._users_revoked_before.get(row['subject'], 0):
+                    self._users_revoked_before[row['subject']] = cutoff
+        self.sweep()
+
+    async def _persist(self, kind: str, subject: str, revoked_before: Optional[int], expires_at: float):
+        if self.pool is None:
+            return
+        async with self.pool.acquire() as connection:
+            await connection.execute(
+                """
+                INSERT INTO auth_token_revocations (kind, subject, revoked_before, expires_at)
+                VALUES ($1, $2, $3, $4)
+                ON CONFLICT (kind, subject) DO UPDATE SET
+                    revoked_before = GREATEST(auth_token_revocations.revoked_before, EXCLUDED.revoked_before),
+                    expires_at = GREATEST(auth_token_revocations.expires_at, EXCLUDED.expires_at)
+                """,
+                kind, subject, revoked_before, datetime.fromtimestamp(expires_at, timezone.utc),
+            )
+
+    async def revoke_token(self, payload: Dict[str, Any]):
+        """Revoke one access token (identified by its jti) until it expires"""
+        jti = payload.get("jti")
+        if jti:
+            self.sweep()
+            expires_at = float(payload.get("exp") or time.time() + self.max_token_lifetime_seconds)
+            self._revoked_jtis[jti] = expires_at
+            await self._persist("jti", jti, None, expires_at)
+
+    async def revoke_user(self, user_id: str):
+        """Revoke every access token of a user issued before now"""
+        self.sweep()
+        # iat has whole-second precision: tokens issued earlier in this second stay valid
+        cutoff = int(time.time())
+        self._users_revoked_before[str(user_id)] = cutoff
+        await self._persist("user", str(user_id), cutoff, cutoff + self.max_token_lifetime_seconds)
+
+    def is_revoked(self, payload: Dict[str, Any]) -> bool:
+        revoked = False
+        if payload.get("jti") in self._revoked_jtis:
+            revoked = True
+        else:
+            cutoff = self._users_revoked_before.get(str(payload.get("id")))
+            if cutoff is not None and payload.get("iat", 0) < cutoff:
+                revoked = True
+        if revoked:
+            self.rejected += 1
+        return revoked
+
+    def sweep(self):
+        """Forget entries whose tokens have all expired (run whenever an entry is added)"""
+        now = time.time()
+        self._revoked_jtis = {jti: exp for jti, exp in self._revoked_jtis.items() if exp > now}
+        oldest_live = now - self.max_token_lifetime_seconds
+        self._users_revoked_before = {
+            user_id: cutoff for user_id, cutoff in self._users_revoked_before.items() if cutoff > oldest_live
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "shared": self.pool is not None,
+            "revoked_tokens": len(self._revoked_jtis),
+            "revoked_users": len(self._users_revoked_before),
+            "rejected": self.rejected,
+            "sync_failures": self.sync_failures,
+        }
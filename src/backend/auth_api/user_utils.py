@@ -73,4 +73,15 @@ async def get_user_by_email(email: str) -> Optional[Dict]:
             return None
     except Exception as e:
         print(f"Error getting user by email: {str(e)}")
-        return None 
\ No newline at end of file
+        return None 
+
+async def get_user_profile_by_email(email: str) -> Optional[Dict]:
+    """Find user profile by email (cached, never includes the password hash)"""
+    try:
+        user = await db_manager.get_user_profile_by_email(email)
+        if not user:
+            print(f"No user found with email: {email}")
+        return user
+    except Exception as e:
+        print(f"Error getting user profile by email: {str(e)}")
+        return None
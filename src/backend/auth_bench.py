@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Authentication Load Benchmark for MatterAI Agent
+Measures throughput and p50/p99 latency of the auth_api routes (register, login, /me,
+JWT-only verification, refresh) at one or more concurrency levels.
+
+By default the routes run in this process (ASGI transport, no network) against the Postgres
+configured in .env, so bcrypt cost, hashing workers and DB pool size can be varied per run:
+
+    python auth_bench.py --concurrency 1,8,32 --bcrypt-rounds 10 --pool-max 40
+
+Use a scratch database: benchmark users (bench-<run>-*@example.com) are deleted afterwards.
+With --url the same scenarios run against a running server instead (its rate limits should be
+off, and the users it registers are not cleaned up).
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import sys
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+# Add the current directory to Python path to import the auth modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ["register", "login", "me", "verify", "refresh"]
+BENCH_PASSWORD = "bench-password-123"
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(fraction * len(sorted_values))
+    return sorted_values[min(len(sorted_values), max(1, rank)) - 1]
+
+
+async def run_load(make_request: Callable[[int], Any], total: int, concurrency: int) -> Dict[str, Any]:
+    """Issue `total` requests from `concurrency` workers; returns throughput, latency and status counts"""
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index
+        while next_index < total:
+            index = next_index
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                response = await make_request(index)
+                key = str(response.status_code)
+            except Exception as e:
+                key = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[key] = statuses.get(key, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ok = sum(count for key, count in statuses.items() if key.startswith("2"))
+    return {
+        "requests": total,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "ok": ok,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+        "max_ms": round(latencies[-1] * 1000, 1) if latencies else 0.0,
+        "statuses": statuses,
+    }
+
+
+class AuthBenchmark:
+    """Registers a pool of benchmark users, then drives each scenario at each concurrency level"""
+
+    def __init__(self, client: httpx.AsyncClient, run_id: str, users: int, requests: int):
+        self.client = client
+        self.run_id = run_id
+        self.users = users
+        self.requests = requests
+        self.registered = 0
+        self.accounts: List[Dict[str, str]] = []
+        # Report to the real stdout even while in-process server logging is silenced
+        self.out = sys.stdout
+
+    def new_email(self) -> str:
+        self.registered += 1
+        return f"bench-{self.run_id}-{self.registered}@example.com"
+
+    async def register(self, index: int) -> httpx.Response:
+        payload = {"email": self.new_email(), "password": BENCH_PASSWORD, "name": f"bench {index}"}
+        return await self.client.post("/auth/register", json=payload)
+
+    async def setup(self, concurrency: int):
+        """Register the users that login / me / verify / refresh cycle through (not timed)"""
+        print(f"👥 Registering {self.users} benchmark users...", file=self.out)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def register_one(i: int):
+            async with semaphore:
+                email = self.new_email()
+                response = await self.client.post(
+                    "/auth/register", json={"email": email, "password": BENCH_PASSWORD, "name": f"bench {i}"}
+                )
+                if response.status_code != 200:
+                    raise RuntimeError(f"Registering {email} failed: {response.status_code} {response.text[:200]}")
+                data = response.json()
+                self.accounts.append({"email": email, "token": data["token"], "refresh_token": data.get("refresh_token")})
+
+        await asyncio.gather(*(register_one(i) for i in range(self.users)))
+
+    def account(self, index: int) -> Dict[str, str]:
+        return self.accounts[index % len(self.accounts)]
+
+    async def login(self, index: int) -> httpx.Response:
+        account = self.account(index)
+        return await self.client.post("/auth/login", json={"email": account["email"], "password": BENCH_PASSWORD})
+
+    async def me(self, index: int) -> httpx.Response:
+        return await self.client.get("/auth/me", headers={"Authorization": f"Bearer {self.account(index)['token']}"})
+
+    async def verify(self, index: int) -> httpx.Response:
+        return await self.client.post("/auth/verify", json={"token": self.account(index)["token"]})
+
+    async def refresh(self, index: int) -> httpx.Response:
+        # Refresh tokens rotate: keep each account's latest one (concurrent reuse shows up as 401s)
+        account = self.account(index)
+        response = await self.client.post("/auth/refresh", json={"refresh_token": account["refresh_token"]})
+        if response.status_code == 200:
+            account["refresh_token"] = response.json()["refresh_token"]
+        return response
+
+    async def run(self, scenarios: List[str], concurrency_levels: List[int]) -> List[Dict[str, Any]]:
+        results = []
+        print(f"\n{'scenario':<10} {'conc':>5} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}  statuses", file=self.out)
+        print("-" * 80, file=self.out)
+        for scenario in scenarios:
+            make_request = getattr(self, scenario)
+            for concurrency in concurrency_levels:
+                # Warm-up round: opens pooled connections and fills caches before timing
+                await run_load(make_request, min(concurrency, self.requests), concurrency)
+                result = {"scenario": scenario, **await run_load(make_request, self.requests, concurrency)}
+                results.append(result)
+                print(f"{scenario:<10} {concurrency:>5} {result['rps']:>9.1f} {result['p50_ms']:>9.1f} "
+                      f"{result['p99_ms']:>9.1f} {result['max_ms']:>9.1f}  {result['statuses']}", file=self.out)
+        print("-" * 80, file=self.out)
+        return results
+
+
+def apply_server_settings(args: argparse.Namespace):
+    """Server-side knobs are read from the environment at import time, so set them before importing"""
+    settings = {
+        "BCRYPT_ROUNDS": args.bcrypt_rounds,
+        "PASSWORD_HASH_WORKERS": args.hash_workers,
+        "PASSWORD_HASH_EXECUTOR": args.hash_executor,
+        "DB_POOL_MIN_SIZE": args.pool_min,
+        "DB_POOL_MAX_SIZE": args.pool_max,
+    }
+    for name, value in settings.items():
+        if value is not None:
+            os.environ[name] = str(value)
+    # Every benchmark request comes from one client address
+    os.environ["AUTH_RATE_LIMIT_BACKEND"] = "off"
+
+
+async def run_in_process(args: argparse.Namespace, run_id: str, scenarios: List[str], levels: List[int]) -> Dict[str, Any]:
+    apply_server_settings(args)
+    from fastapi import FastAPI
+    from auth_api.auth_routes import router, jwt_key_ring
+    from auth_api.login_audit import login_audit
+    from database import db_manager, DB_POOL_CONFIG
+    from password_hashing import password_hasher
+
+    await db_manager.initialize()
+    await jwt_key_ring.initialize()
+    await login_audit.initialize(db_manager.pool)
+    app = FastAPI()
+    app.include_router(router)
+    server = {
+        "bcrypt_rounds": password_hasher.rounds,
+        "hash_executor": password_hasher.executor_kind,
+        "hash_workers": password_hasher.workers,
+        "db_pool_min": DB_POOL_CONFIG['min_size'],
+        "db_pool_max": DB_POOL_CONFIG['max_size'],
+        "jwt_algorithm": jwt_key_ring.algorithm,
+    }
+    print(f"⚙️  Server settings: {server}")
+
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as client:
+            bench = AuthBenchmark(client, run_id, args.users, args.requests)
+            # The routes log every request; printing would dominate the fast scenarios
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(sys.stdout if args.server_logs else devnull):
+                await bench.setup(max(levels))
+                results = await bench.run(scenarios, levels)
+        return {"server": server, "results": results}
+    finally:
+        await jwt_key_ring.close()
+        await login_audit.close()
+        async with db_manager.pool.acquire() as connection:
+            deleted = await connection.execute("DELETE FROM users WHERE email LIKE $1", f"bench-{run_id}-%")
+        print(f"🧹 Removed benchmark users ({deleted.split()[-1]})")
+        await db_manager.close()
+
+
+async def run_remote(args: argparse.Namespace, run_id: str, scenarios: List[str], levels: List[int]) -> Dict[str, Any]:
+    limits = httpx.Limits(max_connections=max(levels), max_keepalive_connections=max(levels))
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        server: Optional[Dict[str, Any]] = None
+        try:
+            status = await client.get("/cache-status")
+            if status.status_code == 200:
+                server = {key: status.json().get(key) for key in ("password_hashing", "auth_rate_limit")}
+                print(f"⚙️  Server settings: {server}")
+        except httpx.HTTPError:
+            pass
+        print(f"⚠️ Users bench-{run_id}-*@example.com are left in the target database")
+        bench = AuthBenchmark(client, run_id, args.users, args.requests)
+        await bench.setup(max(levels))
+        results = await bench.run(scenarios, levels)
+    return {"server": server, "results": results}
+
+
+async def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(description="Load benchmark for the auth_api routes")
+    parser.add_argument("--url", help="benchmark a running server instead of in-process routes")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma-separated subset of {SCENARIOS}")
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario and concurrency level")
+    parser.add_argument("--users", type=int, default=50, help="benchmark users to register for login/me/verify/refresh")
+    parser.add_argument("--timeout", type=float, default=60.0, help="per-request timeout in seconds")
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    # In-process server settings (defaults come from .env)
+    parser.add_argument("--bcrypt-rounds", type=int, help="fixed bcrypt cost (skips calibration)")
+    parser.add_argument("--hash-workers", type=int, help="password hashing workers")
+    parser.add_argument("--hash-executor", choices=["thread", "process"], help="password hashing executor")
+    parser.add_argument("--pool-min", type=int, help="DB pool min_size")
+    parser.add_argument("--pool-max", type=int, help="DB pool max_size")
+    parser.add_argument("--server-logs", action="store_true", help="keep the routes' own logging (in-process)")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios: {unknown}")
+    levels = [int(c) for c in args.concurrency.split(",")]
+    run_id = uuid.uuid4().hex[:8]
+
+    print(f"🎯 Auth benchmark {run_id}: {scenarios} at concurrency {levels}, {args.requests} requests each "
+          f"({'against ' + args.url if args.url else 'in-process'})")
+    if args.url:
+        report = await run_remote(args, run_id, scenarios, levels)
+    else:
+        report = await run_in_process(args, run_id, scenarios, levels)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"run_id": run_id, **report}, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
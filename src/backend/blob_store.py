@@ -0,0 +1,436 @@
+"""
+Content-addressed blob offload for MatterAI Agent session events
+Large function responses and inline data are moved out of the events table into a blob store
+(filesystem or Postgres), deduplicated by SHA-256; the stored event only keeps a reference,
+which is resolved again whenever the session is loaded. With a BlobReferences index, every
+offloaded blob is recorded against its session, and blobs no session references any more are
+deleted when sessions are deleted.
+"""
+import asyncio
+import contextlib
+import hashlib
+import json
+import os
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+
+import pydantic_core
+from dotenv import load_dotenv
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig
+from google.genai import types
+
+from session_store import SESSION_HISTORY_PAGE_EVENTS, ForwardingSessionService, SessionKey
+
+load_dotenv()
+
+# Blob offload configuration
+SESSION_BLOB_BACKEND = os.getenv("SESSION_BLOB_BACKEND", "filesystem").lower()  # filesystem | postgres | off
+SESSION_BLOB_DIR = os.getenv(
+    "SESSION_BLOB_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "session_blobs")
+)
+SESSION_BLOB_THRESHOLD_BYTES = int(os.getenv("SESSION_BLOB_THRESHOLD_BYTES", str(32 * 1024)))
+
+# Reference markers kept in the stored event content
+BLOB_REF_KEY = "$blob"
+BLOB_URI_PREFIX = "blob:sha256:"
+
+
+def blob_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class FilesystemBlobStore:
+    """Blobs as files under <root>/<aa>/<digest>, written atomically"""
+
+    def __init__(self, root: str = SESSION_BLOB_DIR):
+        self.root = root
+
+    async def initialize(self):
+        os.makedirs(self.root, exist_ok=True)
+        print(f"✅ Session blob store ready (filesystem: {self.root})")
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _put_sync(self, digest: str, data: bytes):
+        path = self._path(digest)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _get_sync(self, digest: str) -> Optional[bytes]:
+        try:
+            with open(self._path(digest), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _delete_sync(self, digest: str):
+        try:
+            os.remove(self._path(digest))
+        except FileNotFoundError:
+            pass
+
+    async def put(self, data: bytes, connection=None) -> str:
+        # connection: accepted for interface parity with PostgresBlobStore
+        digest = blob_digest(data)
+        await asyncio.to_thread(self._put_sync, digest, data)
+        return digest
+
+    async def get_many(self, digests: Iterable[str]) -> Dict[str, bytes]:
+        def read_all() -> Dict[str, bytes]:
+            found = {}
+            for digest in digests:
+                data = self._get_sync(digest)
+                if data is not None:
+                    found[digest] = data
+            return found
+        return await asyncio.to_thread(read_all)
+
+    async def delete(self, digest: str, connection=None):
+        await asyncio.to_thread(self._delete_sync, digest)
+
+    async def list_digests(self) -> List[str]:
+        def walk() -> List[str]:
+            return [
+                name
+                for _, _, names in os.walk(self.root)
+                for name in names if len(name) == 64 and not name.endswith(".tmp")
+            ]
+        return await asyncio.to_thread(walk)
+
+
+class PostgresBlobStore:
+    """Blobs in a session_blobs table keyed by digest, sharing the DatabaseManager pool"""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def initialize(self):
+        async with self.pool.acquire() as connection:
+            await connection.execute("""
+            CREATE TABLE IF NOT EXISTS session_blobs (
+                digest CHAR(64) PRIMARY KEY,
+                size INTEGER NOT NULL,
+                data BYTEA NOT NULL,
+                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+            );
+            """)
+        print("✅ Session blob store ready (postgres)")
+
+    @contextlib.asynccontextmanager
+    async def _connection(self, connection=None):
+        # Reuse a connection the caller already holds: acquiring a second one from the same pool
+        # while holding the first can exhaust the pool under concurrent uploads
+        if connection is not None:
+            yield connection
+            return
+        async with self.pool.acquire() as connection:
+            yield connection
+
+    async def put(self, data: bytes, connection=None) -> str:
+        digest = blob_digest(data)
+        async with self._connection(connection) as connection:
+            await connection.execute(
+                "INSERT INTO session_blobs (digest, size, data) VALUES ($1, $2, $3) ON CONFLICT (digest) DO NOTHING",
+                digest, len(data), data,
+            )
+        return digest
+
+    async def get_many(self, digests: Iterable[str]) -> Dict[str, bytes]:
+        async with self.pool.acquire() as connection:
+            rows = await connection.fetch(
+                "SELECT digest, data FROM session_blobs WHERE digest = ANY($1::text[])", list(digests)
+            )
+        return {row['digest']: bytes(row['data']) for row in rows}
+
+    async def delete(self, digest: str, connection=None):
+        async with self._connection(connection) as connection:
+            await connection.execute("DELETE FROM session_blobs WHERE digest = $1", digest)
+
+    async def list_digests(self) -> List[str]:
+        async with self.pool.acquire() as connection:
+            return [row['digest'] for row in await connection.fetch("SELECT digest FROM session_blobs")]
+
+
+def create_blob_store(pool=None):
+    """Pick the blob store backend from SESSION_BLOB_BACKEND (None when offload is disabled)"""
+    if SESSION_BLOB_BACKEND == "off":
+        return None
+    if SESSION_BLOB_BACKEND == "postgres":
+        if pool is None:
+            raise ValueError("SESSION_BLOB_BACKEND=postgres requires a database pool")
+        return PostgresBlobStore(pool)
+    return FilesystemBlobStore()
+
+
+class BlobReferences:
+    """
+    Which sessions reference which blobs (session_blob_refs), so unreferenced blobs can be collected.
+    Recording a reference and collecting a digest both hold a per-digest advisory lock, so a blob is
+    never deleted while another session is offloading the same content. Blobs that already existed
+    when the index was created are pinned (LEGACY_KEY): which sessions use them is unknown.
+    """
+
+    LEGACY_KEY: SessionKey = ("", "", "")
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.collected_blobs = 0
+
+    async def initialize(self, blob_store):
+        async with self.pool.acquire() as connection:
+            existed = await connection.fetchval("SELECT to_regclass('session_blob_refs') IS NOT NULL")
+            await connection.execute("""
+            CREATE TABLE IF NOT EXISTS session_blob_refs (
+                app_name TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                session_id TEXT NOT NULL,
+                digest CHAR(64) NOT NULL,
+                PRIMARY KEY (app_name, user_id, session_id, digest)
+            );
+            CREATE INDEX IF NOT EXISTS idx_session_blob_refs_digest ON session_blob_refs (digest);
+            """)
+            if not existed:
+                legacy = await blob_store.list_digests()
+                await connection.executemany(
+                    "INSERT INTO session_blob_refs (app_name, user_id, session_id, digest) VALUES ($1, $2, $3, $4) "
+                    "ON CONFLICT DO NOTHING",
+                    [(*self.LEGACY_KEY, digest) for digest in legacy],
+                )
+                if legacy:
+                    print(f"📌 Pinned {len(legacy)} existing session blobs (created before reference tracking)")
+
+    async def put(self, blob_store, key: SessionKey, data: bytes) -> str:
+        """Store a blob and record that the session references it"""
+        digest = blob_digest(data)
+        async with self.pool.acquire() as connection:
+            async with connection.transaction():
+                await connection.execute("SELECT pg_advisory_xact_lock(hashtext($1))", digest)
+                await connection.execute(
+                    "INSERT INTO session_blob_refs (app_name, user_id, session_id, digest) VALUES ($1, $2, $3, $4) "
+                    "ON CONFLICT DO NOTHING",
+                    *key, digest,
+                )
+                await blob_store.put(data, connection=connection)
+        return digest
+
+    async def release(self, blob_store, keys: List[SessionKey]) -> int:
+        """Forget the references of deleted sessions and delete blobs nothing references any more"""
+        if not keys:
+            return 0
+        async with self.pool.acquire() as connection:
+            rows = await connection.fetch(
+                """
+                DELETE FROM session_blob_refs r
+                USING unnest($1::text[], $2::text[], $3::text[]) AS k(app_name, user_id, session_id)
+                WHERE r.app_name = k.app_name AND r.user_id = k.user_id AND r.session_id = k.session_id
+                RETURNING r.digest
+                """,
+                [key[0] for key in keys], [key[1] for key in keys], [key[2] for key in keys],
+            )
+            collected = 0
+            for digest in {row['digest'] for row in rows}:
+                async with connection.transaction():
+                    await connection.execute("SELECT pg_advisory_xact_lock(hashtext($1))", digest)
+                    if await connection.fetchval("SELECT 1 FROM session_blob_refs WHERE digest = $1 LIMIT 1", digest):
+                        continue
+                    await blob_store.delete(digest, connection=connection)
+                    collected += 1
+        self.collected_blobs += collected
+        return collected
+
+
+class OffloadingSessionService(ForwardingSessionService):
+    """
+    Stores large payloads of persisted events in a blob store and resolves them on load.
+    Wraps the storage service directly (below write-behind batching): sessions held in memory
+    always keep the full events, only what reaches the events table is rewritten.
+    """
+
+    def __init__(
+        self,
+        inner: BaseSessionService,
+        blob_store,
+        references: Optional[BlobReferences] = None,
+        threshold: int = SESSION_BLOB_THRESHOLD_BYTES,
+    ):
+        super().__init__(inner)
+        self.blob_store = blob_store
+        self.references = references
+        self.threshold = threshold
+        self.offloaded_count = 0
+        self.offloaded_bytes = 0
+        self.missing_count = 0
+
+    async def _put(self, key: Optional[SessionKey], data: bytes) -> str:
+        if self.references is not None and key is not None:
+            return await self.references.put(self.blob_store, key, data)
+        return await self.blob_store.put(data)
+
+    async def _offload_part(self, part: types.Part, key: Optional[SessionKey] = None) -> Optional[types.Part]:
+        """Return a reference part if this part is above the threshold, None to keep it as is"""
+        if part.function_response and part.function_response.response:
+            try:
+                # JSON mode like ADK's own storage: datetimes, bytes and models become JSON values
+                payload = pydantic_core.to_json(part.function_response.response, fallback=str, bytes_mode="base64")
+            except Exception as e:
+                print(f"⚠️ Function response of {part.function_response.name} not serialisable, kept inline: {e}")
+                return None
+            if len(payload) < self.threshold:
+                return None
+            digest = await self._put(key, payload)
+            self.offloaded_count += 1
+            self.offloaded_bytes += len(payload)
+            return part.model_copy(update={
+                "function_response": part.function_response.model_copy(
+                    update={"response": {BLOB_REF_KEY: digest, "size": len(payload)}}
+                )
+            })
+        if part.inline_data and part.inline_data.data and len(part.inline_data.data) >= self.threshold:
+            digest = await self._put(key, part.inline_data.data)
+            self.offloaded_count += 1
+            self.offloaded_bytes += len(part.inline_data.data)
+            return types.Part(file_data=types.FileData(
+                file_uri=f"{BLOB_URI_PREFIX}{digest}",
+                mime_type=part.inline_data.mime_type,
+                display_name=part.inline_data.display_name,
+            ))
+        return None
+
+    async def offload_event(self, event: Event, key: Optional[SessionKey] = None) -> Event:
+        """Copy of the event with large parts replaced by blob references (the event itself is untouched)"""
+        if not event.content or not event.content.parts:
+            return event
+        parts: List[types.Part] = []
+        changed = False
+        for part in event.content.parts:
+            reference = await self._offload_part(part, key)
+            changed = changed or reference is not None
+            parts.append(reference or part)
+        if not changed:
+            return event
+        return event.model_copy(update={"content": event.content.model_copy(update={"parts": parts})})
+
+    @staticmethod
+    def _part_digest(part: types.Part) -> Optional[str]:
+        if part.function_response and isinstance(part.function_response.response, dict):
+            digest = part.function_response.response.get(BLOB_REF_KEY)
+            if isinstance(digest, str):
+                return digest
+        if part.file_data and part.file_data.file_uri and part.file_data.file_uri.startswith(BLOB_URI_PREFIX):
+            return part.file_data.file_uri[len(BLOB_URI_PREFIX):]
+        return None
+
+    async def resolve_events(self, events: List[Event]):
+        """Replace blob references in loaded events with their payloads, in place"""
+        digests = {
+            digest
+            for event in events if event.content and event.content.parts
+            for digest in map(self._part_digest, event.content.parts) if digest
+        }
+        if not digests:
+            return
+        blobs = await self.blob_store.get_many(digests)
+        for event in events:
+            if not event.content or not event.content.parts:
+                continue
+            for index, part in enumerate(event.content.parts):
+                digest = self._part_digest(part)
+                if not digest:
+                    continue
+                data = blobs.get(digest)
+                if data is None:
+                    self.missing_count += 1
+                    print(f"⚠️ Missing session blob {digest} (event {event.id})")
+                    continue
+                if part.function_response:
+                    part.function_response.response = json.loads(data.decode("utf-8"))
+                else:
+                    event.content.parts[index] = types.Part(inline_data=types.Blob(
+                        data=data,
+                        mime_type=part.file_data.mime_type,
+                        display_name=part.file_data.display_name,
+                    ))
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        session = await self.inner.get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id, config=config
+        )
+        if session is not None:
+            await self.resolve_events(session.events)
+        return session
+
+    async def iter_session_events(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        after: Optional[float] = None,
+        page_size: int = SESSION_HISTORY_PAGE_EVENTS,
+    ) -> AsyncIterator[List[Event]]:
+        async for page in super().iter_session_events(
+            app_name=app_name, user_id=user_id, session_id=session_id, after=after, page_size=page_size
+        ):
+            await self.resolve_events(page)
+            yield page
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        # Keep the full event in memory, persist the reference copy
+        await BaseSessionService.append_event(self, session, event)
+        key = (session.app_name, session.user_id, session.id)
+        session.last_update_time = await self.inner.append_events(
+            session, [await self.offload_event(event, key)], session.last_update_time
+        )
+        return event
+
+    async def append_events(self, session: Session, events: List[Event], last_update_time: float) -> float:
+        key = (session.app_name, session.user_id, session.id)
+        offloaded = [await self.offload_event(event, key) for event in events]
+        return await self.inner.append_events(session, offloaded, last_update_time)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await super().delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        await self._release_deleted([(app_name, user_id, session_id)])
+
+    async def delete_sessions(self, keys: List[SessionKey]) -> None:
+        await super().delete_sessions(keys)
+        await self._release_deleted(keys)
+
+    async def _release_deleted(self, keys: List[SessionKey]):
+        # The sessions are gone either way; a failed collection only leaves blobs behind
+        try:
+            await self.release_blobs(keys)
+        except Exception as e:
+            print(f"⚠️ Collecting blobs of {len(keys)} deleted sessions failed: {e}")
+
+    async def release_blobs(self, keys: List[SessionKey]) -> int:
+        """Collect the blobs only the given (deleted) sessions referenced"""
+        if self.references is None:
+            return 0
+        return await self.references.release(self.blob_store, keys)
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.blob_store).__name__,
+            "threshold_bytes": self.threshold,
+            "offloaded_parts": self.offloaded_count,
+            "offloaded_bytes": self.offloaded_bytes,
+            "missing_blobs": self.missing_count,
+            "collected_blobs": self.references.collected_blobs if self.references is not None else None,
+        }
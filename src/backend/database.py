@@ -1,13 +1,20 @@
 """
 Database connection and user authentication schema for MatterAI Agent
 """
+import base64
+import hashlib
 import os
+import secrets
+import time
+import uuid
+from collections import OrderedDict
 import asyncpg
-import bcrypt
 from datetime import datetime, timezone
-from typing import Optional, Dict, Any
+from typing import AsyncIterator, Optional, Dict, Any, List, Tuple
 from dotenv import load_dotenv
 
+from password_hashing import password_hasher
+
 load_dotenv()
 
 # Database configuration
@@ -19,11 +26,96 @@ DB_CONFIG = {
     'password': os.getenv("DB_PASSWORD")
 }
 
+# Connection pool settings (shared by the auth pool and the async session storage engine)
+DB_POOL_CONFIG = {
+    'min_size': int(os.getenv("DB_POOL_MIN_SIZE", "5")),
+    'max_size': int(os.getenv("DB_POOL_MAX_SIZE", "20")),
+    'acquire_timeout': float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "30")),
+    'statement_timeout_ms': int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000")),
+}
+
+# A rotated refresh token presented again within this many seconds (e.g. two tabs refreshing
+# at once) is rejected without revoking its family
+REFRESH_TOKEN_REUSE_GRACE_SECONDS = float(os.getenv("REFRESH_TOKEN_REUSE_GRACE_SECONDS", "30"))
+
+REVOKE_USER_REFRESH_TOKENS_QUERY = """
+UPDATE refresh_tokens SET revoked_at = CURRENT_TIMESTAMP WHERE user_id = $1 AND revoked_at IS NULL;
+"""
+
+# User directory listing (admin API, list_users.py): page size bounds
+USER_LIST_DEFAULT_LIMIT = 50
+USER_LIST_MAX_LIMIT = 500
+
+# User profile cache (per process; TTL bounds staleness across workers)
+USER_PROFILE_CACHE_TTL_SECONDS = float(os.getenv("USER_PROFILE_CACHE_TTL_SECONDS", "60"))
+USER_PROFILE_CACHE_SIZE = int(os.getenv("USER_PROFILE_CACHE_SIZE", "10000"))
+
+class UserProfileCache:
+    """TTL + LRU cache of user profiles (never includes password_hash), indexed by id and email"""
+    
+    def __init__(self, ttl_seconds: float = USER_PROFILE_CACHE_TTL_SECONDS, max_size: int = USER_PROFILE_CACHE_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._profiles: "OrderedDict[str, tuple]" = OrderedDict()
+        self._ids_by_email: Dict[str, str] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+    
+    def get(self, user_id: Optional[str] = None, email: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        if user_id is None and email is not None:
+            user_id = self._ids_by_email.get(email.strip().lower())
+        entry = self._profiles.get(str(user_id)) if user_id is not None else None
+        if entry is None or time.monotonic() >= entry[1]:
+            if entry is not None:
+                self._drop(str(user_id))
+            self.misses += 1
+            return None
+        self._profiles.move_to_end(str(user_id))
+        self.hits += 1
+        return dict(entry[0])
+    
+    def put(self, profile: Dict[str, Any]):
+        if not self.ttl_seconds or not self.max_size:
+            return
+        profile = {k: v for k, v in profile.items() if k != 'password_hash'}
+        user_id = str(profile['id'])
+        self._drop(user_id)
+        self._profiles[user_id] = (profile, time.monotonic() + self.ttl_seconds)
+        self._ids_by_email[profile['email'].lower()] = user_id
+        while len(self._profiles) > self.max_size:
+            self._drop(next(iter(self._profiles)))
+    
+    def _drop(self, user_id: str):
+        entry = self._profiles.pop(user_id, None)
+        if entry is not None and self._ids_by_email.get(entry[0]['email'].lower()) == user_id:
+            del self._ids_by_email[entry[0]['email'].lower()]
+    
+    def invalidate(self, user_id: Optional[str] = None, email: Optional[str] = None):
+        """Drop a user's profile (by id or email) after a write"""
+        if user_id is None and email is not None:
+            user_id = self._ids_by_email.get(email.strip().lower())
+        if user_id is not None:
+            self._drop(str(user_id))
+            self.invalidations += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._profiles),
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
 class DatabaseManager:
     """Database manager for user authentication"""
     
     def __init__(self):
         self.pool = None
+        self.profile_cache = UserProfileCache()
     
     async def initialize(self):
         """Initialize database connection pool"""
@@ -35,11 +127,14 @@ class DatabaseManager:
                 database=DB_CONFIG['database'],
                 user=DB_CONFIG['user'],
                 password=DB_CONFIG['password'],
-                min_size=5,
-                max_size=20
+                min_size=DB_POOL_CONFIG['min_size'],
+                max_size=DB_POOL_CONFIG['max_size'],
+                server_settings={'statement_timeout': str(DB_POOL_CONFIG['statement_timeout_ms'])}
             )
             print("✅ Database connection pool initialized")
             await self.create_users_table()
+            await self.create_refresh_tokens_table()
+            await password_hasher.calibrate()
         except Exception as e:
             print(f"❌ Failed to initialize database: {e}")
             raise
@@ -73,7 +168,20 @@ class DatabaseManager:
             PERFORM setval(seq_name, max_id, true);
         END $$;
         
-        CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
+        -- Every email lookup goes through lower(email); the unique index also makes registration
+        -- a single INSERT ... ON CONFLICT ((lower(email))) DO NOTHING. Startup fails (and the old
+        -- idx_users_email is kept) until case-variant duplicates have been merged by hand.
+        DO $$
+        BEGIN
+            IF EXISTS (SELECT 1 FROM users GROUP BY lower(email) HAVING count(*) > 1) THEN
+                RAISE EXCEPTION 'users contains emails differing only by case; merge them before idx_users_email_lower can be created';
+            END IF;
+        END $$;
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email_lower ON users (lower(email));
+        DROP INDEX IF EXISTS idx_users_email;
+        
+        -- User listings are paged by (created_at, id), newest first
+        CREATE INDEX IF NOT EXISTS idx_users_created_id ON users (created_at DESC, id DESC);
         
         -- Add new columns to existing table if they don't exist
         DO $$
@@ -96,88 +204,93 @@ class DatabaseManager:
                 ALTER TABLE users ADD COLUMN verification_email VARCHAR(255);
             END IF;
         END $$;
+        
+        -- Maintained in batches by the login audit log (auth_api/login_audit.py)
+        ALTER TABLE users ADD COLUMN IF NOT EXISTS last_login_at TIMESTAMP WITH TIME ZONE;
         """
         
         async with self.pool.acquire() as connection:
             await connection.execute(create_table_query)
         print("✅ Users table created/verified")
     
+    async def create_refresh_tokens_table(self):
+        """Create refresh_tokens table if it doesn't exist (only token digests are stored)"""
+        create_table_query = """
+        CREATE TABLE IF NOT EXISTS refresh_tokens (
+            id BIGSERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+            token_hash CHAR(64) UNIQUE NOT NULL,
+            family_id UUID NOT NULL,
+            expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            revoked_at TIMESTAMP WITH TIME ZONE
+        );
+        
+        CREATE INDEX IF NOT EXISTS idx_refresh_tokens_user ON refresh_tokens(user_id);
+        CREATE INDEX IF NOT EXISTS idx_refresh_tokens_family ON refresh_tokens(family_id);
+        """
+        
+        async with self.pool.acquire() as connection:
+            await connection.execute(create_table_query)
+        print("✅ Refresh tokens table created/verified")
+    
     async def close(self):
         """Close database connection pool"""
         if self.pool:
             await self.pool.close()
             print("✅ Database connection pool closed")
+        password_hasher.close()
     
-    def hash_password(self, password: str) -> str:
-        """Hash password using bcrypt"""
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    async def hash_password(self, password: str) -> str:
+        """Hash password using bcrypt (on the hashing worker pool)"""
+        return await password_hasher.hash(password)
     
-    def verify_password(self, password: str, hashed: str) -> bool:
-        """Verify password against hash"""
-        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    async def verify_password(self, password: str, hashed: str) -> bool:
+        """Verify password against hash (on the hashing worker pool)"""
+        return await password_hasher.verify(password, hashed)
     
     async def create_user(self, name: str, email: str, password: str, is_admin: bool = False, email_verified: bool = False) -> Dict[str, Any]:
         """Create a new user"""
         normalized_email = email.strip().lower()
-        password_hash = self.hash_password(password)
+        password_hash = await self.hash_password(password)
         created_at = datetime.now(timezone.utc)
         
         query = """
         INSERT INTO users (name, email, password_hash, is_admin, email_verified, created_at, updated_at)
         VALUES ($1, $2, $3, $4, $5, $6, $6)
+        ON CONFLICT ((lower(email))) DO NOTHING
         RETURNING id, name, email, is_admin, email_verified, created_at;
         """
         
         try:
+            # Single round trip: only an existing email (unique on lower(email)) yields no row;
+            # any other constraint violation is raised
             async with self.pool.acquire() as connection:
-                # Double-check existing user to improve error messages
-                existing = await connection.fetchrow(
-                    "SELECT 1 FROM users WHERE lower(email) = lower($1)",
-                    normalized_email,
-                )
-                if existing:
-                    raise ValueError("User with this email already exists")
                 result = await connection.fetchrow(
                     query, name, normalized_email, password_hash, is_admin, email_verified, created_at
                 )
-                
-                return {
-                    "id": str(result['id']),
-                    "name": result['name'],
-                    "email": result['email'],
-                    "isAdmin": result['is_admin'],
-                    "emailVerified": result['email_verified'],
-                    "createdAt": result['created_at']
-                }
-        except asyncpg.UniqueViolationError as e:
-            # Extra diagnostics to locate real conflict source
-            try:
-                print("⚠️ UniqueViolation on users(email)")
-                print(f"   error: {repr(e)}")
-                async with self.pool.acquire() as diag_conn:
-                    row_exact = await diag_conn.fetchrow(
-                        "SELECT id, email FROM users WHERE email = $1 LIMIT 1",
-                        normalized_email,
-                    )
-                    row_ilower = await diag_conn.fetchrow(
-                        "SELECT id, email FROM users WHERE lower(email) = lower($1) LIMIT 1",
-                        normalized_email,
-                    )
-                    print(f"   exact_match: {row_exact}")
-                    print(f"   lower_match: {row_ilower}")
-            except Exception as diag_e:
-                print(f"   diag_failed: {diag_e}")
-            raise ValueError("User with this email already exists")
         except Exception as e:
             print(f"❌ Error creating user: {e}")
             raise
+        
+        if result is None:
+            raise ValueError("User with this email already exists")
+        
+        return {
+            "id": str(result['id']),
+            "name": result['name'],
+            "email": result['email'],
+            "isAdmin": result['is_admin'],
+            "emailVerified": result['email_verified'],
+            "createdAt": result['created_at']
+        }
     
     async def get_user_by_email(self, email: str) -> Optional[Dict[str, Any]]:
         """Get user by email"""
         query = """
         SELECT id, name, email, password_hash, is_admin, email_verified, verification_email, created_at
         FROM users 
-        WHERE lower(email) = lower($1);
+        WHERE lower(email) = $1;
         """
         
         async with self.pool.acquire() as connection:
@@ -200,7 +313,7 @@ class DatabaseManager:
         """Verify user credentials"""
         user = await self.get_user_by_email(email)
         
-        if user and self.verify_password(password, user['password_hash']):
+        if user and await self.verify_password(password, user['password_hash']):
             # Remove password_hash from response
             user_response = user.copy()
             user_response.pop('password_hash')
@@ -216,22 +329,26 @@ class DatabaseManager:
             return False
         
         # Verify current password
-        if not self.verify_password(current_password, user['password_hash']):
+        if not await self.verify_password(current_password, user['password_hash']):
             return False
         
         # Update password
-        new_password_hash = self.hash_password(new_password)
+        new_password_hash = await self.hash_password(new_password)
         update_query = """
         UPDATE users 
         SET password_hash = $1, updated_at = $2
-        WHERE email = $3;
+        WHERE lower(email) = $3;
         """
         
         try:
             async with self.pool.acquire() as connection:
-                await connection.execute(
-                    update_query, new_password_hash, datetime.now(timezone.utc), email.lower()
-                )
+                async with connection.transaction():
+                    await connection.execute(
+                        update_query, new_password_hash, datetime.now(timezone.utc), email.strip().lower()
+                    )
+                    # Sign out every other device
+                    await connection.execute(REVOKE_USER_REFRESH_TOKENS_QUERY, int(user['id']))
+            self.profile_cache.invalidate(user_id=user['id'])
             return True
         except Exception as e:
             print(f"❌ Error changing password: {e}")
@@ -242,12 +359,13 @@ class DatabaseManager:
         query = """
         UPDATE users 
         SET email_verified = TRUE, updated_at = $1
-        WHERE email = $2;
+        WHERE lower(email) = $2;
         """
         
         try:
             async with self.pool.acquire() as connection:
-                await connection.execute(query, datetime.now(timezone.utc), email.lower())
+                await connection.execute(query, datetime.now(timezone.utc), email.strip().lower())
+            self.profile_cache.invalidate(email=email)
             return True
         except Exception as e:
             print(f"❌ Error verifying email: {e}")
@@ -264,6 +382,7 @@ class DatabaseManager:
         try:
             async with self.pool.acquire() as connection:
                 await connection.execute(query, verification_email.lower(), datetime.now(timezone.utc), user_id)
+            self.profile_cache.invalidate(user_id=user_id)
             return True
         except Exception as e:
             print(f"❌ Error updating verification email: {e}")
@@ -283,6 +402,7 @@ class DatabaseManager:
         try:
             async with self.pool.acquire() as connection:
                 result = await connection.execute(query, datetime.now(timezone.utc), user_id)
+                self.profile_cache.invalidate(user_id=user_id)
                 # Check if any row was updated
                 return result != "UPDATE 0"
         except Exception as e:
@@ -290,7 +410,11 @@ class DatabaseManager:
             return False
     
     async def get_user_by_id(self, user_id: int) -> Optional[Dict[str, Any]]:
-        """Get user by ID"""
+        """Get user by ID (served from the profile cache when fresh)"""
+        cached = self.profile_cache.get(user_id=user_id)
+        if cached is not None:
+            return cached
+        
         query = """
         SELECT id, name, email, is_admin, email_verified, verification_email, created_at
         FROM users 
@@ -306,7 +430,7 @@ class DatabaseManager:
             result = await connection.fetchrow(query, id_param)
             
             if result:
-                return {
+                user = {
                     "id": str(result['id']),
                     "name": result['name'],
                     "email": result['email'],
@@ -315,24 +439,211 @@ class DatabaseManager:
                     "verificationEmail": result['verification_email'],
                     "createdAt": result['created_at']
                 }
+                self.profile_cache.put(user)
+                return user
             return None
     
+    async def get_user_profile_by_email(self, email: str) -> Optional[Dict[str, Any]]:
+        """Get user profile (without password hash) by email, served from the profile cache when fresh"""
+        cached = self.profile_cache.get(email=email)
+        if cached is not None:
+            return cached
+        
+        user = await self.get_user_by_email(email)
+        if user:
+            user.pop('password_hash')
+            self.profile_cache.put(user)
+        return user
+    
+    async def list_users_page(
+        self,
+        limit: int = USER_LIST_DEFAULT_LIMIT,
+        cursor: Optional[str] = None,
+        verified: Optional[bool] = None,
+        admin: Optional[bool] = None,
+        created_from: Optional[datetime] = None,
+        created_to: Optional[datetime] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One page of users, newest first, and the cursor of the next page (None on the last page)
+        
+        Keyset pagination on (created_at, id): every page is an index range scan, however deep.
+        Raises ValueError for a malformed cursor.
+        """
+        limit = max(1, min(int(limit), USER_LIST_MAX_LIMIT))
+        conditions, args = [], []
+        if verified is not None:
+            args.append(verified)
+            conditions.append(f"email_verified = ${len(args)}")
+        if admin is not None:
+            args.append(admin)
+            conditions.append(f"is_admin = ${len(args)}")
+        if created_from is not None:
+            args.append(created_from)
+            conditions.append(f"created_at >= ${len(args)}")
+        if created_to is not None:
+            args.append(created_to)
+            conditions.append(f"created_at < ${len(args)}")
+        if cursor:
+            after_created_at, after_id = decode_user_cursor(cursor)
+            args.extend([after_created_at, after_id])
+            conditions.append(f"(created_at, id) < (${len(args) - 1}, ${len(args)})")
+        args.append(limit + 1)
+        
+        query = f"""
+        SELECT id, name, email, is_admin, email_verified, verification_email, created_at, updated_at, last_login_at
+        FROM users
+        {"WHERE " + " AND ".join(conditions) if conditions else ""}
+        ORDER BY created_at DESC, id DESC
+        LIMIT ${len(args)};
+        """
+        
+        async with self.pool.acquire() as connection:
+            rows = await connection.fetch(query, *args)
+        
+        users = [
+            {
+                "id": str(row['id']),
+                "name": row['name'],
+                "email": row['email'],
+                "isAdmin": row['is_admin'],
+                "emailVerified": row['email_verified'],
+                "verificationEmail": row['verification_email'],
+                "createdAt": row['created_at'],
+                "updatedAt": row['updated_at'],
+                "lastLoginAt": row['last_login_at'],
+            }
+            for row in rows[:limit]
+        ]
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = encode_user_cursor(last['created_at'], last['id'])
+        return users, next_cursor
+    
+    async def iter_users(self, cursor: Optional[str] = None, batch_size: int = USER_LIST_MAX_LIMIT, **filters) -> AsyncIterator[Dict[str, Any]]:
+        """Yield every matching user (filters as in list_users_page), fetching one page at a time"""
+        while True:
+            users, cursor = await self.list_users_page(limit=batch_size, cursor=cursor, **filters)
+            for user in users:
+                yield user
+            if cursor is None:
+                return
+    
+    async def count_users(self) -> int:
+        """Total number of users"""
+        async with self.pool.acquire() as connection:
+            return await connection.fetchval("SELECT count(*) FROM users;")
+    
     async def reset_password_with_email(self, email: str, new_password: str) -> bool:
         """Reset password using email (for email-verified password reset)"""
-        new_password_hash = self.hash_password(new_password)
+        new_password_hash = await self.hash_password(new_password)
         query = """
         UPDATE users 
         SET password_hash = $1, updated_at = $2
-        WHERE email = $3 AND email_verified = TRUE;
+        WHERE lower(email) = $3 AND email_verified = TRUE
+        RETURNING id;
         """
         
         try:
             async with self.pool.acquire() as connection:
-                result = await connection.execute(query, new_password_hash, datetime.now(timezone.utc), email.lower())
-                return result != "UPDATE 0"
+                async with connection.transaction():
+                    user_id = await connection.fetchval(query, new_password_hash, datetime.now(timezone.utc), email.strip().lower())
+                    if user_id is not None:
+                        await connection.execute(REVOKE_USER_REFRESH_TOKENS_QUERY, user_id)
+                self.profile_cache.invalidate(email=email)
+                return user_id is not None
         except Exception as e:
             print(f"❌ Error resetting password: {e}")
             return False
 
+    async def create_refresh_token(self, user_id: str, expires_at: datetime, family_id: Optional[str] = None) -> str:
+        """Issue a refresh token (a new family unless one is given); only its digest is stored"""
+        token = secrets.token_urlsafe(32)
+        query = """
+        INSERT INTO refresh_tokens (user_id, token_hash, family_id, expires_at)
+        VALUES ($1, $2, $3, $4);
+        """
+        async with self.pool.acquire() as connection:
+            await connection.execute(
+                query, int(user_id), refresh_token_digest(token), uuid.UUID(str(family_id or uuid.uuid4())), expires_at
+            )
+        return token
+    
+    async def rotate_refresh_token(self, token: str, expires_at: datetime) -> Optional[Tuple[Dict[str, Any], str]]:
+        """
+        Exchange a refresh token for a new one in the same family; returns (user, new token) or None.
+        Presenting an already rotated token outside the reuse grace period revokes its whole family.
+        """
+        digest = refresh_token_digest(token)
+        async with self.pool.acquire() as connection:
+            async with connection.transaction():
+                row = await connection.fetchrow("""
+                UPDATE refresh_tokens SET revoked_at = CURRENT_TIMESTAMP
+                WHERE token_hash = $1 AND revoked_at IS NULL AND expires_at > CURRENT_TIMESTAMP
+                RETURNING user_id, family_id;
+                """, digest)
+                if row is None:
+                    # Reuse of a rotated token: a stolen copy is in use, sign the family out
+                    family_id = await connection.fetchval("""
+                    SELECT family_id FROM refresh_tokens
+                    WHERE token_hash = $1 AND revoked_at < CURRENT_TIMESTAMP - make_interval(secs => $2)
+                    """, digest, float(REFRESH_TOKEN_REUSE_GRACE_SECONDS))
+                    if family_id is not None:
+                        await connection.execute(
+                            "UPDATE refresh_tokens SET revoked_at = CURRENT_TIMESTAMP WHERE family_id = $1 AND revoked_at IS NULL",
+                            family_id,
+                        )
+                        print(f"⚠️ Refresh token reuse detected, revoked token family {family_id}")
+                    return None
+                new_token = secrets.token_urlsafe(32)
+                await connection.execute("""
+                INSERT INTO refresh_tokens (user_id, token_hash, family_id, expires_at)
+                VALUES ($1, $2, $3, $4);
+                """, row['user_id'], refresh_token_digest(new_token), row['family_id'], expires_at)
+        
+        user = await self.get_user_by_id(row['user_id'])
+        if not user:
+            return None
+        return user, new_token
+    
+    async def revoke_refresh_token_family(self, token: str) -> bool:
+        """Revoke a refresh token and every token rotated from the same login (logout)"""
+        query = """
+        UPDATE refresh_tokens SET revoked_at = CURRENT_TIMESTAMP
+        WHERE family_id = (SELECT family_id FROM refresh_tokens WHERE token_hash = $1) AND revoked_at IS NULL;
+        """
+        try:
+            async with self.pool.acquire() as connection:
+                result = await connection.execute(query, refresh_token_digest(token))
+                return result != "UPDATE 0"
+        except Exception as e:
+            print(f"❌ Error revoking refresh token: {e}")
+            return False
+    
+    async def purge_expired_refresh_tokens(self) -> int:
+        """Delete refresh tokens that expired (or were revoked) more than the retention period ago"""
+        query = """
+        DELETE FROM refresh_tokens
+        WHERE expires_at < CURRENT_TIMESTAMP - INTERVAL '1 day' OR revoked_at < CURRENT_TIMESTAMP - INTERVAL '1 day';
+        """
+        async with self.pool.acquire() as connection:
+            result = await connection.execute(query)
+        return int(result.split()[-1])
+
+def refresh_token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+def encode_user_cursor(created_at: datetime, user_id: int) -> str:
+    """Opaque user listing cursor for the row (created_at, id)"""
+    return base64.urlsafe_b64encode(f"{created_at.isoformat()}|{user_id}".encode()).decode().rstrip("=")
+
+def decode_user_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_user_cursor; raises ValueError for a malformed cursor"""
+    try:
+        created_at, user_id = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().split("|")
+        return datetime.fromisoformat(created_at), int(user_id)
+    except (UnicodeDecodeError, TypeError, ValueError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
 # Global database instance
 db_manager = DatabaseManager()
\ No newline at end of file
@@ -5,7 +5,8 @@ from google.adk.agents import LlmAgent
 from google.adk.models.lite_llm import LiteLlm
 from google.adk.runners import Runner
 from google.adk.artifacts import InMemoryArtifactService
-from google.adk.sessions import DatabaseSessionService
+from google.adk.sessions import BaseSessionService
+from google.adk.sessions.base_session_service import GetSessionConfig
 from google.genai import types 
 from google.adk.agents.run_config import RunConfig, StreamingMode
 import asyncio
@@ -20,7 +21,7 @@ from fastapi.responses import StreamingResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 # 静态文件服务已移除，文件现由外部服务处理
 # from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, AsyncGenerator, Any, Dict
 import json
 import uuid
@@ -37,14 +38,27 @@ PRESET_TOOLS_CONFIG = config_module.PRESET_TOOLS_CONFIG
 MINDS_TOOLS_CONFIG = config_module.MINDS_TOOLS_CONFIG
 AGENT_CONFIGS = config_module.AGENT_CONFIGS
 # 导入认证相关模块
-from auth_api.auth_routes import router as auth_router, get_current_user
+from auth_api.auth_routes import router as auth_router, jwks_router, get_current_user, jwt_key_ring, token_revocation
+from auth_api.token_cache import verified_token_cache
+from auth_api.rate_limit import auth_rate_limiter
+from auth_api.login_audit import login_audit
 from database import db_manager
-from auth_api.email_service import start_cleanup_task
+from auth_api.email_service import email_service, start_cleanup_task
 from fastapi.security import HTTPBearer
 from fastapi import Depends
 from google.adk.tools import load_artifacts,get_user_choice
 from Config import model
 from base_tool import save_file_to_artifact,load_artifacts_file
+from session_search import SearchIndexingSessionService, create_search_index
+from session_store import BatchingSessionService, CachedSessionService, VersionedDatabaseSessionService, iter_session_events, list_recent_sessions
+from async_session_service import AsyncDatabaseSessionService
+from blob_store import BlobReferences, OffloadingSessionService, create_blob_store
+from session_compaction import CompactingSessionService, SessionCompactor
+from session_archive import ArchivingSessionService, SessionArchiver
+from session_history import SessionExporter, gzip_chunks, process_events, stream_history_json
+from session_retention import SessionRetentionManager
+from request_coalescing import request_coalescer
+from password_hashing import password_hasher
 load_dotenv(override=True)
 planner = PlanReActPlanner()
 APP_NAME = "chatbot"
@@ -77,6 +91,8 @@ DB_CONFIG = {
 
 # 构建数据库URL
 DATABASE_URL = f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
+# 会话存储驱动：async（asyncpg，不阻塞事件循环）或 sync（ADK 同步 SQLAlchemy 实现）
+SESSION_DB_DRIVER = os.getenv("SESSION_DB_DRIVER", "async").lower()
 
 
 async def create_or_get_session(runner, user_id, session_id=None):
@@ -393,10 +409,31 @@ async def periodic_cleanup_task():
                     print("✅ 没有过期的会话需要清理")
             else:
                 print("📊 当前没有缓存的智能体")
+            
+            # 清理过期/已吊销的刷新令牌
+            purged = await db_manager.purge_expired_refresh_tokens()
+            if purged:
+                print(f"🗑️ 已清理 {purged} 个过期的刷新令牌")
                 
         except Exception as e:
             print(f"❌ 定期清理任务异常: {str(e)}")
 
+async def evict_deleted_sessions(keys):
+    """会话被删除后，关闭其缓存的智能体并删除其产物（artifact）"""
+    for app_name, user_id, session_id in keys:
+        session_key = f"{user_id}:{session_id}"
+        session_runner = session_agents.pop(session_key, None)
+        session_agent_configs.pop(session_key, None)
+        session_last_access.pop(session_key, None)
+        if session_runner is not None:
+            try:
+                await session_runner.close()
+                print(f"🧹 已关闭被删除会话的智能体: {session_key}")
+            except Exception as e:
+                print(f"⚠️ 关闭会话 {session_key} 智能体时出错: {str(e)}")
+        for filename in await artifact_service.list_artifact_keys(app_name=app_name, user_id=user_id, session_id=session_id):
+            await artifact_service.delete_artifact(app_name=app_name, user_id=user_id, session_id=session_id, filename=filename)
+
 # 全局清理任务引用
 cleanup_task: Optional[asyncio.Task] = None
 
@@ -409,7 +446,16 @@ UPLOAD_DIR = os.path.join(BASE_DIR, "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 # 运行资源
 runner: Optional[Runner] = None
-session_service: Optional[DatabaseSessionService] = None
+session_service: Optional[BaseSessionService] = None
+session_search_service: Optional[SearchIndexingSessionService] = None
+session_cache_service: Optional[CachedSessionService] = None
+session_batching_service: Optional[BatchingSessionService] = None
+session_storage_service: Optional[BaseSessionService] = None
+session_offloading_service: Optional[OffloadingSessionService] = None
+session_compactor: Optional[SessionCompactor] = None
+session_archiver: Optional[SessionArchiver] = None
+session_exporter: Optional[SessionExporter] = None
+session_retention: Optional[SessionRetentionManager] = None
 
 # 会话级智能体缓存 (键格式: "user_id:session_id")
 session_agents: Dict[str, Runner] = {}
@@ -417,18 +463,71 @@ session_agent_configs: Dict[str, Any] = {}  # 存储每个会话的工具配置
 
 @asynccontextmanager
 async def lifespan(_app: FastAPI):  # app 参数不使用，改名避免警告
-    global runner, session_service, cleanup_task
+    global runner, session_service, session_search_service, session_cache_service, session_batching_service, session_storage_service, session_offloading_service, session_compactor, session_archiver, session_exporter, session_retention, cleanup_task
     # 启动时执行
     print("🔄 启动 FastAPI 应用生命周期...")
     try:
-        print("🔗 正在初始化数据库服务...")
-        session_service = DatabaseSessionService(DATABASE_URL)
-        print("✅ 数据库服务初始化成功")
-        
         print("🔗 正在初始化用户认证数据库...")
         await db_manager.initialize()
+        await auth_rate_limiter.initialize(db_manager.pool)
+        # 登录审计：事件先入内存队列，后台批量写入
+        await login_audit.initialize(db_manager.pool)
+        # 加载 JWT 签名密钥（到期时自动轮换），之后由后台任务定期刷新
+        await jwt_key_ring.initialize()
+        # 访问令牌吊销记录存入数据库，各 worker 定期同步
+        await token_revocation.initialize(db_manager.pool)
         print("✅ 用户认证数据库初始化成功")
         
+        print("🔗 正在初始化数据库服务...")
+        search_index = create_search_index(db_manager.pool)
+        await search_index.initialize()
+        if SESSION_DB_DRIVER == "sync":
+            # 同步驱动建表/建索引会阻塞事件循环，放到线程中执行
+            session_storage_service = await asyncio.to_thread(VersionedDatabaseSessionService, DATABASE_URL)
+        else:
+            session_storage_service = AsyncDatabaseSessionService(DATABASE_URL)
+            await session_storage_service.initialize()
+        print(f"📦 会话存储驱动: {SESSION_DB_DRIVER}")
+        storage_service = session_storage_service
+        # 长会话压缩：旧事件折叠为快照，加载时只读快照 + 最近事件
+        if isinstance(session_storage_service, AsyncDatabaseSessionService):
+            session_compactor = SessionCompactor(session_storage_service)
+            await session_compactor.initialize()
+            session_compactor.start()
+            storage_service = CompactingSessionService(session_storage_service, session_compactor)
+            # 冷存储归档：长期未活跃的会话由 archive_sessions.py 归档，打开时按需恢复
+            session_archiver = SessionArchiver(session_storage_service)
+            await session_archiver.initialize()
+            storage_service = ArchivingSessionService(storage_service, session_archiver)
+        # 大体积工具返回/内联数据转存到内容寻址的 blob 存储，事件表只保留引用
+        blob_store = create_blob_store(db_manager.pool)
+        if blob_store is not None:
+            await blob_store.initialize()
+            # 记录每个 blob 被哪些会话引用，会话删除后回收不再被引用的 blob
+            blob_references = BlobReferences(db_manager.pool)
+            await blob_references.initialize(blob_store)
+            session_offloading_service = OffloadingSessionService(storage_service, blob_store, blob_references)
+            storage_service = session_offloading_service
+        # 事件批量写入：流式输出过程中不再逐条提交事务，回合结束或定时批量提交
+        session_batching_service = BatchingSessionService(storage_service)
+        session_search_service = SearchIndexingSessionService(session_batching_service, search_index)
+        # 读穿透会话缓存：活跃会话每轮对话不再重复从数据库加载全部事件
+        session_cache_service = CachedSessionService(session_search_service)
+        session_batching_service.flush_listeners.append(session_cache_service.note_flushed)
+        session_batching_service.abandon_listeners.append(session_cache_service.note_abandoned)
+        session_batching_service.start()
+        session_service = session_cache_service
+        if isinstance(session_storage_service, AsyncDatabaseSessionService):
+            # 导出绕过会话缓存，避免批量导出挤掉活跃会话
+            session_exporter = SessionExporter(
+                session_storage_service, session_batching_service, session_archiver, session_offloading_service
+            )
+            # 批量删除与按应用的保留策略（删除经过整个会话服务栈，缓存/索引/快照/归档/blob 一并清理）
+            session_retention = SessionRetentionManager(session_storage_service, session_cache_service)
+            session_retention.deleted_listeners.append(evict_deleted_sessions)
+            session_retention.start()
+        print("✅ 数据库服务初始化成功")
+        
         # 🚀 启动定期清理任务
         print("🚀 启动智能体自动清理任务...")
         cleanup_task = asyncio.create_task(periodic_cleanup_task())
@@ -438,6 +537,8 @@ async def lifespan(_app: FastAPI):  # app 参数不使用，改名避免警告
         print("🚀 启动邮件验证码清理任务...")
         start_cleanup_task()
         print("✅ 邮件验证码清理任务已启动")
+        email_service.outbox.start()
+        print("✅ 邮件发送队列已启动")
         
         print(f"📊 当前 session_service 状态: {session_service is not None}")
     except Exception as e:
@@ -475,6 +576,34 @@ async def lifespan(_app: FastAPI):  # app 参数不使用，改名避免警告
             session_agent_configs.clear()
             session_last_access.clear()
         
+        # 等待未完成的搜索索引写入
+        if session_search_service is not None:
+            await session_search_service.drain()
+        
+        # 提交尚未写入数据库的会话事件
+        if session_batching_service is not None:
+            try:
+                await session_batching_service.close()
+                print("✅ 待写入的会话事件已全部提交")
+            except Exception as e:
+                print(f"⚠️ 提交会话事件时出错: {str(e)}")
+        
+        # 停止会话保留策略任务
+        if session_retention is not None:
+            await session_retention.close()
+        
+        # 停止会话压缩任务
+        if session_compactor is not None:
+            await session_compactor.close()
+        
+        # 释放会话存储连接池
+        if isinstance(session_storage_service, AsyncDatabaseSessionService):
+            try:
+                await session_storage_service.close()
+                print("✅ 会话存储连接池已关闭")
+            except Exception as e:
+                print(f"⚠️ 关闭会话存储连接池时出错: {str(e)}")
+        
         # 关闭主Runner
         if runner is not None:
             try:
@@ -483,6 +612,22 @@ async def lifespan(_app: FastAPI):  # app 参数不使用，改名避免警告
             except Exception as e:
                 print(f"⚠️ 关闭主Runner时出错: {str(e)}")
         
+        # 停止 JWT 密钥刷新和吊销同步任务
+        await jwt_key_ring.close()
+        await token_revocation.close()
+        
+        # 写入尚未落库的登录审计事件
+        try:
+            await login_audit.close()
+        except Exception as e:
+            print(f"⚠️ 写入登录审计事件时出错: {str(e)}")
+        
+        # 发送队列中剩余的邮件，然后关闭SMTP连接池
+        try:
+            await email_service.close()
+        except Exception as e:
+            print(f"⚠️ 关闭邮件服务时出错: {str(e)}")
+        
         # 关闭用户认证数据库
         try:
             await db_manager.close()
@@ -504,6 +649,7 @@ app = FastAPI(title="MatterAI Agent API", version="0.1.0", lifespan=lifespan)
 
 # 注册认证路由
 app.include_router(auth_router)
+app.include_router(jwks_router)
 
 # 静态文件（上传文件访问）- 已迁移到公网服务器
 # app.mount("/uploads", StaticFiles(directory=UPLOAD_DIR), name="uploads")
@@ -524,6 +670,14 @@ class ChatRequest(BaseModel):
     language: Optional[str] = "zh"  # 语言设置，默认中文
 
 
+class BulkDeleteRequest(BaseModel):
+    session_ids: Optional[List[str]] = None  # 按会话ID删除
+    older_than_days: Optional[float] = Field(None, gt=0)  # 按最后活跃时间删除（必须为正数）
+    app_name: Optional[str] = None  # 按应用删除
+    user_id: Optional[str] = None  # 仅管理员可指定其他用户
+    dry_run: bool = False  # 只统计不删除
+
+
 def _get_file_upload_text(file_urls: List[str], language: str = "zh") -> str:
     """根据语言生成文件上传信息文本"""
     file_count = len(file_urls)
@@ -635,7 +789,22 @@ async def get_cache_status() -> Dict[str, Any]:
         "total_tracked_sessions": len(session_last_access),
         "active_sessions": len(active_sessions),
         "timeout_minutes": SESSION_TIMEOUT / 60,
-        "sessions": session_info
+        "sessions": session_info,
+        "session_cache": session_cache_service.stats() if session_cache_service else None,
+        "session_write_behind": session_batching_service.stats() if session_batching_service else None,
+        "session_blob_offload": session_offloading_service.stats() if session_offloading_service else None,
+        "session_compaction": session_compactor.stats() if session_compactor else None,
+        "session_archive": session_archiver.stats() if session_archiver else None,
+        "session_retention": session_retention.stats() if session_retention else None,
+        "request_coalescing": request_coalescer.stats(),
+        "password_hashing": password_hasher.stats(),
+        "token_cache": verified_token_cache.stats(),
+        "token_revocation": token_revocation.stats(),
+        "jwt_keys": jwt_key_ring.stats(),
+        "user_profile_cache": db_manager.profile_cache.stats(),
+        "auth_rate_limit": auth_rate_limiter.stats(),
+        "login_audit": login_audit.stats(),
+        "email": email_service.stats()
     }
 
 
@@ -649,7 +818,10 @@ async def list_sessions(user_id: str = Depends(get_current_user_id), app_name: s
         raise HTTPException(status_code=503, detail="Service not ready")
     
     try:
-        ids = await list_existing_sessions(session_service, user_id, app_name)
+        ids = await request_coalescer.run(
+            ("sessions", user_id, app_name),
+            lambda: list_existing_sessions(session_service, user_id, app_name),
+        )
         print(f"✅ 成功获取会话列表: {ids}")
         return {"sessions": ids}
     except Exception as e:
@@ -657,161 +829,178 @@ async def list_sessions(user_id: str = Depends(get_current_user_id), app_name: s
         raise HTTPException(status_code=500, detail=f"Failed to get sessions: {str(e)}")
 
 
+@app.get("/sessions/search")
+async def search_sessions(
+    user_id: str = Depends(get_current_user_id),
+    q: str = Query(..., min_length=1, max_length=200, description="搜索关键词"),
+    app_name: str = Query("default", description="应用名称"),
+    limit: int = Query(20, ge=1, le=100),
+) -> Dict[str, Any]:
+    """在用户的所有会话中全文搜索（消息文本、工具名称、工具参数）"""
+    if session_search_service is None:
+        raise HTTPException(status_code=503, detail="Service not ready")
+    
+    full_app_name = f"{APP_NAME}_{app_name}"
+    started = time.perf_counter()
+    try:
+        results = await session_search_service.index.search(full_app_name, user_id, q, limit)
+    except Exception as e:
+        print(f"❌ 会话搜索失败: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to search sessions: {str(e)}")
+    took_ms = round((time.perf_counter() - started) * 1000, 1)
+    print(f"🔎 会话搜索 user_id={user_id} q={q!r}: {len(results)} 个会话命中 ({took_ms}ms)")
+    return {"query": q, "results": results, "took_ms": took_ms}
+
+
+@app.get("/sessions/export")
+async def export_sessions(
+    current_user: dict = Depends(get_current_user),
+    app_name: Optional[str] = Query(None, description="应用名称，不传则导出所有应用"),
+    user_id: Optional[str] = Query(None, description="仅管理员可导出其他用户的会话"),
+    gzip: bool = Query(False, description="是否 gzip 压缩"),
+) -> StreamingResponse:
+    """以 NDJSON 流式导出会话消息（每行一条消息），内存占用与导出规模无关"""
+    if session_exporter is None:
+        raise HTTPException(status_code=503, detail="Service not ready")
+    
+    own_user_id = current_user.get("id") or current_user.get("sub", "anonymous")
+    if not current_user.get("isAdmin"):
+        if user_id and user_id != own_user_id:
+            raise HTTPException(status_code=403, detail="Only admins can export other users' sessions")
+        user_id = own_user_id
+    full_app_name = f"{APP_NAME}_{app_name}" if app_name else None
+    print(f"📤 会话导出 by={own_user_id} app_name={full_app_name} user_id={user_id} gzip={gzip}")
+    
+    lines = session_exporter.export_lines(full_app_name, user_id)
+    filename = f"sessions_{app_name or 'all'}_{time.strftime('%Y%m%d%H%M%S')}.ndjson"
+    if gzip:
+        return StreamingResponse(
+            gzip_chunks(line.encode("utf-8") async for line in lines),
+            media_type="application/gzip",
+            headers={"Content-Disposition": f'attachment; filename="{filename}.gz"'},
+        )
+    return StreamingResponse(
+        lines,
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@app.post("/sessions/bulk-delete")
+async def bulk_delete_sessions(payload: BulkDeleteRequest, current_user: dict = Depends(get_current_user)) -> Dict[str, Any]:
+    """批量删除会话（按ID列表 / 最后活跃时间 / 应用），分批事务提交"""
+    if session_retention is None:
+        raise HTTPException(status_code=503, detail="Service not ready")
+    if payload.session_ids is None and payload.older_than_days is None and payload.app_name is None:
+        raise HTTPException(status_code=400, detail="Specify session_ids, older_than_days or app_name")
+    
+    own_user_id = current_user.get("id") or current_user.get("sub", "anonymous")
+    user_id = payload.user_id
+    if not current_user.get("isAdmin"):
+        if user_id and user_id != own_user_id:
+            raise HTTPException(status_code=403, detail="Only admins can delete other users' sessions")
+        user_id = own_user_id
+    
+    started = time.perf_counter()
+    try:
+        count = await session_retention.delete_matching(
+            dry_run=payload.dry_run,
+            app_name=f"{APP_NAME}_{payload.app_name}" if payload.app_name else None,
+            user_id=user_id,
+            session_ids=payload.session_ids,
+            older_than_days=payload.older_than_days,
+        )
+    except Exception as e:
+        print(f"❌ 批量删除会话失败: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to delete sessions: {str(e)}")
+    took_ms = round((time.perf_counter() - started) * 1000, 1)
+    print(f"🗑️ 批量删除会话 by={own_user_id} user_id={user_id} dry_run={payload.dry_run}: {count} 个 ({took_ms}ms)")
+    return {"matched" if payload.dry_run else "deleted": count, "took_ms": took_ms}
+
+
+def get_tool_catalog(app_name: str) -> List[Dict[str, Any]]:
+    """应用可用的预设工具列表（不暴露内部服务地址）"""
+    agent_config = AGENT_CONFIGS.get(app_name, AGENT_CONFIGS["default"])
+    return [
+        {"id": tool_id, "name": config.get("name", tool_id), "type": config.get("type"), "transport": config.get("transport")}
+        for tool_id, config in agent_config["tools_config"].items()
+    ]
+
+
+@app.get("/bootstrap")
+async def bootstrap(
+    current_user: dict = Depends(get_current_user),
+    app_name: str = Query("default", description="应用名称"),
+    sessions_limit: int = Query(20, ge=1, le=200, description="最近会话数量"),
+    tail_events: int = Query(50, ge=1, le=500, description="最近会话加载的事件数量"),
+) -> Dict[str, Any]:
+    """应用启动时一次性返回：用户信息、最近会话、最近会话的末尾消息、工具列表（并发获取）"""
+    if session_service is None:
+        raise HTTPException(status_code=503, detail="Service not ready")
+    
+    user_id = current_user.get("id") or current_user.get("sub", "anonymous")
+    full_app_name = f"{APP_NAME}_{app_name}"
+    started = time.perf_counter()
+    
+    async def load_profile():
+        return await request_coalescer.run(("auth_me", user_id), lambda: db_manager.get_user_by_id(user_id))
+    
+    async def load_sessions_and_tail():
+        response = await request_coalescer.run(
+            ("bootstrap_sessions", user_id, full_app_name, sessions_limit),
+            # 排序与截取在数据库中完成 (ORDER BY update_time DESC LIMIT)
+            lambda: list_recent_sessions(session_service, app_name=full_app_name, user_id=user_id, limit=sessions_limit),
+        )
+        recent = response.sessions
+        if not recent:
+            return recent, None
+        last = await session_service.get_session(
+            app_name=full_app_name, user_id=user_id, session_id=recent[0].id,
+            config=GetSessionConfig(num_recent_events=tail_events),
+        )
+        tail = {"session_id": last.id, "messages": list(process_events(last.events))} if last else None
+        return recent, tail
+    
+    try:
+        profile, (recent, tail) = await asyncio.gather(load_profile(), load_sessions_and_tail())
+    except Exception as e:
+        print(f"❌ 启动数据加载失败: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to load bootstrap data: {str(e)}")
+    if not profile:
+        raise HTTPException(status_code=404, detail="用户不存在")
+    
+    took_ms = round((time.perf_counter() - started) * 1000, 1)
+    print(f"🚀 启动数据 user_id={user_id} app={app_name}: {len(recent)} 个会话 ({took_ms}ms)")
+    return {
+        "user": {
+            "id": profile["id"],
+            "name": profile["name"],
+            "email": profile["email"],
+            "isAdmin": profile["isAdmin"],
+            "emailVerified": profile["emailVerified"],
+            "verificationEmail": profile["verificationEmail"],
+            "createdAt": profile["createdAt"],
+        },
+        "sessions": [{"id": s.id, "lastUpdateTime": s.last_update_time} for s in recent],
+        "lastSession": tail,
+        "tools": get_tool_catalog(app_name),
+        "took_ms": took_ms,
+    }
+
+
 @app.get("/history")
-async def get_history(user_id: str = Depends(get_current_user_id), session_id: str = Query(...), app_name: str = Query("default")) -> JSONResponse:
+async def get_history(user_id: str = Depends(get_current_user_id), session_id: str = Query(...), app_name: str = Query("default")) -> StreamingResponse:
     if session_service is None:
         raise HTTPException(status_code=503, detail="Service not ready")
     full_app_name = f"{APP_NAME}_{app_name}"
-    session = await session_service.get_session(app_name=full_app_name, user_id=user_id, session_id=session_id)
-    if not session:
+    # 事件按页从存储读取；先取第一页，会话不存在或存储出错时仍能返回 404/500
+    pages = iter_session_events(session_service, app_name=full_app_name, user_id=user_id, session_id=session_id)
+    first_page = await anext(pages, None)
+    if first_page is None:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    def process_events(events):
-        """处理事件，将相关的事件合并为完整的消息"""
-        messages = []
-        current_user_message = None
-        current_assistant_message = None
-        
-        for evt in events:
-            # 优先从 content.role 获取角色，兜底使用 evt.role
-            content = getattr(evt, 'content', None)
-            if content and hasattr(content, 'role'):
-                role = content.role
-            else:
-                role = getattr(evt, 'role', None)
-            
-            # 规范化角色名称
-            if role == 'model':
-                role = 'assistant'
-            
-            # 获取事件时间戳
-            evt_timestamp = None
-            if hasattr(evt, 'timestamp'):
-                evt_timestamp = int(evt.timestamp * 1000) if isinstance(evt.timestamp, float) else int(evt.timestamp)
-            elif hasattr(evt, 'created_at'):
-                evt_timestamp = int(evt.created_at * 1000) if isinstance(evt.created_at, float) else int(evt.created_at)
-            
-            if not evt_timestamp:
-                evt_timestamp = int(time.time() * 1000)
-            
-            # 检查事件类型（用于调试）
-            # has_function_call = False
-            has_function_response = False
-            # has_text = False
-            
-            if content and getattr(content, 'parts', None):
-                for part in content.parts:
-                    # if hasattr(part, 'function_call') and part.function_call:
-                    #     has_function_call = True
-                    if hasattr(part, 'function_response') and part.function_response:
-                        has_function_response = True
-                    # if hasattr(part, 'text') and part.text and part.text.strip():
-                    #     has_text = True
-            
-            #print(f"🔍 处理事件: role={role}, 工具调用={has_function_call}, 工具结果={has_function_response}, 文本={has_text}, timestamp={evt_timestamp}")
-            
-            # 工具结果虽然可能标记为 'user'，但应该归属到助手消息中
-            if has_function_response:
-                role = 'assistant'
-                #print(f"🔧 工具结果强制归属到助手消息")
-            
-            # 处理用户消息
-            if role == 'user':
-                # 保存之前的助手消息
-                if current_assistant_message and (current_assistant_message.get("content") or 
-                                                   current_assistant_message.get("toolCalls") or 
-                                                   current_assistant_message.get("toolResults")):
-                    messages.append(current_assistant_message)
-                    current_assistant_message = None
-                
-                # 创建或更新用户消息
-                if not current_user_message:
-                    current_user_message = {
-                        "role": "user",
-                        "content": [],
-                        "toolCalls": [],
-                        "toolResults": [],
-                        "timestamp": evt_timestamp
-                    }
-                
-                # 处理用户文本内容
-                if content and getattr(content, 'parts', None):
-                    for part in content.parts:
-                        text = getattr(part, 'text', None)
-                        if text and text.strip():
-                            current_user_message["content"].append({"type": "text", "text": text})
-            
-            # 处理助手消息
-            elif role == 'assistant':
-                # 保存之前的用户消息
-                if current_user_message and current_user_message.get("content"):
-                    messages.append(current_user_message)
-                    current_user_message = None
-                
-                # 创建或更新助手消息
-                if not current_assistant_message:
-                    current_assistant_message = {
-                        "role": "assistant",
-                        "content": [],
-                        "toolCalls": [],
-                        "toolResults": [],
-                        "timestamp": evt_timestamp
-                    }
-                
-                # 处理助手文本内容
-                if content and getattr(content, 'parts', None):
-                    for part in content.parts:
-                        text = getattr(part, 'text', None)
-                        if text and text.strip():
-                            current_assistant_message["content"].append({"type": "text", "text": text})
-                
-                # 处理工具调用
-                if hasattr(evt, 'get_function_calls'):
-                    calls = evt.get_function_calls()
-                    if calls:
-                        for call in calls:
-                            tool_call = {
-                                "id": f"call_{getattr(call, 'id', f'{getattr(call, 'name', 'unknown')}_{evt_timestamp}')}",
-                                "name": getattr(call, 'name', 'unknown'),
-                                "args": getattr(call, 'args', {}),
-                                "timestamp": evt_timestamp
-                            }
-                            current_assistant_message["toolCalls"].append(tool_call)
-                            print(f"🔧 添加工具调用: {tool_call['name']}")
-                
-                # 处理工具结果
-                if hasattr(evt, 'get_function_responses'):
-                    responses = evt.get_function_responses()
-                    if responses:
-                        for resp in responses:
-                            tool_result = {
-                                "id": f"result_{getattr(resp, 'id', f'{getattr(resp, 'name', 'unknown')}_{evt_timestamp}')}",
-                                "name": getattr(resp, 'name', 'unknown'),
-                                "result": getattr(resp, 'response', None),
-                                "timestamp": evt_timestamp
-                            }
-                            current_assistant_message["toolResults"].append(tool_result)
-                            print(f"📋 添加工具结果: {tool_result['name']}")
-        
-        # 添加剩余的消息
-        if current_user_message and current_user_message.get("content"):
-            messages.append(current_user_message)
-        
-        if current_assistant_message and (current_assistant_message.get("content") or 
-                                           current_assistant_message.get("toolCalls") or 
-                                           current_assistant_message.get("toolResults")):
-            messages.append(current_assistant_message)
-        
-        #print(f"📝 处理完成，生成了 {len(messages)} 条消息")
-        #for i, msg in enumerate(messages):
-            #print(f"  {i+1}. {msg['role']}: 内容={len(msg.get('content', []))} 工具调用={len(msg.get('toolCalls', []))} 工具结果={len(msg.get('toolResults', []))}")
-        
-        return messages
-
-    events = getattr(session, 'events', [])
-    messages = process_events(events)
-    # return JSONResponse({"session_id": session.id, "messages": messages})
-    return {"session_id": session.id, "messages": messages} # type: ignore
+    # 流式输出 JSON：消息边读取边转换边发送，不在内存中加载整个会话
+    return StreamingResponse(stream_history_json(session_id, first_page, pages), media_type="application/json")
 
 @app.post("/chat/stream")
 async def chat_stream(payload: ChatRequest, user_id: str = Depends(get_current_user_id)) -> StreamingResponse:
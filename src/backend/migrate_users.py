@@ -5,24 +5,41 @@ Migrates users from JSON file to PostgreSQL database.
 - Preserves cloud database users (priority)
 - Adds new users from JSON with proper password hashing
 - Assigns sequential IDs starting from current max ID
+- Hashes passwords on a process pool (all cores), COPYs each batch into a staging table and
+  merges the staging table into users with a single INSERT ... ON CONFLICT
+- The staging table is the checkpoint: an interrupted run resumes without re-hashing
 """
 
+import argparse
 import json
 import asyncio
 import sys
 import os
+import time
 from datetime import datetime, timezone
-from typing import Dict, List, Set
+from typing import Dict, List, Optional, Set, Tuple
 
 # Add the current directory to Python path to import database module
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from database import DatabaseManager
+from password_hashing import PasswordHasher, password_hasher
+
+# Hashed users waiting to be merged; kept until the merge succeeds so a rerun can resume
+STAGING_TABLE = "users_migration_staging"
+STAGING_COLUMNS = ['id', 'name', 'email', 'password_hash', 'is_admin', 'email_verified', 'created_at', 'updated_at']
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_JSON_FILE = "/Users/ysl/Desktop/Code/MatterAI_Agent/src/backend/auth_api/users.json"
 
 class UserMigrator:
-    def __init__(self, json_file_path: str):
+    def __init__(self, json_file_path: str, batch_size: int = DEFAULT_BATCH_SIZE,
+                 workers: Optional[int] = None, restart: bool = False):
         self.json_file_path = json_file_path
+        self.batch_size = batch_size
+        self.workers = workers or os.cpu_count() or 1
+        self.restart = restart
         self.db_manager = DatabaseManager()
+        self.hasher: Optional[PasswordHasher] = None
 
     async def load_json_users(self) -> List[Dict]:
         """Load users from JSON file"""
@@ -74,6 +91,31 @@ class UserMigrator:
             print(f"❌ Error getting max user ID: {e}")
             raise
 
+    async def prepare_staging_table(self) -> Tuple[Set[str], int]:
+        """Create the staging table (or resume from it); returns the staged emails and their max ID"""
+        async with self.db_manager.pool.acquire() as connection:
+            if self.restart:
+                await connection.execute(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+            await connection.execute(f"""
+            CREATE TABLE IF NOT EXISTS {STAGING_TABLE} (
+                id INTEGER PRIMARY KEY,
+                name VARCHAR(255) NOT NULL,
+                email VARCHAR(255) UNIQUE NOT NULL,
+                password_hash VARCHAR(255) NOT NULL,
+                is_admin BOOLEAN NOT NULL,
+                email_verified BOOLEAN NOT NULL,
+                created_at TIMESTAMP WITH TIME ZONE,
+                updated_at TIMESTAMP WITH TIME ZONE
+            )
+            """)
+            rows = await connection.fetch(f"SELECT email, id FROM {STAGING_TABLE}")
+
+        staged_emails = {row['email'] for row in rows}
+        max_staged_id = max((row['id'] for row in rows), default=0)
+        if staged_emails:
+            print(f"♻️ Resuming from checkpoint: {len(staged_emails)} users already hashed and staged")
+        return staged_emails, max_staged_id
+
     def convert_json_user_to_db_format(self, json_user: Dict, new_id: int) -> Dict:
         """Convert JSON user format to database format"""
         # Parse creation date
@@ -91,64 +133,75 @@ class UserMigrator:
             'id': new_id,
             'name': json_user.get('name', '').strip(),
             'email': json_user.get('email', '').strip().lower(),
-            'password': json_user.get('password', ''),  # Will be hashed during insertion
+            'password': json_user.get('password', ''),  # Will be hashed before staging
             'is_admin': json_user.get('isAdmin', False),
             'email_verified': True,  # Mark migrated users as verified
             'created_at': created_at,
             'updated_at': created_at
         }
 
-    async def insert_user_batch(self, users_batch: List[Dict]) -> int:
-        """Insert a batch of users into database"""
-        if not users_batch:
-            return 0
-
-        insert_query = """
-        INSERT INTO users (id, name, email, password_hash, is_admin, email_verified, created_at, updated_at)
-        VALUES ($1, $2, $3, $4, $5, $6, $7, $8)
-        """
-
-        inserted_count = 0
-
-        try:
+    async def hash_user_batch(self, users_batch: List[Dict]) -> List:
+        """Hash a batch of passwords in parallel on the process pool (exceptions are returned, not raised)"""
+        return await asyncio.gather(
+            *(self.hasher.hash(user['password']) for user in users_batch),
+            return_exceptions=True,
+        )
+
+    async def stage_user_batch(self, users_batch: List[Dict], password_hashes: List) -> int:
+        """COPY a batch of hashed users into the staging table (one transaction per batch)"""
+        records = []
+        for user, password_hash in zip(users_batch, password_hashes):
+            if isinstance(password_hash, BaseException):
+                print(f"⚠️ Failed to hash password for {user['email']}: {password_hash}")
+                continue
+            records.append((
+                user['id'],
+                user['name'],
+                user['email'],
+                password_hash,
+                user['is_admin'],
+                user['email_verified'],
+                user['created_at'],
+                user['updated_at']
+            ))
+
+        if records:
             async with self.db_manager.pool.acquire() as connection:
-                for user in users_batch:
-                    try:
-                        # Hash the password
-                        password_hash = self.db_manager.hash_password(user['password'])
-
-                        await connection.execute(
-                            insert_query,
-                            user['id'],
-                            user['name'],
-                            user['email'],
-                            password_hash,
-                            user['is_admin'],
-                            user['email_verified'],
-                            user['created_at'],
-                            user['updated_at']
-                        )
-                        inserted_count += 1
-
-                    except Exception as e:
-                        print(f"⚠️ Failed to insert user {user['email']}: {e}")
-                        continue
+                await connection.copy_records_to_table(STAGING_TABLE, records=records, columns=STAGING_COLUMNS)
+        return len(records)
+
+    async def merge_staged_users(self) -> int:
+        """Move every staged user into users with one statement; conflicting users are left alone"""
+        columns = ", ".join(STAGING_COLUMNS)
+        query = f"""
+        WITH inserted AS (
+            INSERT INTO users ({columns})
+            SELECT {columns} FROM {STAGING_TABLE} ORDER BY id
+            ON CONFLICT DO NOTHING
+            RETURNING 1
+        )
+        SELECT count(*) FROM inserted
+        """
 
-        except Exception as e:
-            print(f"❌ Error in batch insert: {e}")
-            raise
+        async with self.db_manager.pool.acquire() as connection:
+            async with connection.transaction():
+                staged = await connection.fetchval(f"SELECT count(*) FROM {STAGING_TABLE}")
+                inserted = await connection.fetchval(query)
+                await connection.execute(f"DROP TABLE {STAGING_TABLE}")
 
-        return inserted_count
+        if inserted < staged:
+            print(f"⚠️ {staged - inserted} staged users conflicted with existing users (email or ID) and were skipped")
+        return inserted
 
-    async def update_sequence(self, final_id: int):
-        """Update the users ID sequence to the final ID"""
-        print(f"🔄 Updating users ID sequence to {final_id}")
+    async def update_sequence(self):
+        """Update the users ID sequence to the maximum user ID"""
+        print("🔄 Updating users ID sequence")
 
-        query = "SELECT setval(pg_get_serial_sequence('users', 'id'), $1, true)"
+        query = "SELECT setval(pg_get_serial_sequence('users', 'id'), (SELECT MAX(id) FROM users), true)"
 
         try:
             async with self.db_manager.pool.acquire() as connection:
-                await connection.execute(query, final_id)
+                await connection.execute(query)
             print("✅ Users ID sequence updated successfully")
 
         except Exception as e:
@@ -160,8 +213,9 @@ class UserMigrator:
         print("🚀 Starting user migration process...")
 
         try:
-            # Initialize database connection
+            # Initialize database connection (also calibrates the bcrypt cost used by logins)
             await self.db_manager.initialize()
+            self.hasher = PasswordHasher(workers=self.workers, executor_kind="process", rounds=password_hasher.rounds)
 
             # Load JSON users
             json_users = await self.load_json_users()
@@ -169,9 +223,12 @@ class UserMigrator:
             # Get existing emails to avoid duplicates
             existing_emails = await self.get_existing_emails()
 
+            # Users hashed by an interrupted earlier run
+            staged_emails, max_staged_id = await self.prepare_staging_table()
+
             # Get starting ID for new users
             max_id = await self.get_max_user_id()
-            next_id = max_id + 1
+            next_id = max(max_id, max_staged_id) + 1
 
             # Filter out users that already exist (prioritize cloud database)
             new_users = []
@@ -190,53 +247,80 @@ class UserMigrator:
                     skipped_count += 1
                     continue
 
+                existing_emails.add(email)  # Prevent duplicates within JSON
+                if email in staged_emails:
+                    continue
+
                 # Convert to database format with new sequential ID
                 db_user = self.convert_json_user_to_db_format(json_user, next_id)
                 new_users.append(db_user)
-                existing_emails.add(email)  # Prevent duplicates within JSON
                 next_id += 1
 
             print(f"📊 Migration Summary:")
             print(f"   Total users in JSON: {len(json_users)}")
-            print(f"   Users to migrate: {len(new_users)}")
+            print(f"   Users to migrate: {len(new_users) + len(staged_emails)}")
+            print(f"   Already staged (checkpoint): {len(staged_emails)}")
             print(f"   Users skipped (duplicates/invalid): {skipped_count}")
+            print(f"   Hashing: {self.hasher.workers} processes, {self.hasher.rounds} rounds, batches of {self.batch_size}")
 
-            if not new_users:
+            if not new_users and not staged_emails:
                 print("✅ No new users to migrate")
                 return
 
-            # Insert users in batches
-            batch_size = 100
-            total_inserted = 0
-
-            for i in range(0, len(new_users), batch_size):
-                batch = new_users[i:i + batch_size]
-                inserted = await self.insert_user_batch(batch)
-                total_inserted += inserted
-                print(f"📝 Inserted batch {i//batch_size + 1}: {inserted}/{len(batch)} users")
-
-            # Update the sequence to the final ID
-            if new_users:
-                final_id = new_users[-1]['id']
-                await self.update_sequence(final_id)
-
+            # Hash batch N+1 on the process pool while batch N is copied into the staging table
+            batches = [new_users[i:i + self.batch_size] for i in range(0, len(new_users), self.batch_size)]
+            total_staged = 0
+            started = time.perf_counter()
+            next_hashes = asyncio.ensure_future(self.hash_user_batch(batches[0])) if batches else None
+
+            for index, batch in enumerate(batches):
+                password_hashes = await next_hashes
+                if index + 1 < len(batches):
+                    next_hashes = asyncio.ensure_future(self.hash_user_batch(batches[index + 1]))
+                total_staged += await self.stage_user_batch(batch, password_hashes)
+
+                elapsed = time.perf_counter() - started
+                done = sum(len(b) for b in batches[:index + 1])
+                rate = done / elapsed if elapsed else 0.0
+                eta = (len(new_users) - done) / rate if rate else 0.0
+                print(f"📝 Staged batch {index + 1}/{len(batches)}: {total_staged}/{len(new_users)} users "
+                      f"({rate:.1f} users/s, ETA {eta:.0f}s)")
+
+            # Merge everything staged (this run and any resumed checkpoint) in one statement
+            merge_started = time.perf_counter()
+            total_inserted = await self.merge_staged_users()
+            merge_seconds = time.perf_counter() - merge_started
+            await self.update_sequence()
+
+            elapsed = time.perf_counter() - started
             print(f"✅ Migration completed successfully!")
             print(f"   Total users inserted: {total_inserted}")
+            print(f"   Hashed and staged this run: {total_staged} in {elapsed - merge_seconds:.1f}s "
+                  f"({total_staged / max(elapsed - merge_seconds, 1e-9):.1f} users/s)")
+            print(f"   Merge: {merge_seconds:.2f}s, total: {elapsed:.1f}s")
 
         except Exception as e:
             print(f"❌ Migration failed: {e}")
+            print(f"💡 Users already staged in {STAGING_TABLE} are kept; rerun to resume")
             raise
         finally:
+            if self.hasher is not None:
+                self.hasher.close(wait=True)
             await self.db_manager.close()
 
 async def main():
     """Main entry point"""
-    # Get JSON file path from command line or use default
-    json_file_path = sys.argv[1] if len(sys.argv) > 1 else "/Users/ysl/Desktop/Code/MatterAI_Agent/src/backend/auth_api/users.json"
+    parser = argparse.ArgumentParser(description="Migrate users from a JSON file to PostgreSQL")
+    parser.add_argument("json_file", nargs="?", default=DEFAULT_JSON_FILE, help="path to users.json")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="users per hashing/COPY batch")
+    parser.add_argument("--workers", type=int, default=None, help="hashing processes (default: all cores)")
+    parser.add_argument("--restart", action="store_true", help="discard the checkpoint of an interrupted run")
+    args = parser.parse_args()
+    json_file_path = args.json_file
 
     if not os.path.exists(json_file_path):
         print(f"❌ JSON file not found: {json_file_path}")
-        print("Usage: python migrate_users.py [path_to_users.json]")
+        print("Usage: python migrate_users.py [path_to_users.json] [--batch-size N] [--workers N] [--restart]")
         sys.exit(1)
 
     print(f"🎯 Migration target: {json_file_path}")
@@ -247,7 +331,7 @@ async def main():
         print("❌ Migration cancelled")
         sys.exit(0)
 
-    migrator = UserMigrator(json_file_path)
+    migrator = UserMigrator(json_file_path, batch_size=args.batch_size, workers=args.workers, restart=args.restart)
     await migrator.migrate()
 
 if __name__ == "__main__":
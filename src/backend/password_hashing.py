@@ -0,0 +1,146 @@
+"""
+Password hashing for MatterAI Agent
+bcrypt runs on a bounded worker pool so hashing never blocks the event loop; the number of
+concurrent hashes is capped and callers beyond the cap wait (and are counted) in an asyncio queue.
+The cost factor is calibrated at startup against a target latency unless BCRYPT_ROUNDS is set.
+"""
+import asyncio
+import math
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+import bcrypt
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Hashing configuration
+PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")  # thread | process
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+PASSWORD_HASH_TARGET_MS = float(os.getenv("PASSWORD_HASH_TARGET_MS", "250"))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "0"))  # 0 = calibrate at startup
+BCRYPT_MIN_ROUNDS = int(os.getenv("BCRYPT_MIN_ROUNDS", "10"))
+BCRYPT_MAX_ROUNDS = int(os.getenv("BCRYPT_MAX_ROUNDS", "14"))
+
+# Rounds used when hashing before calibration has run (bcrypt's own default)
+DEFAULT_BCRYPT_ROUNDS = 12
+
+
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+
+
+def _time_hash(rounds: int) -> float:
+    started = time.perf_counter()
+    _hash("calibration-password", rounds)
+    return time.perf_counter() - started
+
+
+class PasswordHasher:
+    """bcrypt on a bounded executor (bcrypt releases the GIL, so threads run in parallel)"""
+
+    def __init__(
+        self,
+        workers: int = PASSWORD_HASH_WORKERS,
+        executor_kind: str = PASSWORD_HASH_EXECUTOR,
+        rounds: int = BCRYPT_ROUNDS,
+    ):
+        self.workers = max(1, workers)
+        self.executor_kind = executor_kind
+        self.rounds = rounds or DEFAULT_BCRYPT_ROUNDS
+        self.calibrated = bool(rounds)
+        self._executor: Optional[Executor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self.waiting = 0
+        self.running = 0
+        self.max_waiting = 0
+        self.operations = 0
+        self.total_wait_seconds = 0.0
+        self.total_run_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, fn, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.workers)
+        queued_at = time.perf_counter()
+        self.waiting += 1
+        self.max_waiting = max(self.max_waiting, self.waiting)
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        started = time.perf_counter()
+        self.running += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), fn, *args)
+        finally:
+            self.running -= 1
+            self._semaphore.release()
+            wait = started - queued_at
+            self.operations += 1
+            self.total_wait_seconds += wait
+            self.total_run_seconds += time.perf_counter() - started
+            self.max_wait_seconds = max(self.max_wait_seconds, wait)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password, self.rounds)
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(_check, password, hashed)
+
+    async def calibrate(self, target_ms: float = PASSWORD_HASH_TARGET_MS) -> int:
+        """
+        Pick the highest cost factor whose hash time stays within target_ms on this machine
+        (each extra round doubles the work); a fixed BCRYPT_ROUNDS skips calibration
+        """
+        if self.calibrated:
+            return self.rounds
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        # Best of three at the minimum cost, then extrapolate
+        samples = [await loop.run_in_executor(executor, _time_hash, BCRYPT_MIN_ROUNDS) for _ in range(3)]
+        base_ms = max(min(samples) * 1000, 0.001)
+        extra = math.floor(math.log2(target_ms / base_ms)) if target_ms > base_ms else 0
+        self.rounds = max(BCRYPT_MIN_ROUNDS, min(BCRYPT_MAX_ROUNDS, BCRYPT_MIN_ROUNDS + extra))
+        self.calibrated = True
+        print(f"🔐 bcrypt calibrated: {self.rounds} rounds "
+              f"(~{base_ms * 2 ** (self.rounds - BCRYPT_MIN_ROUNDS):.0f}ms, target {target_ms:.0f}ms)")
+        return self.rounds
+
+    def close(self, wait: bool = False):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "executor": self.executor_kind,
+            "workers": self.workers,
+            "rounds": self.rounds,
+            "calibrated": self.calibrated,
+            "running": self.running,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "operations": self.operations,
+            "avg_wait_ms": round(self.total_wait_seconds / self.operations * 1000, 1) if self.operations else 0.0,
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 1),
+            "avg_hash_ms": round(self.total_run_seconds / self.operations * 1000, 1) if self.operations else 0.0,
+        }
+
+
+# Global hasher instance
+password_hasher = PasswordHasher()
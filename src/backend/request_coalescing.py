@@ -0,0 +1,49 @@
+"""
+Request coalescing for MatterAI Agent read endpoints
+Identical concurrent requests (same key) share one in-flight backend computation and its result.
+"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class RequestCoalescer:
+    """Per-key in-flight de-duplication; results are shared, so callers must not mutate them"""
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, asyncio.Future] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    def _done(self, key: Hashable, future: asyncio.Future):
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+        # Mark the exception as retrieved even if every waiter has gone away
+        if not future.cancelled():
+            future.exception()
+
+    async def run(self, key: Hashable, factory: Callable[[], Awaitable[T]]) -> T:
+        future = self._in_flight.get(key)
+        if future is None:
+            self.leaders += 1
+            future = asyncio.ensure_future(factory())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda f: self._done(key, f))
+        else:
+            self.followers += 1
+        # A disconnecting client must not cancel the computation the others are waiting on
+        return await asyncio.shield(future)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.leaders + self.followers
+        return {
+            "in_flight": len(self._in_flight),
+            "computations": self.leaders,
+            "coalesced_requests": self.followers,
+            "coalesced_ratio": round(self.followers / total, 3) if total else 0.0,
+        }
+
+
+# Global coalescer instance
+request_coalescer = RequestCoalescer()
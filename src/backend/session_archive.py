@@ -0,0 +1,503 @@
+"""
+Cold-storage archival of inactive sessions for MatterAI Agent
+Sessions idle for SESSION_ARCHIVE_IDLE_DAYS have their events (and compaction snapshot) moved into
+one zstd-compressed blob per session on local disk or S3-compatible storage. The sessions row stays
+as a stub, so listing is unchanged, and the events are restored the next time the session is opened.
+Archived stubs carry ARCHIVED_STATE_KEY in their session state, so a load can tell them apart from
+new or filtered-empty sessions without another query.
+"""
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional
+
+from dotenv import load_dotenv
+from google.adk.events import Event
+from google.adk.sessions import Session
+from google.adk.sessions.base_session_service import GetSessionConfig
+from google.adk.sessions.database_session_service import StorageEvent, StorageSession
+from sqlalchemy import DateTime, Integer, String, and_, delete, exists, func, select, text, tuple_, update
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+from async_session_service import AsyncDatabaseSessionService
+from session_compaction import StorageSessionSnapshot
+from session_store import SESSION_HISTORY_PAGE_EVENTS, ForwardingSessionService, SessionKey
+
+load_dotenv()
+
+# Archival configuration
+SESSION_ARCHIVE_IDLE_DAYS = int(os.getenv("SESSION_ARCHIVE_IDLE_DAYS", "90"))
+SESSION_ARCHIVE_BACKEND = os.getenv("SESSION_ARCHIVE_BACKEND", "local").lower()  # local | s3
+SESSION_ARCHIVE_DIR = os.getenv(
+    "SESSION_ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "session_archive")
+)
+SESSION_ARCHIVE_S3_BUCKET = os.getenv("SESSION_ARCHIVE_S3_BUCKET")
+SESSION_ARCHIVE_S3_PREFIX = os.getenv("SESSION_ARCHIVE_S3_PREFIX", "sessions/")
+SESSION_ARCHIVE_S3_ENDPOINT = os.getenv("SESSION_ARCHIVE_S3_ENDPOINT")  # MinIO / OSS / COS etc.
+SESSION_ARCHIVE_ZSTD_LEVEL = int(os.getenv("SESSION_ARCHIVE_ZSTD_LEVEL", "10"))
+
+# Session state flag of archived stubs (removed again on rehydration)
+ARCHIVED_STATE_KEY = "_archived"
+
+
+def compress(data: bytes) -> bytes:
+    import zstandard
+    return zstandard.ZstdCompressor(level=SESSION_ARCHIVE_ZSTD_LEVEL).compress(data)
+
+
+def decompress(data: bytes) -> bytes:
+    import zstandard
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+class LocalArchiveStore:
+    """Archives as files under a local (or mounted) directory"""
+
+    def __init__(self, root: str = SESSION_ARCHIVE_DIR):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def _put_sync(self, key: str, data: bytes):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _get_sync(self, key: str) -> bytes:
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    def _delete_sync(self, key: str):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    async def put(self, key: str, data: bytes):
+        await asyncio.to_thread(self._put_sync, key, data)
+
+    async def get(self, key: str) -> bytes:
+        return await asyncio.to_thread(self._get_sync, key)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self._delete_sync, key)
+
+
+class S3ArchiveStore:
+    """Archives as objects in an S3-compatible bucket (requires boto3, see archive_s3_requirements.txt)"""
+
+    def __init__(
+        self,
+        bucket: Optional[str] = SESSION_ARCHIVE_S3_BUCKET,
+        prefix: str = SESSION_ARCHIVE_S3_PREFIX,
+        endpoint_url: Optional[str] = SESSION_ARCHIVE_S3_ENDPOINT,
+    ):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError(
+                "SESSION_ARCHIVE_BACKEND=s3 requires boto3: pip install -r archive_s3_requirements.txt"
+            ) from None
+
+        if not bucket:
+            raise ValueError("SESSION_ARCHIVE_S3_BUCKET is required for SESSION_ARCHIVE_BACKEND=s3")
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+
+    async def put(self, key: str, data: bytes):
+        await asyncio.to_thread(self.client.put_object, Bucket=self.bucket, Key=self.prefix + key, Body=data)
+
+    async def get(self, key: str) -> bytes:
+        response = await asyncio.to_thread(self.client.get_object, Bucket=self.bucket, Key=self.prefix + key)
+        return await asyncio.to_thread(response["Body"].read)
+
+    async def delete(self, key: str):
+        await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=self.prefix + key)
+
+
+def create_archive_store():
+    if SESSION_ARCHIVE_BACKEND == "s3":
+        return S3ArchiveStore()
+    return LocalArchiveStore()
+
+
+class _ArchiveBase(DeclarativeBase):
+    pass
+
+
+class StorageSessionArchive(_ArchiveBase):
+    """Stub record of an archived session: where its events went"""
+
+    __tablename__ = "session_archives"
+
+    app_name: Mapped[str] = mapped_column(String(128), primary_key=True)
+    user_id: Mapped[str] = mapped_column(String(128), primary_key=True)
+    session_id: Mapped[str] = mapped_column(String(128), primary_key=True)
+    archive_key: Mapped[str] = mapped_column(String(512))
+    event_count: Mapped[int] = mapped_column(Integer)
+    raw_bytes: Mapped[int] = mapped_column(Integer)
+    archived_bytes: Mapped[int] = mapped_column(Integer)
+    archived_at: Mapped[datetime] = mapped_column(DateTime(), default=func.now())
+
+
+class SessionArchiver:
+    """Moves idle sessions to cold storage and brings them back"""
+
+    def __init__(self, storage: AsyncDatabaseSessionService, archive_store=None):
+        self.storage = storage
+        self.archive_store = archive_store or create_archive_store()
+        self.archived_sessions = 0
+        self.rehydrated_sessions = 0
+        self._rehydrate_locks: Dict[SessionKey, asyncio.Lock] = {}
+
+    async def initialize(self):
+        async with self.storage.db_engine.begin() as connection:
+            await connection.run_sync(_ArchiveBase.metadata.create_all)
+        flagged = await self._flag_unmarked_archives()
+        if flagged:
+            print(f"📌 Flagged {flagged} sessions archived before the archive state flag existed")
+
+    async def _flag_unmarked_archives(self) -> int:
+        """Set ARCHIVED_STATE_KEY on stubs archived by older versions"""
+        async with self.storage.session_factory() as sql_session:
+            if self.storage.db_engine.dialect.name == "postgresql":
+                # sessions.state is JSONB on Postgres: one set-based statement
+                result = await sql_session.execute(text(f"""
+                    UPDATE sessions s
+                    SET state = s.state || jsonb_build_object('{ARCHIVED_STATE_KEY}', true), update_time = s.update_time
+                    FROM session_archives a
+                    WHERE a.app_name = s.app_name AND a.user_id = s.user_id AND a.session_id = s.id
+                      AND NOT (s.state ? '{ARCHIVED_STATE_KEY}')
+                """))
+                await sql_session.commit()
+                return result.rowcount
+            rows = (await sql_session.execute(
+                select(StorageSession.app_name, StorageSession.user_id, StorageSession.id, StorageSession.state)
+                .join(
+                    StorageSessionArchive,
+                    and_(
+                        StorageSessionArchive.app_name == StorageSession.app_name,
+                        StorageSessionArchive.user_id == StorageSession.user_id,
+                        StorageSessionArchive.session_id == StorageSession.id,
+                    ),
+                )
+            )).all()
+            flagged = 0
+            for app_name, user_id, session_id, state in rows:
+                if ARCHIVED_STATE_KEY not in (state or {}):
+                    await self._set_archived_flag(sql_session, (app_name, user_id, session_id), state, True)
+                    flagged += 1
+            await sql_session.commit()
+            return flagged
+
+    @staticmethod
+    async def _set_archived_flag(sql_session, key: SessionKey, state: Optional[dict], archived: bool):
+        """Write the session state with or without the flag, leaving update_time untouched"""
+        state = {k: v for k, v in (state or {}).items() if k != ARCHIVED_STATE_KEY}
+        if archived:
+            state[ARCHIVED_STATE_KEY] = True
+        app_name, user_id, session_id = key
+        await sql_session.execute(
+            update(StorageSession)
+            .where(
+                StorageSession.app_name == app_name,
+                StorageSession.user_id == user_id,
+                StorageSession.id == session_id,
+            )
+            .values(state=state, update_time=StorageSession.update_time)
+        )
+
+    @staticmethod
+    def archive_key(app_name: str, user_id: str, session_id: str) -> str:
+        return f"{app_name}/{user_id}/{session_id}.json.zst"
+
+    def _idle_sessions_query(self, idle_days: int):
+        """Sessions with events but no state change or new event since the cutoff, not archived yet"""
+        cutoff = datetime.now() - timedelta(days=idle_days)
+        same_session = and_(
+            StorageEvent.app_name == StorageSession.app_name,
+            StorageEvent.user_id == StorageSession.user_id,
+            StorageEvent.session_id == StorageSession.id,
+        )
+        any_event = exists().where(same_session)
+        recent_event = exists().where(same_session, StorageEvent.timestamp >= cutoff)
+        return (
+            select(StorageSession.app_name, StorageSession.user_id, StorageSession.id)
+            .outerjoin(
+                StorageSessionArchive,
+                and_(
+                    StorageSessionArchive.app_name == StorageSession.app_name,
+                    StorageSessionArchive.user_id == StorageSession.user_id,
+                    StorageSessionArchive.session_id == StorageSession.id,
+                ),
+            )
+            .where(
+                StorageSessionArchive.session_id.is_(None),
+                StorageSession.update_time < cutoff,
+                any_event,
+                ~recent_event,
+            )
+        )
+
+    async def find_idle_sessions(self, idle_days: int = SESSION_ARCHIVE_IDLE_DAYS, limit: int = 100) -> List[tuple]:
+        query = self._idle_sessions_query(idle_days).order_by(StorageSession.update_time).limit(limit)
+        async with self.storage.session_factory() as sql_session:
+            return [tuple(row) for row in (await sql_session.execute(query)).all()]
+
+    async def count_idle_sessions(self, idle_days: int = SESSION_ARCHIVE_IDLE_DAYS) -> int:
+        query = select(func.count()).select_from(self._idle_sessions_query(idle_days).subquery())
+        async with self.storage.session_factory() as sql_session:
+            return await sql_session.scalar(query)
+
+    async def archive_session(self, app_name: str, user_id: str, session_id: str) -> Optional[StorageSessionArchive]:
+        """Write the session's events to cold storage and drop them from the database"""
+        key = self.archive_key(app_name, user_id, session_id)
+        async with self.storage.session_factory() as sql_session:
+            storage_events = (await sql_session.execute(
+                select(StorageEvent)
+                .where(
+                    StorageEvent.app_name == app_name,
+                    StorageEvent.user_id == user_id,
+                    StorageEvent.session_id == session_id,
+                )
+                .order_by(StorageEvent.timestamp)
+            )).scalars().all()
+            snapshot = await sql_session.get(StorageSessionSnapshot, (app_name, user_id, session_id))
+
+            document = {
+                "app_name": app_name,
+                "user_id": user_id,
+                "session_id": session_id,
+                "events": [e.to_event().model_dump(mode="json", exclude_none=True) for e in storage_events],
+                "snapshot": {
+                    "events": snapshot.events,
+                    "upto_time": snapshot.upto_time.timestamp(),
+                    "folded_events": snapshot.folded_events,
+                } if snapshot else None,
+            }
+            raw = json.dumps(document, ensure_ascii=False).encode("utf-8")
+            packed = await asyncio.to_thread(compress, raw)
+            await self.archive_store.put(key, packed)
+
+            result = await sql_session.execute(
+                delete(StorageEvent).where(
+                    StorageEvent.app_name == app_name,
+                    StorageEvent.user_id == user_id,
+                    StorageEvent.session_id == session_id,
+                    StorageEvent.id.in_([e.id for e in storage_events]),
+                )
+            )
+            remaining = await sql_session.scalar(
+                select(func.count()).select_from(StorageEvent).where(
+                    StorageEvent.app_name == app_name,
+                    StorageEvent.user_id == user_id,
+                    StorageEvent.session_id == session_id,
+                )
+            )
+            if remaining or result.rowcount != len(storage_events):
+                # The session became active while we were archiving it
+                await sql_session.rollback()
+                await self.archive_store.delete(key)
+                return None
+            if snapshot is not None:
+                await sql_session.delete(snapshot)
+            storage_session = await sql_session.get(StorageSession, (app_name, user_id, session_id))
+            await self._set_archived_flag(
+                sql_session, (app_name, user_id, session_id), storage_session.state if storage_session else {}, True
+            )
+            record = StorageSessionArchive(
+                app_name=app_name,
+                user_id=user_id,
+                session_id=session_id,
+                archive_key=key,
+                event_count=len(storage_events),
+                raw_bytes=len(raw),
+                archived_bytes=len(packed),
+            )
+            sql_session.add(record)
+            await sql_session.commit()
+
+        self.archived_sessions += 1
+        return record
+
+    async def is_archived(self, app_name: str, user_id: str, session_id: str) -> bool:
+        async with self.storage.session_factory() as sql_session:
+            return await sql_session.get(StorageSessionArchive, (app_name, user_id, session_id)) is not None
+
+    async def rehydrate_session(self, app_name: str, user_id: str, session_id: str) -> bool:
+        """Restore an archived session's events; returns False if it was not archived"""
+        key = (app_name, user_id, session_id)
+        lock = self._rehydrate_locks.setdefault(key, asyncio.Lock())
+        try:
+            async with lock:
+                async with self.storage.session_factory() as sql_session:
+                    record = await sql_session.get(StorageSessionArchive, key)
+                    if record is None:
+                        # Clear a flag left without an archive so later loads skip this lookup
+                        storage_session = await sql_session.get(StorageSession, key)
+                        if storage_session is not None and ARCHIVED_STATE_KEY in storage_session.state:
+                            await self._set_archived_flag(sql_session, key, storage_session.state, False)
+                            await sql_session.commit()
+                        return False
+                    document = json.loads(await asyncio.to_thread(decompress, await self.archive_store.get(record.archive_key)))
+
+                    # Claiming the stub row makes concurrent rehydration by another worker a no-op
+                    result = await sql_session.execute(
+                        delete(StorageSessionArchive).where(
+                            StorageSessionArchive.app_name == app_name,
+                            StorageSessionArchive.user_id == user_id,
+                            StorageSessionArchive.session_id == session_id,
+                        )
+                    )
+                    if result.rowcount == 0:
+                        await sql_session.rollback()
+                        return False
+
+                    storage_session = await sql_session.get(StorageSession, key)
+                    if storage_session is not None:
+                        await self._set_archived_flag(sql_session, key, storage_session.state, False)
+                    stub = Session(id=session_id, app_name=app_name, user_id=user_id)
+                    for data in document["events"]:
+                        sql_session.add(StorageEvent.from_event(stub, Event.model_validate(data)))
+                    if document.get("snapshot"):
+                        snapshot = document["snapshot"]
+                        sql_session.add(StorageSessionSnapshot(
+                            app_name=app_name,
+                            user_id=user_id,
+                            session_id=session_id,
+                            events=snapshot["events"],
+                            upto_time=datetime.fromtimestamp(snapshot["upto_time"]),
+                            folded_events=snapshot["folded_events"],
+                        ))
+                    await sql_session.commit()
+                    archive_key = record.archive_key
+                await self.archive_store.delete(archive_key)
+        finally:
+            if not lock.locked():
+                self._rehydrate_locks.pop(key, None)
+
+        self.rehydrated_sessions += 1
+        print(f"♻️ Rehydrated archived session {session_id} ({len(document['events'])} events)")
+        return True
+
+    async def read_archived_events(self, app_name: str, user_id: str, session_id: str) -> Optional[List[Event]]:
+        """Events of an archived session (snapshot first) without restoring it; None if not archived"""
+        async with self.storage.session_factory() as sql_session:
+            record = await sql_session.get(StorageSessionArchive, (app_name, user_id, session_id))
+        if record is None:
+            return None
+        document = json.loads(await asyncio.to_thread(decompress, await self.archive_store.get(record.archive_key)))
+        events = [Event.model_validate(data) for data in document["events"]]
+        snapshot = document.get("snapshot")
+        if not snapshot:
+            return events
+        # Same view as snapshot + tail (raw events may have been kept for audit)
+        tail = [event for event in events if event.timestamp > snapshot["upto_time"]]
+        return [Event.model_validate(data) for data in snapshot["events"]] + tail
+
+    async def delete_archive(self, app_name: str, user_id: str, session_id: str):
+        async with self.storage.session_factory() as sql_session:
+            record = await sql_session.get(StorageSessionArchive, (app_name, user_id, session_id))
+            if record is None:
+                return
+            await sql_session.delete(record)
+            await sql_session.commit()
+        await self.archive_store.delete(record.archive_key)
+
+    async def delete_archives(self, keys: List[SessionKey]):
+        if not keys:
+            return
+        key_filter = tuple_(
+            StorageSessionArchive.app_name, StorageSessionArchive.user_id, StorageSessionArchive.session_id
+        ).in_(keys)
+        async with self.storage.session_factory() as sql_session:
+            archive_keys = (await sql_session.execute(
+                select(StorageSessionArchive.archive_key).where(key_filter)
+            )).scalars().all()
+            await sql_session.execute(delete(StorageSessionArchive).where(key_filter))
+            await sql_session.commit()
+        for archive_key in archive_keys:
+            await self.archive_store.delete(archive_key)
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.archive_store).__name__,
+            "archived_sessions": self.archived_sessions,
+            "rehydrated_sessions": self.rehydrated_sessions,
+        }
+
+
+class ArchivingSessionService(ForwardingSessionService):
+    """Rehydrates archived sessions transparently when they are opened"""
+
+    def __init__(self, inner, archiver: SessionArchiver):
+        super().__init__(inner)
+        self.archiver = archiver
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        session = await self.inner.get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id, config=config
+        )
+        # Only stubs flagged by archive_session go to the archive; every other load is a single read
+        if session is None or not session.state.get(ARCHIVED_STATE_KEY):
+            return session
+        # Restored here or, concurrently, by another worker: reload either way
+        await self.archiver.rehydrate_session(app_name, user_id, session_id)
+        return await self.inner.get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id, config=config
+        )
+
+    async def iter_session_events(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        after: Optional[float] = None,
+        page_size: int = SESSION_HISTORY_PAGE_EVENTS,
+    ) -> AsyncIterator[List[Event]]:
+        pages = super().iter_session_events(
+            app_name=app_name, user_id=user_id, session_id=session_id, after=after, page_size=page_size
+        )
+        first = await anext(pages, None)
+        # Archived stubs have no events: only an empty session needs the flag check
+        if first is not None and not first:
+            session = await self.inner.get_session(
+                app_name=app_name, user_id=user_id, session_id=session_id, config=GetSessionConfig(num_recent_events=1)
+            )
+            if session is not None and session.state.get(ARCHIVED_STATE_KEY):
+                await pages.aclose()
+                await self.archiver.rehydrate_session(app_name, user_id, session_id)
+                pages = super().iter_session_events(
+                    app_name=app_name, user_id=user_id, session_id=session_id, after=after, page_size=page_size
+                )
+                first = await anext(pages, None)
+        if first is None:
+            return
+        yield first
+        async for page in pages:
+            yield page
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await self.inner.delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        await self.archiver.delete_archive(app_name, user_id, session_id)
+
+    async def delete_sessions(self, keys: List[SessionKey]) -> None:
+        await super().delete_sessions(keys)
+        await self.archiver.delete_archives(keys)
+
+    async def append_events(self, session: Session, events: List[Event], last_update_time: float) -> float:
+        return await self.inner.append_events(session, events, last_update_time)
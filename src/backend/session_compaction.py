@@ -0,0 +1,401 @@
+"""
+Session event compaction for MatterAI Agent
+Folds the old part of a long session's event log into a snapshot so that loading a session reads
+one snapshot row plus a bounded tail. User messages, final assistant texts and tool call/result
+pairs are kept verbatim, so /history and exports still show every turn; only thoughts, partial
+events and state deltas are dropped. Raw events are kept by default (SESSION_COMPACT_KEEP_RAW=true);
+otherwise exactly the folded events are deleted. Events newer than SESSION_COMPACT_SETTLE_SECONDS
+are never folded, so write-behind flushes that land late still end up in the tail.
+"""
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import AsyncIterator, List, Optional
+
+from dotenv import load_dotenv
+from google.adk.events import Event
+from google.adk.sessions import Session
+from google.adk.sessions.base_session_service import GetSessionConfig
+from google.adk.sessions.database_session_service import PreciseTimestamp, StorageEvent
+from sqlalchemy import JSON, DateTime, Integer, String, and_, delete, func, inspect, or_, select, text, tuple_
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+from async_session_service import AsyncDatabaseSessionService
+from session_store import SESSION_HISTORY_PAGE_EVENTS, ForwardingSessionService, SessionKey, iter_session_events
+
+load_dotenv()
+
+# Compaction configuration
+SESSION_COMPACT_MIN_EVENTS = int(os.getenv("SESSION_COMPACT_MIN_EVENTS", "200"))
+SESSION_COMPACT_KEEP_TAIL = int(os.getenv("SESSION_COMPACT_KEEP_TAIL", "50"))
+SESSION_COMPACT_KEEP_RAW = os.getenv("SESSION_COMPACT_KEEP_RAW", "true").lower() == "true"
+SESSION_COMPACT_SETTLE_SECONDS = int(os.getenv("SESSION_COMPACT_SETTLE_SECONDS", "300"))
+SESSION_COMPACT_INTERVAL_SECONDS = int(os.getenv("SESSION_COMPACT_INTERVAL_SECONDS", "3600"))
+SESSION_COMPACT_BATCH_SIZE = int(os.getenv("SESSION_COMPACT_BATCH_SIZE", "100"))
+# Event ids per DELETE statement when raw events are not kept
+SESSION_COMPACT_DELETE_CHUNK = 500
+
+
+class _SnapshotBase(DeclarativeBase):
+    pass
+
+
+class StorageSessionSnapshot(_SnapshotBase):
+    """Folded events of a session up to (and including) upto_time"""
+
+    __tablename__ = "session_snapshots"
+
+    app_name: Mapped[str] = mapped_column(String(128), primary_key=True)
+    user_id: Mapped[str] = mapped_column(String(128), primary_key=True)
+    session_id: Mapped[str] = mapped_column(String(128), primary_key=True)
+    events: Mapped[list] = mapped_column(JSON)
+    upto_time: Mapped[datetime] = mapped_column(PreciseTimestamp)
+    folded_events: Mapped[int] = mapped_column(Integer, default=0)
+    update_time: Mapped[datetime] = mapped_column(DateTime(), default=func.now(), onupdate=func.now())
+
+    def to_events(self) -> List[Event]:
+        return [Event.model_validate(data) for data in self.events]
+
+
+def _is_text_only(event: Event) -> bool:
+    return all(part.text is not None for part in event.content.parts)
+
+
+def fold_events(events: List[Event]) -> List[Event]:
+    """
+    Reduce events to what the LLM context and /history need:
+    partial events, thoughts and empty parts are dropped, consecutive text chunks of one
+    agent/invocation are merged, user messages and tool calls/results are kept as is.
+    """
+    folded: List[Event] = []
+    for event in events:
+        if event.partial or not event.content or not event.content.parts:
+            continue
+        parts = [
+            part for part in event.content.parts
+            if not part.thought and (part.text or part.function_call or part.function_response
+                                     or part.inline_data or part.file_data)
+        ]
+        if not parts:
+            continue
+        event = event.model_copy(update={
+            "content": event.content.model_copy(update={"parts": parts}),
+            "actions": event.actions.model_copy(update={"state_delta": {}}),
+        })
+        previous = folded[-1] if folded else None
+        if (previous is not None and event.author != "user" and previous.author == event.author
+                and previous.invocation_id == event.invocation_id and previous.branch == event.branch
+                and _is_text_only(previous) and _is_text_only(event)):
+            text = "".join(part.text for part in previous.content.parts + event.content.parts)
+            folded[-1] = previous.model_copy(update={
+                "content": previous.content.model_copy(update={"parts": [parts[0].model_copy(update={"text": text})]}),
+                "timestamp": event.timestamp,
+            })
+            continue
+        folded.append(event)
+    return folded
+
+
+def _drop_state_delta_column(connection):
+    """Snapshots used to carry a merged state delta that nothing read; session state lives on the session row"""
+    if "state_delta" in {column["name"] for column in inspect(connection).get_columns("session_snapshots")}:
+        connection.execute(text("ALTER TABLE session_snapshots DROP COLUMN state_delta"))
+
+
+class SessionCompactor:
+    """Builds and reads session snapshots on the async session storage engine"""
+
+    def __init__(
+        self,
+        storage: AsyncDatabaseSessionService,
+        min_events: int = SESSION_COMPACT_MIN_EVENTS,
+        keep_tail: int = SESSION_COMPACT_KEEP_TAIL,
+        keep_raw: bool = SESSION_COMPACT_KEEP_RAW,
+        interval_seconds: int = SESSION_COMPACT_INTERVAL_SECONDS,
+        settle_seconds: int = SESSION_COMPACT_SETTLE_SECONDS,
+    ):
+        self.storage = storage
+        self.min_events = min_events
+        self.keep_tail = keep_tail
+        self.keep_raw = keep_raw
+        self.settle_seconds = settle_seconds
+        self.interval_seconds = interval_seconds
+        self.compacted_sessions = 0
+        self.compacted_events = 0
+        self._loop_task: Optional[asyncio.Task] = None
+
+    async def initialize(self):
+        async with self.storage.db_engine.begin() as connection:
+            await connection.run_sync(_SnapshotBase.metadata.create_all)
+            await connection.run_sync(_drop_state_delta_column)
+        print(f"✅ Session compaction ready (min_events={self.min_events}, keep_tail={self.keep_tail}, "
+              f"keep_raw={self.keep_raw})")
+
+    async def get_snapshot(self, app_name: str, user_id: str, session_id: str) -> Optional[StorageSessionSnapshot]:
+        async with self.storage.session_factory() as sql_session:
+            return await sql_session.get(StorageSessionSnapshot, (app_name, user_id, session_id))
+
+    async def delete_snapshot(self, app_name: str, user_id: str, session_id: str):
+        async with self.storage.session_factory() as sql_session:
+            await sql_session.execute(
+                delete(StorageSessionSnapshot).where(
+                    StorageSessionSnapshot.app_name == app_name,
+                    StorageSessionSnapshot.user_id == user_id,
+                    StorageSessionSnapshot.session_id == session_id,
+                )
+            )
+            await sql_session.commit()
+
+    async def delete_snapshots(self, keys: List[SessionKey]):
+        async with self.storage.session_factory() as sql_session:
+            await sql_session.execute(
+                delete(StorageSessionSnapshot).where(
+                    tuple_(
+                        StorageSessionSnapshot.app_name, StorageSessionSnapshot.user_id, StorageSessionSnapshot.session_id
+                    ).in_(keys)
+                )
+            )
+            await sql_session.commit()
+
+    async def compact_session(self, app_name: str, user_id: str, session_id: str) -> int:
+        """Fold all but the last keep_tail events into the snapshot; returns the number of events folded"""
+        async with self.storage.session_factory() as sql_session:
+            snapshot = await sql_session.get(StorageSessionSnapshot, (app_name, user_id, session_id))
+            query = (
+                select(StorageEvent)
+                .where(
+                    StorageEvent.app_name == app_name,
+                    StorageEvent.user_id == user_id,
+                    StorageEvent.session_id == session_id,
+                )
+                .order_by(StorageEvent.timestamp)
+            )
+            if snapshot is not None:
+                query = query.where(StorageEvent.timestamp > snapshot.upto_time)
+            rows = (await sql_session.execute(query)).scalars().all()
+
+            # Leave the last keep_tail events and anything that may still be followed by late flushes
+            settled_before = time.time() - self.settle_seconds
+            settled = sum(1 for row in rows if row.timestamp.timestamp() < settled_before)
+            split = min(len(rows) - self.keep_tail, settled)
+            if split <= 0:
+                return 0
+            # Never split events sharing a timestamp between snapshot and tail
+            while split < len(rows) and rows[split].timestamp == rows[split - 1].timestamp:
+                split += 1
+            old_rows = rows[:split]
+            upto_time = old_rows[-1].timestamp
+
+            old_events = [row.to_event() for row in old_rows]
+            previous_events = snapshot.to_events() if snapshot else []
+            folded = fold_events(previous_events + old_events)
+            serialized = [event.model_dump(mode="json", exclude_none=True) for event in folded]
+
+            if snapshot is None:
+                snapshot = StorageSessionSnapshot(
+                    app_name=app_name, user_id=user_id, session_id=session_id, folded_events=0
+                )
+                sql_session.add(snapshot)
+            snapshot.events = serialized
+            snapshot.upto_time = upto_time
+            snapshot.folded_events = (snapshot.folded_events or 0) + len(old_rows)
+
+            if not self.keep_raw:
+                # Only the rows read above: an event flushed since then is not in the snapshot
+                folded_ids = [row.id for row in old_rows]
+                for start in range(0, len(folded_ids), SESSION_COMPACT_DELETE_CHUNK):
+                    await sql_session.execute(
+                        delete(StorageEvent).where(
+                            StorageEvent.app_name == app_name,
+                            StorageEvent.user_id == user_id,
+                            StorageEvent.session_id == session_id,
+                            StorageEvent.id.in_(folded_ids[start:start + SESSION_COMPACT_DELETE_CHUNK]),
+                        )
+                    )
+            await sql_session.commit()
+
+        self.compacted_sessions += 1
+        self.compacted_events += len(old_rows)
+        return len(old_rows)
+
+    async def find_candidates(self, limit: int = SESSION_COMPACT_BATCH_SIZE) -> List[tuple]:
+        """Sessions with more than min_events events outside their snapshot"""
+        query = (
+            select(StorageEvent.app_name, StorageEvent.user_id, StorageEvent.session_id)
+            .outerjoin(
+                StorageSessionSnapshot,
+                and_(
+                    StorageSessionSnapshot.app_name == StorageEvent.app_name,
+                    StorageSessionSnapshot.user_id == StorageEvent.user_id,
+                    StorageSessionSnapshot.session_id == StorageEvent.session_id,
+                ),
+            )
+            .where(or_(StorageSessionSnapshot.upto_time.is_(None), StorageEvent.timestamp > StorageSessionSnapshot.upto_time))
+            .group_by(StorageEvent.app_name, StorageEvent.user_id, StorageEvent.session_id)
+            .having(func.count() > self.min_events)
+            .limit(limit)
+        )
+        async with self.storage.session_factory() as sql_session:
+            return [tuple(row) for row in (await sql_session.execute(query)).all()]
+
+    async def compact_pending(self, batch_size: int = SESSION_COMPACT_BATCH_SIZE, progress: bool = False) -> int:
+        """Compact every candidate session, batch by batch; returns the number of sessions compacted"""
+        total_sessions = 0
+        total_events = 0
+        while True:
+            candidates = await self.find_candidates(batch_size)
+            if not candidates:
+                break
+            batch_sessions = 0
+            for app_name, user_id, session_id in candidates:
+                try:
+                    total_events += await self.compact_session(app_name, user_id, session_id)
+                    batch_sessions += 1
+                except Exception as e:
+                    print(f"⚠️ Failed to compact session {session_id}: {e}")
+            total_sessions += batch_sessions
+            if progress:
+                print(f"📝 Compacted {total_sessions} sessions ({total_events} events folded)")
+            # Stop on a short batch, or when every candidate keeps failing
+            if len(candidates) < batch_size or batch_sessions == 0:
+                break
+        return total_sessions
+
+    def start(self):
+        """Start the periodic compaction loop"""
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._compact_loop())
+
+    async def _compact_loop(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                compacted = await self.compact_pending()
+                if compacted:
+                    print(f"🗜️ Compacted {compacted} sessions")
+            except Exception as e:
+                print(f"❌ Session compaction failed: {e}")
+
+    async def close(self):
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+
+    def stats(self) -> dict:
+        return {
+            "min_events": self.min_events,
+            "keep_tail": self.keep_tail,
+            "keep_raw": self.keep_raw,
+            "settle_seconds": self.settle_seconds,
+            "compacted_sessions": self.compacted_sessions,
+            "compacted_events": self.compacted_events,
+        }
+
+
+class CompactingSessionService(ForwardingSessionService):
+    """Loads sessions as snapshot + tail instead of replaying the whole event log"""
+
+    def __init__(self, inner: AsyncDatabaseSessionService, compactor: SessionCompactor):
+        super().__init__(inner)
+        self.compactor = compactor
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        snapshot = await self.compactor.get_snapshot(app_name, user_id, session_id)
+        if snapshot is None:
+            return await self.inner.get_session(
+                app_name=app_name, user_id=user_id, session_id=session_id, config=config
+            )
+
+        upto = snapshot.upto_time.timestamp()
+        after = config.after_timestamp if config and config.after_timestamp else None
+        tail_config = GetSessionConfig(
+            num_recent_events=config.num_recent_events if config else None,
+            after_timestamp=max(upto, after or upto),
+        )
+        session = await self.inner.get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id, config=tail_config
+        )
+        if session is None:
+            return None
+
+        tail = [event for event in session.events if event.timestamp > upto]
+        events = snapshot.to_events()
+        if after:
+            events = [event for event in events if event.timestamp >= after]
+        events.extend(tail)
+        if config and config.num_recent_events:
+            events = events[-config.num_recent_events:]
+        session.events = events
+        return session
+
+    async def iter_session_events(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        after: Optional[float] = None,
+        page_size: int = SESSION_HISTORY_PAGE_EVENTS,
+    ) -> AsyncIterator[List[Event]]:
+        # Raw events still hold everything the snapshot folded, thoughts included
+        snapshot = None if self.compactor.keep_raw else await self.compactor.get_snapshot(app_name, user_id, session_id)
+        if snapshot is None:
+            async for page in iter_session_events(
+                self.inner, app_name=app_name, user_id=user_id, session_id=session_id, after=after, page_size=page_size
+            ):
+                yield page
+            return
+
+        upto = snapshot.upto_time.timestamp()
+        folded = [event for event in snapshot.to_events() if after is None or event.timestamp > after]
+        for start in range(0, len(folded), page_size):
+            yield folded[start:start + page_size]
+        async for page in iter_session_events(
+            self.inner, app_name=app_name, user_id=user_id, session_id=session_id,
+            after=max(upto, after or upto), page_size=page_size,
+        ):
+            yield page
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await self.inner.delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        await self.compactor.delete_snapshot(app_name, user_id, session_id)
+
+    async def delete_sessions(self, keys: List[SessionKey]) -> None:
+        await super().delete_sessions(keys)
+        await self.compactor.delete_snapshots(keys)
+
+    async def append_events(self, session: Session, events: List[Event], last_update_time: float) -> float:
+        return await self.inner.append_events(session, events, last_update_time)
+
+
+async def compact_all(database_url: str):
+    """Compact every session above the threshold, reporting progress"""
+    storage = AsyncDatabaseSessionService(database_url)
+    try:
+        await storage.initialize()
+        compactor = SessionCompactor(storage)
+        await compactor.initialize()
+        print("🗜️ Compacting sessions...")
+        compacted = await compactor.compact_pending(progress=True)
+        print(f"✅ Session compaction completed ({compacted} sessions, {compactor.compacted_events} events folded)")
+    finally:
+        await storage.close()
+
+
+if __name__ == "__main__":
+    from database import DB_CONFIG
+
+    url = f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
+    asyncio.run(compact_all(url))
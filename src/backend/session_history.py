@@ -0,0 +1,362 @@
+"""
+Conversation history for MatterAI Agent
+Turns ADK session events into chat messages (used by /history) and streams whole projects or
+users as NDJSON (used by /sessions/export and the export CLI).
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import sys
+import time
+import zlib
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService
+from google.adk.sessions.database_session_service import StorageSession
+from sqlalchemy import and_, select
+
+from async_session_service import AsyncDatabaseSessionService
+from session_archive import SessionArchiver, StorageSessionArchive
+
+# Rows fetched per round trip by the server-side cursor
+EXPORT_CURSOR_BATCH = 200
+# Flush the gzip stream at least every this many bytes of input
+EXPORT_GZIP_FLUSH_BYTES = 64 * 1024
+
+
+class _MessageBuilder:
+    """逐个事件合并消息的状态（当前的用户消息和助手消息），可跨多页事件持续使用"""
+
+    def __init__(self):
+        self.user_message = None
+        self.assistant_message = None
+
+    def add(self, evt) -> Iterator[Dict[str, Any]]:
+        """加入一个事件，产出因此而完整的消息"""
+        # 优先从 content.role 获取角色，兜底使用 evt.role
+        content = getattr(evt, 'content', None)
+        if content and hasattr(content, 'role'):
+            role = content.role
+        else:
+            role = getattr(evt, 'role', None)
+        
+        # 规范化角色名称
+        if role == 'model':
+            role = 'assistant'
+        
+        # 获取事件时间戳
+        evt_timestamp = None
+        if hasattr(evt, 'timestamp'):
+            evt_timestamp = int(evt.timestamp * 1000) if isinstance(evt.timestamp, float) else int(evt.timestamp)
+        elif hasattr(evt, 'created_at'):
+            evt_timestamp = int(evt.created_at * 1000) if isinstance(evt.created_at, float) else int(evt.created_at)
+        
+        if not evt_timestamp:
+            evt_timestamp = int(time.time() * 1000)
+        
+        # 检查事件类型（用于调试）
+        # has_function_call = False
+        has_function_response = False
+        # has_text = False
+        
+        if content and getattr(content, 'parts', None):
+            for part in content.parts:
+                # if hasattr(part, 'function_call') and part.function_call:
+                #     has_function_call = True
+                if hasattr(part, 'function_response') and part.function_response:
+                    has_function_response = True
+                # if hasattr(part, 'text') and part.text and part.text.strip():
+                #     has_text = True
+        
+        #print(f"🔍 处理事件: role={role}, 工具调用={has_function_call}, 工具结果={has_function_response}, 文本={has_text}, timestamp={evt_timestamp}")
+        
+        # 工具结果虽然可能标记为 'user'，但应该归属到助手消息中
+        if has_function_response:
+            role = 'assistant'
+            #print(f"🔧 工具结果强制归属到助手消息")
+        
+        # 处理用户消息
+        if role == 'user':
+            # 保存之前的助手消息
+            if self.assistant_message and (self.assistant_message.get("content") or 
+                                           self.assistant_message.get("toolCalls") or 
+                                           self.assistant_message.get("toolResults")):
+                yield self.assistant_message
+                self.assistant_message = None
+            
+            # 创建或更新用户消息
+            if not self.user_message:
+                self.user_message = {
+                    "role": "user",
+                    "content": [],
+                    "toolCalls": [],
+                    "toolResults": [],
+                    "timestamp": evt_timestamp
+                }
+            
+            # 处理用户文本内容
+            if content and getattr(content, 'parts', None):
+                for part in content.parts:
+                    text = getattr(part, 'text', None)
+                    if text and text.strip():
+                        self.user_message["content"].append({"type": "text", "text": text})
+        
+        # 处理助手消息
+        elif role == 'assistant':
+            # 保存之前的用户消息
+            if self.user_message and self.user_message.get("content"):
+                yield self.user_message
+                self.user_message = None
+            
+            # 创建或更新助手消息
+            if not self.assistant_message:
+                self.assistant_message = {
+                    "role": "assistant",
+                    "content": [],
+                    "toolCalls": [],
+                    "toolResults": [],
+                    "timestamp": evt_timestamp
+                }
+            
+            # 处理助手文本内容
+            if content and getattr(content, 'parts', None):
+                for part in content.parts:
+                    text = getattr(part, 'text', None)
+                    if text and text.strip():
+                        self.assistant_message["content"].append({"type": "text", "text": text})
+            
+            # 处理工具调用
+            if hasattr(evt, 'get_function_calls'):
+                calls = evt.get_function_calls()
+                if calls:
+                    for call in calls:
+                        tool_call = {
+                            "id": f"call_{getattr(call, 'id', f'{getattr(call, 'name', 'unknown')}_{evt_timestamp}')}",
+                            "name": getattr(call, 'name', 'unknown'),
+                            "args": getattr(call, 'args', {}),
+                            "timestamp": evt_timestamp
+                        }
+                        self.assistant_message["toolCalls"].append(tool_call)
+                        print(f"🔧 添加工具调用: {tool_call['name']}")
+            
+            # 处理工具结果
+            if hasattr(evt, 'get_function_responses'):
+                responses = evt.get_function_responses()
+                if responses:
+                    for resp in responses:
+                        tool_result = {
+                            "id": f"result_{getattr(resp, 'id', f'{getattr(resp, 'name', 'unknown')}_{evt_timestamp}')}",
+                            "name": getattr(resp, 'name', 'unknown'),
+                            "result": getattr(resp, 'response', None),
+                            "timestamp": evt_timestamp
+                        }
+                        self.assistant_message["toolResults"].append(tool_result)
+                        print(f"📋 添加工具结果: {tool_result['name']}")
+
+    def finish(self) -> Iterator[Dict[str, Any]]:
+        """产出剩余的消息"""
+        if self.user_message and self.user_message.get("content"):
+            yield self.user_message
+    
+        if self.assistant_message and (self.assistant_message.get("content") or 
+                                       self.assistant_message.get("toolCalls") or 
+                                       self.assistant_message.get("toolResults")):
+            yield self.assistant_message
+
+
+def process_events(events) -> Iterator[Dict[str, Any]]:
+    """处理事件，将相关的事件合并为完整的消息（生成器：每条消息完整后立即产出）"""
+    builder = _MessageBuilder()
+    for evt in events:
+        yield from builder.add(evt)
+    yield from builder.finish()
+
+
+async def process_event_pages(pages: AsyncIterator[List[Event]]) -> AsyncIterator[Dict[str, Any]]:
+    """process_events 的分页版本：事件按页从存储读取，消息合并状态跨页保留"""
+    builder = _MessageBuilder()
+    async for page in pages:
+        for evt in page:
+            for message in builder.add(evt):
+                yield message
+    for message in builder.finish():
+        yield message
+
+
+async def stream_history_json(
+    session_id: str, first_page: List[Event], pages: AsyncIterator[List[Event]]
+) -> AsyncIterator[str]:
+    """
+    /history 响应体：{"session_id": ..., "messages": [...]}，逐页读取事件、逐条序列化消息。
+    第一页由调用方在返回响应前读取，读取失败仍可返回错误状态码；之后的失败发生在响应头发出之后，
+    此时以 "error" 字段结束 JSON，客户端据此识别历史不完整，而不是收到被截断的 JSON。
+    """
+    async def all_pages() -> AsyncIterator[List[Event]]:
+        yield first_page
+        async for page in pages:
+            yield page
+
+    yield '{"session_id": ' + json.dumps(session_id) + ', "messages": ['
+    count = 0
+    try:
+        async for message in process_event_pages(all_pages()):
+            yield ("," if count else "") + json.dumps(message, ensure_ascii=False, default=str)
+            count += 1
+    except Exception as e:
+        print(f"❌ 会话 {session_id} 的历史在 {count} 条消息后读取失败: {e}")
+        yield '], "error": "history_incomplete"}'
+        return
+    yield "]}"
+
+
+class SessionExporter:
+    """Streams the messages of many sessions as NDJSON with bounded memory"""
+
+    def __init__(
+        self,
+        storage: AsyncDatabaseSessionService,
+        session_service: BaseSessionService,
+        archiver: Optional[SessionArchiver] = None,
+        offloading=None,
+    ):
+        # Session rows are read from storage with a server-side cursor; each session's events go
+        # through session_service so snapshots, pending writes and blob references are honoured
+        self.storage = storage
+        self.session_service = session_service
+        self.archiver = archiver
+        self.offloading = offloading
+
+    async def iter_sessions(self, app_name: Optional[str] = None, user_id: Optional[str] = None) -> AsyncIterator[tuple]:
+        """Yield (app_name, user_id, session_id, archived) of matching sessions"""
+        columns = [StorageSession.app_name, StorageSession.user_id, StorageSession.id]
+        if self.archiver is not None:
+            query = select(*columns, StorageSessionArchive.session_id.is_not(None)).outerjoin(
+                StorageSessionArchive,
+                and_(
+                    StorageSessionArchive.app_name == StorageSession.app_name,
+                    StorageSessionArchive.user_id == StorageSession.user_id,
+                    StorageSessionArchive.session_id == StorageSession.id,
+                ),
+            )
+        else:
+            query = select(*columns)
+        if app_name:
+            query = query.where(StorageSession.app_name == app_name)
+        if user_id:
+            query = query.where(StorageSession.user_id == user_id)
+        query = query.order_by(StorageSession.app_name, StorageSession.user_id, StorageSession.create_time)
+
+        async with self.storage.session_factory() as sql_session:
+            result = await sql_session.stream(query.execution_options(yield_per=EXPORT_CURSOR_BATCH))
+            async for row in result:
+                yield row[0], row[1], row[2], bool(row[3]) if len(row) > 3 else False
+
+    async def load_events(self, app_name: str, user_id: str, session_id: str, archived: bool) -> List[Event]:
+        if archived:
+            # Read archived sessions straight from cold storage instead of restoring them
+            events = await self.archiver.read_archived_events(app_name, user_id, session_id)
+            if events is not None:
+                if self.offloading is not None:
+                    await self.offloading.resolve_events(events)
+                return events
+        session = await self.session_service.get_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        return session.events if session else []
+
+    async def export_lines(self, app_name: Optional[str] = None, user_id: Optional[str] = None) -> AsyncIterator[str]:
+        """One JSON line per message: {app_name, user_id, session_id, role, content, toolCalls, toolResults, timestamp}"""
+        async for row_app_name, row_user_id, session_id, archived in self.iter_sessions(app_name, user_id):
+            try:
+                events = await self.load_events(row_app_name, row_user_id, session_id, archived)
+            except Exception as e:
+                print(f"⚠️ Skipping session {session_id} in export: {e}")
+                continue
+            for message in process_events(events):
+                line = {"app_name": row_app_name, "user_id": row_user_id, "session_id": session_id, **message}
+                yield json.dumps(line, ensure_ascii=False, default=str) + "\n"
+
+
+async def gzip_chunks(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Gzip an async byte stream chunk by chunk"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    pending = 0
+    async for data in chunks:
+        pending += len(data)
+        chunk = compressor.compress(data)
+        if pending >= EXPORT_GZIP_FLUSH_BYTES:
+            chunk += compressor.flush(zlib.Z_SYNC_FLUSH)
+            pending = 0
+        if chunk:
+            yield chunk
+    yield compressor.flush()
+
+
+async def export_sessions(database_url: str, app_name: Optional[str], user_id: Optional[str], output: Optional[str], use_gzip: bool):
+    """Export sessions to a file (or stdout) as NDJSON"""
+    stdout = sys.stdout.buffer
+    stream = stdout if output in (None, "-") else open(output, "wb")
+    # Keep stdout clean for the NDJSON stream: all logging goes to stderr
+    with contextlib.redirect_stdout(sys.stderr):
+        await _export_sessions(database_url, app_name, user_id, stream, stdout, use_gzip)
+
+
+async def _export_sessions(database_url, app_name, user_id, stream, stdout, use_gzip):
+    from blob_store import OffloadingSessionService, SESSION_BLOB_BACKEND, create_blob_store
+    from database import db_manager
+    from session_compaction import CompactingSessionService, SessionCompactor
+
+    storage = AsyncDatabaseSessionService(database_url)
+    if SESSION_BLOB_BACKEND == "postgres":
+        await db_manager.initialize()
+    try:
+        await storage.initialize()
+        compactor = SessionCompactor(storage)
+        await compactor.initialize()
+        archiver = SessionArchiver(storage)
+        await archiver.initialize()
+        service = CompactingSessionService(storage, compactor)
+        offloading = None
+        blob_store = create_blob_store(db_manager.pool)
+        if blob_store is not None:
+            offloading = service = OffloadingSessionService(service, blob_store)
+        exporter = SessionExporter(storage, service, archiver, offloading)
+
+        progress = {"messages": 0}
+
+        async def counted(lines: AsyncIterator[str]) -> AsyncIterator[bytes]:
+            async for line in lines:
+                progress["messages"] += 1
+                if progress["messages"] % 10000 == 0:
+                    print(f"📝 Exported {progress['messages']} messages")
+                yield line.encode("utf-8")
+
+        started = time.time()
+        try:
+            chunks = counted(exporter.export_lines(app_name, user_id))
+            if use_gzip:
+                chunks = gzip_chunks(chunks)
+            async for chunk in chunks:
+                stream.write(chunk)
+        finally:
+            if stream is not stdout:
+                stream.close()
+        print(f"✅ Export completed: {progress['messages']} messages in {time.time() - started:.1f}s")
+    finally:
+        await storage.close()
+        if db_manager.pool:
+            await db_manager.close()
+
+
+if __name__ == "__main__":
+    from database import DB_CONFIG
+
+    parser = argparse.ArgumentParser(description="Export chat sessions as NDJSON (one message per line)")
+    parser.add_argument("--app-name", help="full app name, e.g. chatbot_default (default: all apps)")
+    parser.add_argument("--user-id", help="only this user's sessions (default: all users)")
+    parser.add_argument("--output", "-o", help="output file (default: stdout)")
+    parser.add_argument("--gzip", action="store_true", help="gzip the output")
+    args = parser.parse_args()
+
+    url = f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
+    asyncio.run(export_sessions(url, args.app_name, args.user_id, args.output, args.gzip))
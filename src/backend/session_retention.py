@@ -0,0 +1,167 @@
+"""
+Bulk session deletion and retention policies for MatterAI Agent
+Selects sessions by id, age or app and deletes them batch by batch through the session service
+stack, so cache entries, pending writes, search index rows, snapshots, archives and offloaded
+blobs go with them.
+"""
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from dotenv import load_dotenv
+from google.adk.sessions import BaseSessionService
+from google.adk.sessions.database_session_service import StorageEvent, StorageSession
+from sqlalchemy import and_, exists, func, select
+
+from async_session_service import AsyncDatabaseSessionService
+from session_store import SessionKey, delete_sessions
+
+load_dotenv()
+
+# Retention configuration, e.g. SESSION_RETENTION_POLICIES='{"chatbot_default": 180, "*": 365}'
+# (full app name -> days since last activity; "*" covers every app not listed)
+SESSION_RETENTION_POLICIES: Dict[str, int] = json.loads(os.getenv("SESSION_RETENTION_POLICIES", "{}"))
+SESSION_RETENTION_INTERVAL_SECONDS = int(os.getenv("SESSION_RETENTION_INTERVAL_SECONDS", str(6 * 3600)))
+SESSION_DELETE_BATCH_SIZE = int(os.getenv("SESSION_DELETE_BATCH_SIZE", "500"))
+
+SessionsDeletedListener = Callable[[List[SessionKey]], Awaitable[None]]
+
+
+class SessionRetentionManager:
+    """Bulk deletion by id / age / app, plus a periodic retention task"""
+
+    def __init__(
+        self,
+        storage: AsyncDatabaseSessionService,
+        session_service: BaseSessionService,
+        policies: Optional[Dict[str, int]] = None,
+        batch_size: int = SESSION_DELETE_BATCH_SIZE,
+        interval_seconds: int = SESSION_RETENTION_INTERVAL_SECONDS,
+    ):
+        self.storage = storage
+        self.session_service = session_service
+        self.policies = SESSION_RETENTION_POLICIES if policies is None else policies
+        self.batch_size = batch_size
+        self.interval_seconds = interval_seconds
+        # Called with each deleted batch (e.g. to evict runners and artifacts)
+        self.deleted_listeners: List[SessionsDeletedListener] = []
+        self.deleted_sessions = 0
+        self.last_run_at: Optional[float] = None
+        self._loop_task: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _filtered_query(
+        app_name: Optional[str] = None,
+        exclude_app_names: Optional[List[str]] = None,
+        user_id: Optional[str] = None,
+        session_ids: Optional[List[str]] = None,
+        older_than_days: Optional[float] = None,
+    ):
+        query = select(StorageSession.app_name, StorageSession.user_id, StorageSession.id)
+        if app_name:
+            query = query.where(StorageSession.app_name == app_name)
+        if exclude_app_names:
+            query = query.where(StorageSession.app_name.not_in(exclude_app_names))
+        if user_id:
+            query = query.where(StorageSession.user_id == user_id)
+        if session_ids is not None:
+            query = query.where(StorageSession.id.in_(session_ids))
+        if older_than_days is not None:
+            # Age is measured from the last activity: a state change or a new event
+            cutoff = datetime.now() - timedelta(days=older_than_days)
+            recent_event = exists().where(and_(
+                StorageEvent.app_name == StorageSession.app_name,
+                StorageEvent.user_id == StorageSession.user_id,
+                StorageEvent.session_id == StorageSession.id,
+                StorageEvent.timestamp >= cutoff,
+            ))
+            query = query.where(StorageSession.update_time < cutoff, ~recent_event)
+        return query
+
+    async def find_sessions(self, limit: int = SESSION_DELETE_BATCH_SIZE, **filters) -> List[SessionKey]:
+        query = self._filtered_query(**filters).order_by(StorageSession.update_time).limit(limit)
+        async with self.storage.session_factory() as sql_session:
+            return [tuple(row) for row in (await sql_session.execute(query)).all()]
+
+    async def count_sessions(self, **filters) -> int:
+        query = select(func.count()).select_from(self._filtered_query(**filters).subquery())
+        async with self.storage.session_factory() as sql_session:
+            return await sql_session.scalar(query)
+
+    async def delete_batch(self, keys: List[SessionKey]):
+        await delete_sessions(self.session_service, keys)
+        self.deleted_sessions += len(keys)
+        for listener in self.deleted_listeners:
+            try:
+                await listener(keys)
+            except Exception as e:
+                print(f"⚠️ Session deletion listener failed: {e}")
+
+    async def delete_matching(self, dry_run: bool = False, **filters) -> int:
+        """
+        Delete every session matching the filters (app_name, exclude_app_names, user_id, session_ids,
+        older_than_days) in batches of batch_size; returns the number deleted, or matched for a dry run
+        """
+        if filters.get("session_ids") is not None and not filters["session_ids"]:
+            return 0
+        if dry_run:
+            return await self.count_sessions(**filters)
+        total = 0
+        while True:
+            keys = await self.find_sessions(self.batch_size, **filters)
+            if not keys:
+                break
+            await self.delete_batch(keys)
+            total += len(keys)
+            if len(keys) < self.batch_size:
+                break
+        return total
+
+    async def apply_policies(self) -> Dict[str, int]:
+        """Run every retention policy once; returns deleted counts per policy"""
+        results = {}
+        listed = [app for app in self.policies if app != "*"]
+        for app_name, days in self.policies.items():
+            if not days or days <= 0:
+                # 0 or a negative age would select every session of the app
+                print(f"⚠️ Ignoring retention policy {app_name!r}: days must be positive, got {days!r}")
+                continue
+            if app_name == "*":
+                results[app_name] = await self.delete_matching(exclude_app_names=listed, older_than_days=days)
+            else:
+                results[app_name] = await self.delete_matching(app_name=app_name, older_than_days=days)
+        self.last_run_at = datetime.now().timestamp()
+        return results
+
+    def start(self):
+        """Start the periodic retention task (no-op without policies)"""
+        if self.policies and self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._retention_loop())
+
+    async def _retention_loop(self):
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                results = await self.apply_policies()
+                if any(results.values()):
+                    print(f"🗑️ Retention policies deleted sessions: {results}")
+            except Exception as e:
+                print(f"❌ Session retention run failed: {e}")
+
+    async def close(self):
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+
+    def stats(self) -> dict:
+        return {
+            "policies": self.policies,
+            "deleted_sessions": self.deleted_sessions,
+            "last_run_at": self.last_run_at,
+        }
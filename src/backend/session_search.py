@@ -0,0 +1,437 @@
+"""
+Full-text search over a user's conversations for MatterAI Agent
+Indexes message text, tool names and tool arguments of every persisted event.
+Uses a PostgreSQL pg_trgm index when the auth database pool is available, otherwise an
+embedded SQLite FTS5 trigram index (local/dev). Both match every query term as a substring,
+which also works for CJK text without word boundaries, so the two backends agree.
+"""
+import asyncio
+import json
+import os
+import re
+import sqlite3
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, Session
+
+from session_store import ForwardingSessionService, SessionKey
+
+load_dotenv()
+
+# Search configuration
+SEARCH_BACKEND = os.getenv("SESSION_SEARCH_BACKEND", "auto").lower()  # auto | postgres | sqlite
+SEARCH_SQLITE_PATH = os.getenv(
+    "SESSION_SEARCH_SQLITE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "session_search.db"),
+)
+SNIPPETS_PER_SESSION = 3
+# Characters of context on each side of the first hit in a snippet
+SNIPPET_CONTEXT_CHARS = 40
+MAX_QUERY_TERMS = 8
+
+
+def extract_event_text(event: Event) -> str:
+    """Collect the searchable text of an event: message text, tool names and tool arguments"""
+    chunks: List[str] = []
+    content = event.content
+    if content and content.parts:
+        for part in content.parts:
+            if part.text and part.text.strip():
+                chunks.append(part.text.strip())
+            if part.function_call:
+                chunks.append(part.function_call.name or "")
+                if part.function_call.args:
+                    chunks.append(json.dumps(part.function_call.args, ensure_ascii=False, default=str))
+            if part.function_response:
+                chunks.append(part.function_response.name or "")
+    return "\n".join(chunk for chunk in chunks if chunk)
+
+
+def _event_role(event: Event) -> str:
+    if event.content and event.content.role:
+        return "assistant" if event.content.role == "model" else event.content.role
+    return "assistant" if event.author != "user" else "user"
+
+
+def _event_time(event: Event) -> datetime:
+    return datetime.fromtimestamp(event.timestamp, tz=timezone.utc)
+
+
+def _like_pattern(term: str) -> str:
+    return "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+
+def make_snippet(body: str, terms: List[str]) -> str:
+    """Text around the first hit with every term occurrence in <b></b> (like FTS5 snippet())"""
+    pattern = re.compile("|".join(re.escape(term) for term in terms), re.IGNORECASE)
+    first = pattern.search(body)
+    start = max(0, first.start() - SNIPPET_CONTEXT_CHARS) if first else 0
+    end = min(len(body), (first.end() if first else 0) + SNIPPET_CONTEXT_CHARS)
+    window = pattern.sub(lambda m: f"<b>{m.group(0)}</b>", body[start:end])
+    return ("…" if start > 0 else "") + window + ("…" if end < len(body) else "")
+
+
+class PostgresSearchIndex:
+    """Search index stored in PostgreSQL with a pg_trgm GIN index for substring matching"""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def initialize(self):
+        create_table_query = """
+        CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+        CREATE TABLE IF NOT EXISTS session_search_index (
+            app_name VARCHAR(128) NOT NULL,
+            user_id VARCHAR(128) NOT NULL,
+            session_id VARCHAR(128) NOT NULL,
+            event_id VARCHAR(128) NOT NULL,
+            role VARCHAR(32),
+            body TEXT NOT NULL,
+            event_time TIMESTAMP WITH TIME ZONE NOT NULL,
+            PRIMARY KEY (app_name, user_id, session_id, event_id)
+        );
+
+        -- Word tokens ('simple' config) left every run of CJK characters as one token; match substrings
+        ALTER TABLE session_search_index DROP COLUMN IF EXISTS tsv;
+        CREATE INDEX IF NOT EXISTS idx_session_search_body_trgm ON session_search_index USING GIN (body gin_trgm_ops);
+        CREATE INDEX IF NOT EXISTS idx_session_search_owner ON session_search_index (app_name, user_id);
+        """
+        async with self.pool.acquire() as connection:
+            await connection.execute(create_table_query)
+        print("✅ Session search index (PostgreSQL) created/verified")
+
+    async def add_events(self, session: Session, events: List[Event]):
+        rows = []
+        for event in events:
+            body = extract_event_text(event)
+            if body:
+                rows.append((session.app_name, session.user_id, session.id, event.id,
+                             _event_role(event), body, _event_time(event)))
+        if not rows:
+            return
+        query = """
+        INSERT INTO session_search_index (app_name, user_id, session_id, event_id, role, body, event_time)
+        VALUES ($1, $2, $3, $4, $5, $6, $7)
+        ON CONFLICT (app_name, user_id, session_id, event_id) DO NOTHING;
+        """
+        async with self.pool.acquire() as connection:
+            await connection.executemany(query, rows)
+
+    async def delete_session(self, app_name: str, user_id: str, session_id: str):
+        query = "DELETE FROM session_search_index WHERE app_name = $1 AND user_id = $2 AND session_id = $3"
+        async with self.pool.acquire() as connection:
+            await connection.execute(query, app_name, user_id, session_id)
+
+    async def delete_sessions(self, keys: List[Tuple[str, str, str]]):
+        query = """
+        DELETE FROM session_search_index
+        WHERE (app_name, user_id, session_id) IN (
+            SELECT * FROM unnest($1::varchar[], $2::varchar[], $3::varchar[])
+        )
+        """
+        app_names, user_ids, session_ids = (list(column) for column in zip(*keys))
+        async with self.pool.acquire() as connection:
+            await connection.execute(query, app_names, user_ids, session_ids)
+
+    async def search(self, app_name: str, user_id: str, text: str, limit: int) -> List[Dict[str, Any]]:
+        terms = text.split()[:MAX_QUERY_TERMS]
+        if not terms:
+            return []
+        # Every term must occur in the body (trigram-indexed ILIKE); rank by similarity to the query
+        term_filter = " AND ".join(f"body ILIKE ${index + 5}" for index in range(len(terms)))
+        query = f"""
+        WITH hits AS (
+            SELECT session_id, event_id, role, body, event_time,
+                   row_number() OVER (PARTITION BY session_id ORDER BY word_similarity($3, body) DESC, event_time DESC) AS rn,
+                   count(*) OVER (PARTITION BY session_id) AS hit_count,
+                   max(word_similarity($3, body)) OVER (PARTITION BY session_id) AS session_rank,
+                   max(event_time) OVER (PARTITION BY session_id) AS last_hit_at
+            FROM session_search_index
+            WHERE app_name = $1 AND user_id = $2 AND {term_filter}
+        ),
+        top_sessions AS (
+            SELECT DISTINCT session_id, session_rank, hit_count, last_hit_at
+            FROM hits
+            ORDER BY session_rank DESC, last_hit_at DESC
+            LIMIT $4
+        )
+        SELECT h.session_id, h.event_id, h.role, h.event_time, h.body, s.session_rank, s.hit_count, s.last_hit_at
+        FROM hits h JOIN top_sessions s ON s.session_id = h.session_id
+        WHERE h.rn <= {SNIPPETS_PER_SESSION}
+        ORDER BY s.session_rank DESC, s.last_hit_at DESC, h.rn;
+        """
+        async with self.pool.acquire() as connection:
+            rows = await connection.fetch(
+                query, app_name, user_id, " ".join(terms), limit, *(_like_pattern(term) for term in terms)
+            )
+
+        results: Dict[str, Dict[str, Any]] = {}
+        for row in rows:
+            entry = results.setdefault(row['session_id'], {
+                "session_id": row['session_id'],
+                "score": float(row['session_rank']),
+                "hit_count": row['hit_count'],
+                "last_hit_at": int(row['last_hit_at'].timestamp() * 1000),
+                "snippets": [],
+            })
+            entry["snippets"].append({
+                "event_id": row['event_id'],
+                "role": row['role'],
+                "text": make_snippet(row['body'], terms),
+                "timestamp": int(row['event_time'].timestamp() * 1000),
+            })
+        return list(results.values())
+
+
+class SqliteSearchIndex:
+    """
+    Embedded FTS5 search index for local development. FTS5 cannot index its UNINDEXED columns, so
+    session_search_rows maps each (app_name, user_id, session_id, event_id) to its FTS rowid:
+    re-indexing and deletes look rows up there instead of scanning the whole FTS table.
+    """
+
+    def __init__(self, path: str = SEARCH_SQLITE_PATH):
+        self.path = path
+        self.connection: Optional[sqlite3.Connection] = None
+        self.lock = asyncio.Lock()
+
+    def _create(self):
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        columns = "body, app_name UNINDEXED, user_id UNINDEXED, session_id UNINDEXED, event_id UNINDEXED, role UNINDEXED, event_time UNINDEXED"
+        try:
+            # trigram tokenizer also matches CJK text without word boundaries (SQLite >= 3.34)
+            self.connection.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS session_search_index USING fts5({columns}, tokenize='trigram')"
+            )
+        except sqlite3.OperationalError:
+            self.connection.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS session_search_index USING fts5({columns})"
+            )
+        existed = self.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'session_search_rows'"
+        ).fetchone()
+        self.connection.executescript("""
+        CREATE TABLE IF NOT EXISTS session_search_rows (
+            fts_rowid INTEGER PRIMARY KEY,
+            app_name TEXT NOT NULL,
+            user_id TEXT NOT NULL,
+            session_id TEXT NOT NULL,
+            event_id TEXT NOT NULL,
+            UNIQUE (app_name, user_id, session_id, event_id)
+        );
+        """)
+        if not existed:
+            # Index built before the mapping existed: map its rows once
+            self.connection.execute("""
+            INSERT OR IGNORE INTO session_search_rows (fts_rowid, app_name, user_id, session_id, event_id)
+            SELECT rowid, app_name, user_id, session_id, event_id FROM session_search_index
+            """)
+        self.connection.commit()
+
+    async def _run(self, fn, *args):
+        async with self.lock:
+            return await asyncio.to_thread(fn, *args)
+
+    async def initialize(self):
+        await self._run(self._create)
+        print(f"✅ Session search index (SQLite) created/verified: {self.path}")
+
+    def _add_rows(self, rows):
+        for row in rows:
+            # Already indexed events are skipped (events are immutable once persisted)
+            if self.connection.execute(
+                "SELECT 1 FROM session_search_rows WHERE app_name = ? AND user_id = ? AND session_id = ? AND event_id = ?",
+                row[1:5],
+            ).fetchone():
+                continue
+            cursor = self.connection.execute(
+                "INSERT INTO session_search_index (body, app_name, user_id, session_id, event_id, role, event_time) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                row,
+            )
+            self.connection.execute(
+                "INSERT INTO session_search_rows (fts_rowid, app_name, user_id, session_id, event_id) VALUES (?, ?, ?, ?, ?)",
+                (cursor.lastrowid, *row[1:5]),
+            )
+        self.connection.commit()
+
+    async def add_events(self, session: Session, events: List[Event]):
+        rows = []
+        for event in events:
+            body = extract_event_text(event)
+            if body:
+                rows.append((body, session.app_name, session.user_id, session.id, event.id,
+                             _event_role(event), event.timestamp))
+        if rows:
+            await self._run(self._add_rows, rows)
+
+    def _delete_sessions(self, keys: List[Tuple[str, str, str]]):
+        for key in keys:
+            rowids = [(rowid,) for (rowid,) in self.connection.execute(
+                "SELECT fts_rowid FROM session_search_rows WHERE app_name = ? AND user_id = ? AND session_id = ?", key
+            )]
+            self.connection.executemany("DELETE FROM session_search_index WHERE rowid = ?", rowids)
+            self.connection.execute(
+                "DELETE FROM session_search_rows WHERE app_name = ? AND user_id = ? AND session_id = ?", key
+            )
+        self.connection.commit()
+
+    async def delete_session(self, app_name: str, user_id: str, session_id: str):
+        await self._run(self._delete_sessions, [(app_name, user_id, session_id)])
+
+    async def delete_sessions(self, keys: List[Tuple[str, str, str]]):
+        await self._run(self._delete_sessions, keys)
+
+    def _search(self, app_name: str, user_id: str, terms: List[str], limit: int):
+        # The trigram tokenizer ignores terms shorter than 3 characters (common in Chinese), so those
+        # are matched with LIKE; the others go through the FTS index, quoted so user input is never
+        # parsed as FTS5 syntax
+        long_terms = [term for term in terms if len(term) >= 3]
+        like_filter = "".join(" AND i.body LIKE ? ESCAPE '\\'" for term in terms if len(term) < 3)
+        like_params = [_like_pattern(term) for term in terms if len(term) < 3]
+        if long_terms:
+            match = " ".join('"' + term.replace('"', '""') + '"' for term in long_terms)
+            return self.connection.execute(
+                f"""
+                SELECT i.session_id, i.event_id, i.role, i.event_time, bm25(session_search_index) AS rank, i.body
+                FROM session_search_index i
+                WHERE session_search_index MATCH ? AND i.app_name = ? AND i.user_id = ?{like_filter}
+                ORDER BY rank
+                LIMIT ?
+                """,
+                (match, app_name, user_id, *like_params, limit * 20),
+            ).fetchall()
+        # Only short terms: scan this user's rows (found through session_search_rows)
+        return self.connection.execute(
+            f"""
+            SELECT i.session_id, i.event_id, i.role, i.event_time, 0.0 AS rank, i.body
+            FROM session_search_rows r JOIN session_search_index i ON i.rowid = r.fts_rowid
+            WHERE r.app_name = ? AND r.user_id = ?{like_filter}
+            ORDER BY i.event_time DESC
+            LIMIT ?
+            """,
+            (app_name, user_id, *like_params, limit * 20),
+        ).fetchall()
+
+    async def search(self, app_name: str, user_id: str, text: str, limit: int) -> List[Dict[str, Any]]:
+        terms = text.split()[:MAX_QUERY_TERMS]
+        if not terms:
+            return []
+        rows = await self._run(self._search, app_name, user_id, terms, limit)
+
+        results: Dict[str, Dict[str, Any]] = {}
+        for session_id, event_id, role, event_time, rank, body in rows:
+            entry = results.get(session_id)
+            if entry is None:
+                if len(results) >= limit:
+                    continue
+                # bm25() is lower-is-better; flip it so higher scores rank first like ts_rank
+                entry = results[session_id] = {
+                    "session_id": session_id,
+                    "score": -rank,
+                    "hit_count": 0,
+                    "last_hit_at": 0,
+                    "snippets": [],
+                }
+            entry["hit_count"] += 1
+            entry["last_hit_at"] = max(entry["last_hit_at"], int(event_time * 1000))
+            if len(entry["snippets"]) < SNIPPETS_PER_SESSION:
+                entry["snippets"].append({
+                    "event_id": event_id,
+                    "role": role,
+                    "text": make_snippet(body, terms),
+                    "timestamp": int(event_time * 1000),
+                })
+        return list(results.values())
+
+
+def create_search_index(pool=None):
+    """Pick the search backend: PostgreSQL when a pool is available, otherwise SQLite"""
+    if SEARCH_BACKEND == "postgres" or (SEARCH_BACKEND == "auto" and pool is not None):
+        if pool is None:
+            raise ValueError("SESSION_SEARCH_BACKEND=postgres requires an initialized database pool")
+        return PostgresSearchIndex(pool)
+    return SqliteSearchIndex()
+
+
+class SearchIndexingSessionService(ForwardingSessionService):
+    """Keeps the search index up to date as events are appended or sessions deleted"""
+
+    def __init__(self, inner: BaseSessionService, index):
+        super().__init__(inner)
+        self.index = index
+        self._pending_tasks: set = set()
+
+    def _spawn(self, coro):
+        # Indexing runs off the streaming path; failures only cost search freshness
+        task = asyncio.create_task(coro)
+        self._pending_tasks.add(task)
+        task.add_done_callback(self._pending_tasks.discard)
+
+    async def _index_events(self, session: Session, events: List[Event]):
+        try:
+            await self.index.add_events(session, events)
+        except Exception as e:
+            print(f"⚠️ 会话 {session.id} 搜索索引更新失败: {e}")
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        event = await super().append_event(session=session, event=event)
+        if not event.partial:
+            self._spawn(self._index_events(session, [event]))
+        return event
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await super().delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        await self.index.delete_session(app_name, user_id, session_id)
+
+    async def delete_sessions(self, keys: List[SessionKey]) -> None:
+        await super().delete_sessions(keys)
+        await self.index.delete_sessions(keys)
+
+    async def index_session(self, app_name: str, user_id: str, session_id: str) -> int:
+        """(Re)index every event of an existing session, returns the number of events seen"""
+        session = await self.inner.get_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        if not session:
+            return 0
+        await self.index.add_events(session, session.events)
+        return len(session.events)
+
+    async def drain(self):
+        """Wait for in-flight indexing tasks (used on shutdown)"""
+        if self._pending_tasks:
+            await asyncio.gather(*self._pending_tasks, return_exceptions=True)
+
+
+async def backfill(database_url: str):
+    """Index every session already stored in the database"""
+    from google.adk.sessions import DatabaseSessionService
+    from database import db_manager
+
+    await db_manager.initialize()
+    try:
+        index = create_search_index(db_manager.pool)
+        await index.initialize()
+        service = SearchIndexingSessionService(DatabaseSessionService(database_url), index)
+
+        async with db_manager.pool.acquire() as connection:
+            rows = await connection.fetch("SELECT app_name, user_id, id FROM sessions ORDER BY update_time DESC")
+        print(f"📚 Backfilling search index for {len(rows)} sessions...")
+
+        total_events = 0
+        for i, row in enumerate(rows, 1):
+            total_events += await service.index_session(row['app_name'], row['user_id'], row['id'])
+            if i % 100 == 0 or i == len(rows):
+                print(f"📝 Indexed {i}/{len(rows)} sessions ({total_events} events)")
+        print("✅ Search index backfill completed")
+    finally:
+        await db_manager.close()
+
+
+if __name__ == "__main__":
+    from database import DB_CONFIG
+
+    url = f"postgresql://{DB_CONFIG['user']}:{DB_CONFIG['password']}@{DB_CONFIG['host']}:{DB_CONFIG['port']}/{DB_CONFIG['database']}"
+    asyncio.run(backfill(url))
@@ -0,0 +1,661 @@
+"""
+Session service wrappers for MatterAI Agent
+Layers extra behaviour (search indexing, caching, ...) on top of an ADK session service.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from google.adk.events import Event
+from google.adk.sessions import BaseSessionService, DatabaseSessionService, Session
+from google.adk.sessions.base_session_service import GetSessionConfig, ListSessionsResponse
+from google.adk.sessions.database_session_service import (
+    StorageAppState,
+    StorageEvent,
+    StorageSession,
+    StorageUserState,
+    _extract_state_delta,
+)
+from sqlalchemy import Index, select
+
+load_dotenv()
+
+# Session cache configuration
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "256"))
+SESSION_CACHE_VERIFY_SECONDS = float(os.getenv("SESSION_CACHE_VERIFY_SECONDS", "2"))
+
+# Write-behind configuration
+SESSION_FLUSH_INTERVAL_MS = int(os.getenv("SESSION_FLUSH_INTERVAL_MS", "200"))
+SESSION_FLUSH_MAX_EVENTS = int(os.getenv("SESSION_FLUSH_MAX_EVENTS", "50"))
+# Failed batches are kept and retried no more often than this
+SESSION_FLUSH_RETRY_SECONDS = float(os.getenv("SESSION_FLUSH_RETRY_SECONDS", "1"))
+# Backpressure: beyond this many buffered events of one session, append_event writes synchronously
+SESSION_PENDING_MAX_EVENTS = int(os.getenv("SESSION_PENDING_MAX_EVENTS", "500"))
+
+# Events read per query when a session's history is streamed
+SESSION_HISTORY_PAGE_EVENTS = int(os.getenv("SESSION_HISTORY_PAGE_EVENTS", "200"))
+
+SessionKey = Tuple[str, str, str]
+# (sessions.update_time, id of the latest event): update_time alone only moves on state changes
+SessionVersion = Tuple[float, Optional[str]]
+
+
+# Serves the per-user "most recently updated sessions" listing
+RECENT_SESSIONS_INDEX = Index(
+    "idx_sessions_user_update_time", StorageSession.app_name, StorageSession.user_id, StorageSession.update_time
+)
+
+
+def recent_sessions_query(app_name: str, user_id: str, limit: int):
+    return (
+        select(StorageSession)
+        .where(StorageSession.app_name == app_name, StorageSession.user_id == user_id)
+        .order_by(StorageSession.update_time.desc())
+        .limit(limit)
+    )
+
+
+class StaleSessionError(ValueError):
+    """The stored session is gone or was modified by another writer; retrying the write cannot succeed"""
+
+
+class ForwardingSessionService(BaseSessionService):
+    """Session service that delegates every call to an inner service"""
+
+    def __init__(self, inner: BaseSessionService):
+        self.inner = inner
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        return await self.inner.create_session(
+            app_name=app_name, user_id=user_id, state=state, session_id=session_id
+        )
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        return await self.inner.get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id, config=config
+        )
+
+    async def list_sessions(self, *, app_name: str, user_id: str) -> ListSessionsResponse:
+        return await self.inner.list_sessions(app_name=app_name, user_id=user_id)
+
+    async def list_recent_sessions(self, *, app_name: str, user_id: str, limit: int) -> ListSessionsResponse:
+        return await list_recent_sessions(self.inner, app_name=app_name, user_id=user_id, limit=limit)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        await self.inner.delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    async def delete_sessions(self, keys: List[SessionKey]) -> None:
+        await delete_sessions(self.inner, keys)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        return await self.inner.append_event(session=session, event=event)
+
+    async def get_session_version(self, *, app_name: str, user_id: str, session_id: str) -> Optional[SessionVersion]:
+        return await self.inner.get_session_version(
+            app_name=app_name, user_id=user_id, session_id=session_id
+        )
+
+    async def iter_session_events(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        after: Optional[float] = None,
+        page_size: int = SESSION_HISTORY_PAGE_EVENTS,
+    ) -> AsyncIterator[List[Event]]:
+        async for page in iter_session_events(
+            self.inner, app_name=app_name, user_id=user_id, session_id=session_id, after=after, page_size=page_size
+        ):
+            yield page
+
+
+async def delete_sessions(service: BaseSessionService, keys: List[SessionKey]) -> None:
+    """Delete many sessions, in bulk where the service supports it (one by one otherwise)"""
+    if hasattr(service, "delete_sessions"):
+        await service.delete_sessions(keys)
+        return
+    for app_name, user_id, session_id in keys:
+        await service.delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+
+
+async def list_recent_sessions(service: BaseSessionService, *, app_name: str, user_id: str, limit: int) -> ListSessionsResponse:
+    """The user's most recently updated sessions, newest first (sorted in storage where supported)"""
+    if hasattr(service, "list_recent_sessions"):
+        return await service.list_recent_sessions(app_name=app_name, user_id=user_id, limit=limit)
+    response = await service.list_sessions(app_name=app_name, user_id=user_id)
+    sessions = sorted(response.sessions, key=lambda s: s.last_update_time, reverse=True)[:limit]
+    return ListSessionsResponse(sessions=sessions)
+
+
+async def iter_session_events(
+    service: BaseSessionService,
+    *,
+    app_name: str,
+    user_id: str,
+    session_id: str,
+    after: Optional[float] = None,
+    page_size: int = SESSION_HISTORY_PAGE_EVENTS,
+) -> AsyncIterator[List[Event]]:
+    """
+    Events of a session newer than after, oldest first, in pages of at most page_size (read page by
+    page from storage where supported, from one get_session otherwise). An existing session yields
+    at least one, possibly empty, page; a missing one yields nothing.
+    """
+    if hasattr(service, "iter_session_events"):
+        async for page in service.iter_session_events(
+            app_name=app_name, user_id=user_id, session_id=session_id, after=after, page_size=page_size
+        ):
+            yield page
+        return
+    session = await service.get_session(app_name=app_name, user_id=user_id, session_id=session_id)
+    if session is None:
+        return
+    events = [event for event in session.events if after is None or event.timestamp > after]
+    yield events[:page_size]
+    for start in range(page_size, len(events), page_size):
+        yield events[start:start + page_size]
+
+
+def collect_state_deltas(events: List[Event]) -> Tuple[Dict[str, Any], Dict[str, Any], Dict[str, Any]]:
+    """Merge the state deltas of several events into (app, user, session) deltas"""
+    app_state_delta: Dict[str, Any] = {}
+    user_state_delta: Dict[str, Any] = {}
+    session_state_delta: Dict[str, Any] = {}
+    for event in events:
+        if event.actions and event.actions.state_delta:
+            app_delta, user_delta, session_delta = _extract_state_delta(event.actions.state_delta)
+            app_state_delta.update(app_delta)
+            user_state_delta.update(user_delta)
+            session_state_delta.update(session_delta)
+    return app_state_delta, user_state_delta, session_state_delta
+
+
+class VersionedDatabaseSessionService(DatabaseSessionService):
+    """DatabaseSessionService that can report a session's storage version without loading events"""
+
+    def __init__(self, db_url: str, **kwargs: Any):
+        # Creates tables and indexes synchronously: construct with asyncio.to_thread from async code
+        super().__init__(db_url, **kwargs)
+        # ADK's events primary key starts with the event id; per-session reads need their own index
+        Index(
+            "idx_events_session_time",
+            StorageEvent.app_name, StorageEvent.user_id, StorageEvent.session_id, StorageEvent.timestamp,
+        ).create(self.db_engine, checkfirst=True)
+        RECENT_SESSIONS_INDEX.create(self.db_engine, checkfirst=True)
+
+    async def list_recent_sessions(self, *, app_name: str, user_id: str, limit: int) -> ListSessionsResponse:
+        return await asyncio.to_thread(self._list_recent_sessions, app_name, user_id, limit)
+
+    def _list_recent_sessions(self, app_name: str, user_id: str, limit: int) -> ListSessionsResponse:
+        with self.database_session_factory() as sql_session:
+            storage_sessions = sql_session.execute(
+                recent_sessions_query(app_name, user_id, limit)
+            ).scalars().all()
+            return ListSessionsResponse(sessions=[s.to_session() for s in storage_sessions])
+
+    async def get_session_version(self, *, app_name: str, user_id: str, session_id: str) -> Optional[SessionVersion]:
+        """Return (update_time, latest event id) of a session, None if it does not exist"""
+        # Sync SQLAlchemy: keep the query off the event loop
+        return await asyncio.to_thread(self._get_session_version, app_name, user_id, session_id)
+
+    def _get_session_version(self, app_name: str, user_id: str, session_id: str) -> Optional[SessionVersion]:
+        with self.database_session_factory() as sql_session:
+            storage_session = sql_session.get(StorageSession, (app_name, user_id, session_id))
+            if storage_session is None:
+                return None
+            latest_event_id = sql_session.execute(
+                select(StorageEvent.id)
+                .where(
+                    StorageEvent.app_name == app_name,
+                    StorageEvent.user_id == user_id,
+                    StorageEvent.session_id == session_id,
+                )
+                .order_by(StorageEvent.timestamp.desc())
+                .limit(1)
+            ).scalar()
+            return storage_session.update_timestamp_tz, latest_event_id
+
+    async def append_events(self, session: Session, events: List[Event], last_update_time: float) -> float:
+        """
+        Persist several events of one session in a single transaction.
+        The in-memory session must already contain the events; returns the new storage update time.
+        """
+        return await asyncio.to_thread(self._append_events, session, events, last_update_time)
+
+    def _append_events(self, session: Session, events: List[Event], last_update_time: float) -> float:
+        with self.database_session_factory() as sql_session:
+            storage_session = sql_session.get(StorageSession, (session.app_name, session.user_id, session.id))
+            if storage_session is None:
+                raise StaleSessionError(f"Session not found: {session.id}")
+            if storage_session.update_timestamp_tz > last_update_time:
+                raise StaleSessionError(f"Session {session.id} was modified by another writer, refusing stale batch")
+
+            storage_app_state = sql_session.get(StorageAppState, (session.app_name))
+            storage_user_state = sql_session.get(StorageUserState, (session.app_name, session.user_id))
+            app_state = storage_app_state.state if storage_app_state else {}
+            user_state = storage_user_state.state if storage_user_state else {}
+            session_state = storage_session.state
+
+            app_state_delta, user_state_delta, session_state_delta = collect_state_deltas(events)
+            for event in events:
+                sql_session.add(StorageEvent.from_event(session, event))
+
+            if app_state_delta:
+                app_state.update(app_state_delta)
+                storage_app_state.state = app_state
+            if user_state_delta:
+                user_state.update(user_state_delta)
+                storage_user_state.state = user_state
+            if session_state_delta:
+                session_state.update(session_state_delta)
+                storage_session.state = session_state
+
+            sql_session.commit()
+            sql_session.refresh(storage_session)
+            return storage_session.update_timestamp_tz
+
+
+def session_version(session: Session) -> SessionVersion:
+    """Version of an in-memory session, comparable with get_session_version()"""
+    return session.last_update_time, session.events[-1].id if session.events else None
+
+
+def _copy_session(session: Session, config: Optional[GetSessionConfig] = None) -> Session:
+    """Copy a session so callers can mutate it without touching the cached instance"""
+    events = session.events
+    if config and config.after_timestamp:
+        events = [e for e in events if e.timestamp >= config.after_timestamp]
+    if config and config.num_recent_events:
+        events = events[-config.num_recent_events:]
+    return session.model_copy(update={"events": list(events), "state": dict(session.state)})
+
+
+class _CacheEntry:
+    __slots__ = ("session", "checked_at")
+
+    def __init__(self, session: Session):
+        self.session = session
+        self.checked_at = time.monotonic()
+
+
+class CachedSessionService(ForwardingSessionService):
+    """
+    Bounded read-through cache of recently used sessions.
+    get_session is served from memory; append_event writes through to the inner service.
+    Entries older than verify_interval are re-validated against the storage version,
+    so sessions written by another worker are reloaded instead of served stale.
+    """
+
+    def __init__(
+        self,
+        inner: BaseSessionService,
+        max_sessions: int = SESSION_CACHE_SIZE,
+        verify_interval: float = SESSION_CACHE_VERIFY_SECONDS,
+    ):
+        super().__init__(inner)
+        self.max_sessions = max_sessions
+        self.verify_interval = verify_interval
+        self._entries: "OrderedDict[SessionKey, _CacheEntry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _store(self, session: Session):
+        key = (session.app_name, session.user_id, session.id)
+        self._entries[key] = _CacheEntry(_copy_session(session))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_sessions:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, app_name: str, user_id: str, session_id: str):
+        """Drop a session from the cache"""
+        if self._entries.pop((app_name, user_id, session_id), None) is not None:
+            self.invalidations += 1
+
+    async def _is_current(self, key: SessionKey, entry: _CacheEntry) -> bool:
+        if time.monotonic() - entry.checked_at < self.verify_interval:
+            return True
+        version = await self.inner.get_session_version(app_name=key[0], user_id=key[1], session_id=key[2])
+        if version is None or version != session_version(entry.session):
+            return False
+        entry.checked_at = time.monotonic()
+        return True
+
+    async def create_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        state: Optional[dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> Session:
+        session = await super().create_session(
+            app_name=app_name, user_id=user_id, state=state, session_id=session_id
+        )
+        self._store(session)
+        return session
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        key = (app_name, user_id, session_id)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if await self._is_current(key, entry):
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return _copy_session(entry.session, config)
+            self.invalidate(*key)
+
+        self.misses += 1
+        session = await super().get_session(app_name=app_name, user_id=user_id, session_id=session_id)
+        if session is None:
+            return None
+        self._store(session)
+        return _copy_session(session, config)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        self.invalidate(app_name, user_id, session_id)
+        await super().delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    async def delete_sessions(self, keys: List[SessionKey]) -> None:
+        for key in keys:
+            self.invalidate(*key)
+        await super().delete_sessions(keys)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        key = (session.app_name, session.user_id, session.id)
+        previous_version = session.last_update_time
+        try:
+            event = await super().append_event(session=session, event=event)
+        except Exception:
+            # e.g. stale session rejected by storage: force a reload next time
+            self.invalidate(*key)
+            raise
+        if event.partial:
+            return event
+
+        # Write through: apply the event to the cached copy (the caller may hold a filtered view)
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.session.last_update_time == previous_version:
+                await BaseSessionService.append_event(self, entry.session, event)
+                entry.session.last_update_time = session.last_update_time
+                entry.checked_at = time.monotonic()
+            else:
+                self.invalidate(*key)
+        return event
+
+    def note_abandoned(self, key: SessionKey):
+        """A write-behind batch was given up: the cached copy holds events that storage does not"""
+        self.invalidate(*key)
+
+    def note_flushed(self, key: SessionKey, last_update_time: float, last_event_id: str):
+        """Adopt the storage update time of a write-behind flush that the cached copy already contains"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        if any(e.id == last_event_id for e in reversed(entry.session.events)):
+            entry.session.last_update_time = last_update_time
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "cached_sessions": len(self._entries),
+            "max_sessions": self.max_sessions,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+class _PendingBatch:
+    __slots__ = ("session", "events", "last_update_time")
+
+    def __init__(self, session: Session):
+        self.session = session
+        self.events: List[Event] = []
+        self.last_update_time = session.last_update_time
+
+
+class BatchingSessionService(ForwardingSessionService):
+    """
+    Write-behind event appends.
+    append_event only updates the in-memory session and buffers the event; buffered events
+    of a session are committed in one transaction when its turn completes, when the buffer
+    reaches SESSION_FLUSH_MAX_EVENTS, or every SESSION_FLUSH_INTERVAL_MS.
+    A batch that fails to commit is kept and retried; while it is failing (or once a session
+    buffers SESSION_PENDING_MAX_EVENTS), append_event commits synchronously and raises the
+    storage error instead of buffering more. A batch rejected as stale is given up: the error
+    is raised by the next append_event of that session and abandon_listeners are notified.
+    The inner service must implement append_events() (see VersionedDatabaseSessionService).
+    """
+
+    def __init__(
+        self,
+        inner: BaseSessionService,
+        flush_interval_ms: int = SESSION_FLUSH_INTERVAL_MS,
+        max_events: int = SESSION_FLUSH_MAX_EVENTS,
+    ):
+        super().__init__(inner)
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_events = max_events
+        self.flush_listeners: List[Callable[[SessionKey, float, str], None]] = []
+        self.abandon_listeners: List[Callable[[SessionKey], None]] = []
+        self._pending: Dict[SessionKey, _PendingBatch] = {}
+        self._locks: Dict[SessionKey, asyncio.Lock] = {}
+        # Sessions whose last flush failed: (error, monotonic time of the failure)
+        self._failed: Dict[SessionKey, Tuple[Exception, float]] = {}
+        # Errors of abandoned (stale) batches, raised by the next append_event of the session
+        self._abandoned: Dict[SessionKey, Exception] = {}
+        self._flush_tasks: set = set()
+        self._flusher: Optional[asyncio.Task] = None
+        self.flushed_batches = 0
+        self.flushed_events = 0
+        self.flush_failures = 0
+        self.abandoned_events = 0
+
+    def start(self):
+        """Start the periodic flusher"""
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        """Stop the periodic flusher and flush everything still buffered (durability on shutdown)"""
+        if self._flusher and not self._flusher.done():
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+        if self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks, return_exceptions=True)
+        await self.flush_all(retry_failed=True)
+        lost = sum(len(batch.events) for batch in self._pending.values())
+        if lost:
+            print(f"❌ 关闭时仍有 {len(self._pending)} 个会话的 {lost} 个事件未能写入")
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush_all()
+            except Exception as e:
+                print(f"❌ 会话事件批量写入异常: {e}")
+
+    def _schedule_flush(self, key: SessionKey):
+        task = asyncio.create_task(self.flush(key))
+        self._flush_tasks.add(task)
+        task.add_done_callback(self._flush_tasks.discard)
+
+    async def flush_all(self, retry_failed: bool = False):
+        now = time.monotonic()
+        for key in list(self._pending):
+            failure = self._failed.get(key)
+            # Failing sessions are retried at most every SESSION_FLUSH_RETRY_SECONDS
+            if failure is None or retry_failed or now - failure[1] >= SESSION_FLUSH_RETRY_SECONDS:
+                await self.flush(key)
+
+    async def flush(self, key: SessionKey, raise_errors: bool = False):
+        """Commit the buffered events of one session (raise_errors: re-raise a storage failure)"""
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            batch = self._pending.pop(key, None)
+            if batch is None or not batch.events:
+                return
+            try:
+                new_update_time = await self.inner.append_events(batch.session, batch.events, batch.last_update_time)
+            except StaleSessionError as e:
+                # Storage moved on (or the session was deleted): the batch can never be written
+                self._failed.pop(key, None)
+                self._abandoned[key] = e
+                self.abandoned_events += len(batch.events)
+                print(f"❌ 会话 {key[2]} 的 {len(batch.events)} 个事件无法写入（存储已被修改），已放弃: {e}")
+                if key not in self._pending:
+                    self._locks.pop(key, None)
+                for listener in self.abandon_listeners:
+                    listener(key)
+                if raise_errors:
+                    raise
+                return
+            except Exception as e:
+                self._failed[key] = (e, time.monotonic())
+                self.flush_failures += 1
+                # Keep the batch, in front of anything appended meanwhile
+                newer = self._pending.get(key)
+                if newer is not None:
+                    batch.events.extend(newer.events)
+                    batch.session = newer.session
+                self._pending[key] = batch
+                print(f"⚠️ 会话 {key[2]} 的 {len(batch.events)} 个事件写入失败，稍后重试: {e}")
+                if raise_errors:
+                    raise
+                return
+
+            self._failed.pop(key, None)
+            self.flushed_batches += 1
+            self.flushed_events += len(batch.events)
+            batch.session.last_update_time = new_update_time
+            newer = self._pending.get(key)
+            if newer is not None:
+                # Events appended during the flush were buffered against the old version
+                newer.last_update_time = new_update_time
+                newer.session.last_update_time = new_update_time
+            else:
+                self._locks.pop(key, None)
+            for listener in self.flush_listeners:
+                listener(key, new_update_time, batch.events[-1].id)
+
+    async def append_event(self, session: Session, event: Event) -> Event:
+        if event.partial:
+            return event
+        key = (session.app_name, session.user_id, session.id)
+        abandoned = self._abandoned.pop(key, None)
+        if abandoned is not None:
+            # Earlier events of this session never reached storage
+            raise abandoned
+        batch = self._pending.get(key)
+        if batch is not None and (key in self._failed or len(batch.events) >= SESSION_PENDING_MAX_EVENTS):
+            # Backpressure: storage is failing or falling behind; write now and surface any error
+            await self.flush(key, raise_errors=True)
+        # In-memory update only (state delta + events list); storage is written on flush
+        await BaseSessionService.append_event(self, session, event)
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = self._pending[key] = _PendingBatch(session)
+        batch.session = session
+        batch.events.append(event)
+
+        if event.turn_complete or event.is_final_response() or len(batch.events) >= self.max_events:
+            self._schedule_flush(key)
+        return event
+
+    async def get_session(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        config: Optional[GetSessionConfig] = None,
+    ) -> Optional[Session]:
+        # Read-your-writes: commit anything buffered for this session before loading it
+        await self.flush((app_name, user_id, session_id))
+        return await super().get_session(
+            app_name=app_name, user_id=user_id, session_id=session_id, config=config
+        )
+
+    async def iter_session_events(
+        self,
+        *,
+        app_name: str,
+        user_id: str,
+        session_id: str,
+        after: Optional[float] = None,
+        page_size: int = SESSION_HISTORY_PAGE_EVENTS,
+    ) -> AsyncIterator[List[Event]]:
+        # Read-your-writes, as in get_session
+        await self.flush((app_name, user_id, session_id))
+        async for page in super().iter_session_events(
+            app_name=app_name, user_id=user_id, session_id=session_id, after=after, page_size=page_size
+        ):
+            yield page
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        key = (app_name, user_id, session_id)
+        async with self._locks.setdefault(key, asyncio.Lock()):
+            self._pending.pop(key, None)
+        self._locks.pop(key, None)
+        self._failed.pop(key, None)
+        self._abandoned.pop(key, None)
+        await super().delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    async def delete_sessions(self, keys: List[SessionKey]) -> None:
+        for key in keys:
+            async with self._locks.setdefault(key, asyncio.Lock()):
+                self._pending.pop(key, None)
+            self._locks.pop(key, None)
+            self._failed.pop(key, None)
+            self._abandoned.pop(key, None)
+        await super().delete_sessions(keys)
+
+    async def get_session_version(self, *, app_name: str, user_id: str, session_id: str) -> Optional[SessionVersion]:
+        batch = self._pending.get((app_name, user_id, session_id))
+        if batch is not None:
+            # Buffered events are newer than storage; this worker holds the current version
+            return session_version(batch.session)
+        return await super().get_session_version(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pending_sessions": len(self._pending),
+            "pending_events": sum(len(b.events) for b in self._pending.values()),
+            "flushed_batches": self.flushed_batches,
+            "flushed_events": self.flushed_events,
+            "failing_sessions": len(self._failed),
+            "flush_failures": self.flush_failures,
+            "abandoned_events": self.abandoned_events,
+        }
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Token Verification Microbenchmark for MatterAI Agent
+Compares get_current_user with a cold verified-token cache (full jwt.decode on every call)
+against a warm cache, for a mix of distinct tokens.
+"""
+
+import asyncio
+import sys
+import os
+import time
+
+# Add the current directory to Python path to import the auth modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from auth_api.auth_routes import create_access_token, get_current_user, jwt_key_ring
+from auth_api.token_cache import verified_token_cache
+
+async def measure(tokens, iterations: int) -> float:
+    """Average microseconds per get_current_user call"""
+    started = time.perf_counter()
+    for i in range(iterations):
+        await get_current_user(tokens[i % len(tokens)])
+    return (time.perf_counter() - started) / iterations * 1_000_000
+
+async def main():
+    """Main entry point"""
+    try:
+        iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+        distinct_tokens = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    except ValueError:
+        print("Usage: python token_cache_bench.py [iterations] [distinct_tokens]")
+        sys.exit(1)
+
+    # Load (or create) the signing keys the routes use
+    await jwt_key_ring.initialize()
+    try:
+        await run(iterations, distinct_tokens)
+    finally:
+        await jwt_key_ring.close()
+
+async def run(iterations: int, distinct_tokens: int):
+    """Mint the tokens and time cold vs warm verification"""
+    tokens = [
+        create_access_token({"sub": f"user{i}@example.com", "id": str(10000 + i), "isAdmin": False})
+        for i in range(distinct_tokens)
+    ]
+
+    print(f"🎯 {iterations} verifications over {distinct_tokens} distinct tokens")
+
+    # Cold: disable the cache so every call verifies the signature
+    max_size = verified_token_cache.max_size
+    verified_token_cache.max_size = 0
+    verified_token_cache.clear()
+    cold_us = await measure(tokens, iterations)
+
+    verified_token_cache.max_size = max_size
+    verified_token_cache.hits = verified_token_cache.misses = 0
+    warm_us = await measure(tokens, iterations)
+
+    print(f"📊 Results:")
+    print(f"   Without cache: {cold_us:.1f} µs/call ({1_000_000 / cold_us:,.0f} calls/s)")
+    print(f"   With cache:    {warm_us:.1f} µs/call ({1_000_000 / warm_us:,.0f} calls/s)")
+    print(f"   Speedup:       x{cold_us / warm_us:.1f}")
+    print(f"   Cache stats:   {verified_token_cache.stats()}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -86,6 +86,25 @@ const EmailVerification: React.FC<EmailVerificationProps> = ({
     };
   }, [countdown]);
 
+  // 邮件由后台队列发送：轮询投递状态，最终失败时提示重新发送
+  const watchDelivery = async (messageId: string) => {
+    for (let i = 0; i < 20; i++) {
+      await new Promise(resolve => setTimeout(resolve, 3000));
+      try {
+        const delivery = await api.getEmailStatus(messageId);
+        if (delivery.status === 'sent') return;
+        if (delivery.status === 'failed') {
+          setSuccess('');
+          setError(t('auth.codeDeliveryFailed', '验证码邮件发送失败，请检查邮箱地址后重新发送'));
+          setCountdown(0);
+          return;
+        }
+      } catch {
+        return;
+      }
+    }
+  };
+
   const handleSendCode = async () => {
     setSendingCode(true);
     setError('');
@@ -97,6 +116,9 @@ const EmailVerification: React.FC<EmailVerificationProps> = ({
       if (response.success) {
         setSuccess(response.message || t('auth.codeSentSuccess', '验证码已发送'));
         setCountdown(60); // 60 second countdown
+        if (response.message_id) {
+          watchDelivery(response.message_id);
+        }
       } else {
         setError(response.message || t('auth.codeSentFailed', '验证码发送失败'));
       }
@@ -84,7 +84,8 @@ const RegisterWithVerificationForm: React.FC<RegisterWithVerificationFormProps>
         name: response.name,
         isAdmin: response.isAdmin,
         emailVerified: response.emailVerified,
-        token: response.token
+        token: response.token,
+        refreshToken: response.refresh_token
       });
       
     } catch (error: any) {
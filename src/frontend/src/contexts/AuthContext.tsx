@@ -1,5 +1,5 @@
 import React, { createContext, useContext, useReducer, useEffect } from 'react';
-import { API_BASE_URL, api } from '../services/api';
+import { API_BASE_URL, api, storeTokens } from '../services/api';
 
 export interface User {
   id: string;
@@ -8,6 +8,7 @@ export interface User {
   isAdmin: boolean;
   emailVerified?: boolean;
   token: string;
+  refreshToken?: string;
 }
 
 interface AuthState {
@@ -89,6 +90,7 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
       } catch (error) {
         console.error('Error parsing stored user data:', error);
         localStorage.removeItem('token');
+        localStorage.removeItem('refreshToken');
         localStorage.removeItem('user');
       }
     }
@@ -137,8 +139,8 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
 
       console.log('👤 用户信息:', { id: user.id, email: user.email, name: user.name });
 
-      // Store token and user data
-      localStorage.setItem('token', data.token);
+      // Store tokens and user data
+      storeTokens(data);
       localStorage.setItem('user', JSON.stringify({
         id: user.id,
         email: user.email,
@@ -202,8 +204,8 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
         token: data.token,
       };
 
-      // Store token and user data
-      localStorage.setItem('token', data.token);
+      // Store tokens and user data
+      storeTokens(data);
       localStorage.setItem('user', JSON.stringify({
         id: user.id,
         email: user.email,
@@ -229,7 +231,10 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
   };
 
   const logout = (): void => {
+    // 通知后端吊销刷新令牌（不等待结果）
+    api.logout();
     localStorage.removeItem('token');
+    localStorage.removeItem('refreshToken');
     localStorage.removeItem('user');
     dispatch({ type: 'CLEAR_USER' });
   };
@@ -253,7 +258,7 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
-          'Authorization': `Bearer ${state.user.token}`,
+          'Authorization': `Bearer ${localStorage.getItem('token') || state.user.token}`,
         },
         body: JSON.stringify({
           email: state.user.email,
@@ -268,6 +273,9 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
         throw new Error(data.detail || 'Password change failed');
       }
 
+      // 其他设备的登录已失效，当前设备使用返回的新令牌
+      storeTokens(data);
+
       dispatch({ type: 'SET_LOADING', payload: false });
     } catch (error) {
       dispatch({ type: 'SET_ERROR', payload: error instanceof Error ? error.message : 'Password change failed' });
@@ -281,8 +289,12 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
 
   const updateUser = (user: User): void => {
     dispatch({ type: 'SET_USER', payload: user });
-    localStorage.setItem('user', JSON.stringify(user));
-    localStorage.setItem('token', user.token);
+    const { token, refreshToken, ...profile } = user;
+    localStorage.setItem('user', JSON.stringify(profile));
+    // 只保存新签发的令牌：沿用旧 user 对象时，其中的访问令牌可能已被自动刷新替换
+    if (token !== state.user?.token) {
+      storeTokens({ token, refresh_token: refreshToken });
+    }
   };
 
   // SSO 相关方法
@@ -311,6 +323,7 @@ export const AuthProvider: React.FC<{ children: React.ReactNode }> = ({ children
         isAdmin: response.isAdmin,
         emailVerified: response.emailVerified,
         token: response.token,
+        refreshToken: response.refresh_token,
       };
 
       console.log('👤 创建用户对象:', user);
@@ -22,6 +22,8 @@ export interface SSOTokenVerifyResponse {
   email: string;
   name: string;
   token: string;
+  refresh_token?: string;
+  expires_in?: number;
   isAdmin: boolean;
   emailVerified: boolean;
 }
@@ -45,6 +47,90 @@ function ensureTrailingSlash(url: string): string {
   return url.endsWith('/') ? url : url + '/';
 }
 
+/**
+ * 保存登录/刷新接口返回的访问令牌和刷新令牌
+ */
+export function storeTokens(data: { token?: string; refresh_token?: string }): void {
+  if (data.token) {
+    localStorage.setItem('token', data.token);
+  }
+  if (data.refresh_token) {
+    localStorage.setItem('refreshToken', data.refresh_token);
+  }
+}
+
+let refreshPromise: Promise<boolean> | null = null;
+
+/**
+ * 用刷新令牌换取新的访问令牌（刷新令牌同时轮换）
+ * 并发的 401 共享同一次刷新请求；返回是否已获得可用的新令牌
+ */
+export function refreshAccessToken(): Promise<boolean> {
+  if (!refreshPromise) {
+    refreshPromise = doRefreshAccessToken().finally(() => {
+      refreshPromise = null;
+    });
+  }
+  return refreshPromise;
+}
+
+async function doRefreshAccessToken(): Promise<boolean> {
+  const refreshToken = localStorage.getItem('refreshToken');
+  if (!refreshToken) {
+    return false;
+  }
+
+  try {
+    const baseUrl = API_BASE_URL || 'http://localhost:9000/agent/api';
+    const url = new URL('auth/refresh', ensureTrailingSlash(baseUrl));
+    const response = await fetch(url.toString(), {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ refresh_token: refreshToken }),
+    });
+
+    if (!response.ok) {
+      // 其他标签页可能已用同一个刷新令牌完成了轮换，此时本地存储里已是新令牌
+      return localStorage.getItem('refreshToken') !== refreshToken;
+    }
+
+    storeTokens(await response.json());
+    console.log('🔄 访问令牌已刷新');
+    return true;
+  } catch (error) {
+    console.error('❌ 刷新访问令牌失败:', error);
+    return false;
+  }
+}
+
+/**
+ * 登录态失效 - 自动登出并跳转到登录页
+ */
+export function handleUnauthorized(): void {
+  console.warn('⚠️ 检测到401错误，token可能已过期，自动登出...');
+
+  // 保存当前路径，登录后跳回
+  const currentPath = window.location.pathname + window.location.search;
+  if (currentPath !== '/auth') {
+    localStorage.setItem('redirectAfterLogin', currentPath);
+  }
+
+  // 显示友好提示
+  import('../components/ui/Toast').then(({ toast }) => {
+    toast.warning('登录已过期，正在跳转到登录页...', 2000);
+  });
+
+  // 清除认证信息
+  localStorage.removeItem('token');
+  localStorage.removeItem('refreshToken');
+  localStorage.removeItem('user');
+
+  // 延迟跳转，让用户看到提示
+  setTimeout(() => {
+    window.location.href = '/auth';
+  }, 500);
+}
+
 /**
  * HTTP 请求工具类
  */
@@ -75,30 +161,10 @@ class HttpClient {
   }
 
   /**
-   * 处理401错误 - 自动登出并跳转到登录页
+   * 处理401错误 - 刷新令牌也失效时自动登出并跳转到登录页
    */
   private handleUnauthorized(): void {
-    console.warn('⚠️ 检测到401错误，token可能已过期，自动登出...');
-
-    // 保存当前路径，登录后跳回
-    const currentPath = window.location.pathname + window.location.search;
-    if (currentPath !== '/auth') {
-      localStorage.setItem('redirectAfterLogin', currentPath);
-    }
-
-    // 显示友好提示
-    import('../components/ui/Toast').then(({ toast }) => {
-      toast.warning('登录已过期，正在跳转到登录页...', 2000);
-    });
-
-    // 清除认证信息
-    localStorage.removeItem('token');
-    localStorage.removeItem('user');
-
-    // 延迟跳转，让用户看到提示
-    setTimeout(() => {
-      window.location.href = '/auth';
-    }, 500);
+    handleUnauthorized();
   }
 
   /**
@@ -117,11 +183,17 @@ class HttpClient {
       });
     }
 
-    const response = await fetch(url.toString(), {
+    const doFetch = () => fetch(url.toString(), {
       method: 'GET',
       headers: this.getAuthHeaders(),
     });
 
+    let response = await doFetch();
+    // 访问令牌过期：刷新后重试一次
+    if (response.status === 401 && await refreshAccessToken()) {
+      response = await doFetch();
+    }
+
     if (response.status === 401) {
       this.handleUnauthorized();
       throw new Error('认证已过期，请重新登录');
@@ -143,12 +215,18 @@ class HttpClient {
     const normalizedEndpoint = endpoint.replace(/^\//, '');
     const url = new URL(normalizedEndpoint, ensureTrailingSlash(baseUrl));
 
-    const response = await fetch(url.toString(), {
+    const doFetch = () => fetch(url.toString(), {
       method: 'POST',
       headers: this.getAuthHeaders(),
       body: data ? JSON.stringify(data) : undefined,
     });
 
+    let response = await doFetch();
+    // 访问令牌过期：刷新后重试一次
+    if (response.status === 401 && await refreshAccessToken()) {
+      response = await doFetch();
+    }
+
     if (response.status === 401) {
       this.handleUnauthorized();
       throw new Error('认证已过期，请重新登录');
@@ -301,46 +379,33 @@ export class ChatApiService {
       const url = new URL('chat/stream', ensureTrailingSlash(baseUrl)).toString();
       console.log('📡 请求URL:', url);
       
-      const token = localStorage.getItem('token');
-      const headers: HeadersInit = {
-        'Content-Type': 'application/json',
-      };
-      
-      if (token) {
-        headers['Authorization'] = `Bearer ${token}`;
-      }
-
-      const response = await fetch(url, {
-        method: 'POST',
-        headers: headers,
-        body: JSON.stringify(request),
-      });
-
-      console.log('📥 响应状态:', response.status, response.statusText);
-
-      if (response.status === 401) {
-        console.warn('⚠️ 检测到401错误，token可能已过期，自动登出...');
-
-        // 保存当前路径
-        const currentPath = window.location.pathname + window.location.search;
-        if (currentPath !== '/auth') {
-          localStorage.setItem('redirectAfterLogin', currentPath);
+      const doFetch = () => {
+        const token = localStorage.getItem('token');
+        const headers: HeadersInit = {
+          'Content-Type': 'application/json',
+        };
+        
+        if (token) {
+          headers['Authorization'] = `Bearer ${token}`;
         }
 
-        // 显示友好提示
-        import('../components/ui/Toast').then(({ toast }) => {
-          toast.warning('登录已过期，正在跳转到登录页...', 2000);
+        return fetch(url, {
+          method: 'POST',
+          headers: headers,
+          body: JSON.stringify(request),
         });
+      };
 
-        // 清除认证信息
-        localStorage.removeItem('token');
-        localStorage.removeItem('user');
+      let response = await doFetch();
+      // 访问令牌过期：刷新后重试一次
+      if (response.status === 401 && await refreshAccessToken()) {
+        response = await doFetch();
+      }
 
-        // 延迟跳转
-        setTimeout(() => {
-          window.location.href = '/auth';
-        }, 500);
+      console.log('📥 响应状态:', response.status, response.statusText);
 
+      if (response.status === 401) {
+        handleUnauthorized();
         throw new Error('认证已过期，请重新登录');
       }
 
@@ -469,6 +534,7 @@ export class ApiError extends Error {
 export interface AuthApiService {
   // 邮箱验证
   sendVerificationCode(request: { email: string; purpose: string }): Promise<any>;
+  getEmailStatus(messageId: string): Promise<any>;
   verifyCode(request: { email: string; code: string; purpose: string }): Promise<any>;
   
   // 用户注册和登录
@@ -492,6 +558,7 @@ export interface AuthApiService {
     new_password: string; 
   }): Promise<any>;
   getUserProfile(): Promise<any>;
+  logout(): Promise<void>;
 }
 
 /**
@@ -501,45 +568,33 @@ class AuthApiServiceImpl implements AuthApiService {
   private baseUrl: string = API_BASE_URL;
 
   private async makeRequest(endpoint: string, options: RequestInit = {}): Promise<any> {
-    const token = localStorage.getItem('token');
-    const headers: Record<string, string> = {
-      'Content-Type': 'application/json',
-      ...(options.headers as Record<string, string> || {}),
-    };
-
-    if (token && !endpoint.includes('login') && !endpoint.includes('register')) {
-      headers['Authorization'] = `Bearer ${token}`;
-    }
-
-    const response = await fetch(`${this.baseUrl}${endpoint}`, {
-      ...options,
-      headers,
-    });
-
-    // 处理401错误 - 自动登出
-    if (response.status === 401) {
-      console.warn('⚠️ 检测到401错误，token可能已过期，自动登出...');
+    const sendsToken = !endpoint.includes('login') && !endpoint.includes('register');
+    const doFetch = () => {
+      const token = localStorage.getItem('token');
+      const headers: Record<string, string> = {
+        'Content-Type': 'application/json',
+        ...(options.headers as Record<string, string> || {}),
+      };
 
-      // 保存当前路径
-      const currentPath = window.location.pathname + window.location.search;
-      if (currentPath !== '/auth') {
-        localStorage.setItem('redirectAfterLogin', currentPath);
+      if (token && sendsToken) {
+        headers['Authorization'] = `Bearer ${token}`;
       }
 
-      // 显示友好提示
-      import('../components/ui/Toast').then(({ toast }) => {
-        toast.warning('登录已过期，正在跳转到登录页...', 2000);
+      return fetch(`${this.baseUrl}${endpoint}`, {
+        ...options,
+        headers,
       });
+    };
 
-      // 清除认证信息
-      localStorage.removeItem('token');
-      localStorage.removeItem('user');
-
-      // 延迟跳转
-      setTimeout(() => {
-        window.location.href = '/auth';
-      }, 500);
+    let response = await doFetch();
+    // 访问令牌过期：刷新后重试一次
+    if (response.status === 401 && sendsToken && localStorage.getItem('token') && await refreshAccessToken()) {
+      response = await doFetch();
+    }
 
+    // 处理401错误 - 自动登出
+    if (response.status === 401) {
+      handleUnauthorized();
       throw new Error('认证已过期，请重新登录');
     }
 
@@ -558,6 +613,12 @@ class AuthApiServiceImpl implements AuthApiService {
     });
   }
 
+  async getEmailStatus(messageId: string): Promise<any> {
+    return this.makeRequest(`/auth/email-status/${encodeURIComponent(messageId)}`, {
+      method: 'GET',
+    });
+  }
+
   async verifyCode(request: { email: string; code: string; purpose: string }): Promise<any> {
     return this.makeRequest('/auth/verify-code', {
       method: 'POST',
@@ -600,10 +661,13 @@ class AuthApiServiceImpl implements AuthApiService {
     current_password: string; 
     new_password: string; 
   }): Promise<any> {
-    return this.makeRequest('/auth/change-password', {
+    const result = await this.makeRequest('/auth/change-password', {
       method: 'POST',
       body: JSON.stringify(request),
     });
+    // 修改密码会使其他设备的登录失效，当前设备使用返回的新令牌
+    storeTokens(result);
+    return result;
   }
 
   async getUserProfile(): Promise<any> {
@@ -612,6 +676,21 @@ class AuthApiServiceImpl implements AuthApiService {
     });
   }
 
+  async logout(): Promise<void> {
+    const refreshToken = localStorage.getItem('refreshToken');
+    const token = localStorage.getItem('token');
+    const headers: Record<string, string> = { 'Content-Type': 'application/json' };
+    if (token) {
+      headers['Authorization'] = `Bearer ${token}`;
+    }
+    // 吊销刷新令牌；失败不影响本地登出
+    await fetch(`${this.baseUrl}/auth/logout`, {
+      method: 'POST',
+      headers,
+      body: JSON.stringify({ refresh_token: refreshToken }),
+    }).catch(() => undefined);
+  }
+
   // SSO 相关方法
   async verifySSOToken(ssoToken: string): Promise<SSOTokenVerifyResponse> {
     console.log('=' + '='.repeat(40));
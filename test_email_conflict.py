@@ -22,6 +22,7 @@ except ImportError as e:
 async def test_email_conflict():
     """测试邮箱冲突检查"""
     print("🧪 测试邮箱冲突检查逻辑...")
+    email_service = None
     
     try:
         # 初始化数据库连接
@@ -80,7 +81,9 @@ async def test_email_conflict():
                 purpose="register"
             )
             if result["success"]:
-                print("   ✅ 验证码发送成功")
+                # 邮件在后台队列中发送，等待投递结果
+                delivery = await email_service.outbox.wait(result["message_id"], timeout=60)
+                print(f"   ✅ 验证码已入队，投递状态: {delivery['status'] if delivery else '未知'}")
             else:
                 print(f"   ❌ 验证码发送失败: {result.get('message', '未知错误')}")
         
@@ -89,6 +92,8 @@ async def test_email_conflict():
         import traceback
         traceback.print_exc()
     finally:
+        if email_service is not None:
+            await email_service.close()
         try:
             await db_manager.close()
             print("\n✅ 数据库连接已关闭")
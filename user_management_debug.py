@@ -8,7 +8,7 @@ import sys
 import os
 import asyncio
 from datetime import datetime, timezone
-from typing import List, Dict, Optional
+from typing import AsyncIterator, Dict, Optional
 
 # 添加后端路径
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src', 'backend'))
@@ -20,6 +20,9 @@ except ImportError as e:
     print("请确保在 MatterAI_Agent 项目根目录运行此脚本")
     sys.exit(1)
 
+# 查看所有用户时每页显示的数量
+LIST_PAGE_SIZE = 20
+
 class UserManager:
     """用户管理类"""
     
@@ -55,35 +58,18 @@ class UserManager:
             print(f"❌ 数据库连接失败: {e}")
             return False
     
-    async def list_all_users(self) -> List[Dict]:
-        """获取所有用户列表"""
-        query = """
-        SELECT id, name, email, is_admin, email_verified, verification_email, created_at, updated_at
-        FROM users 
-        ORDER BY created_at DESC;
-        """
-        
+    async def list_all_users(self, **filters) -> AsyncIterator[Dict]:
+        """逐页获取所有用户（按注册时间倒序），内存占用与用户数无关"""
+        async for user in self.db.iter_users(**filters):
+            yield self._normalize_user_fields(user)
+    
+    async def count_users(self) -> int:
+        """用户总数"""
         try:
-            async with self.db.pool.acquire() as connection:
-                results = await connection.fetch(query)
-                
-                users = []
-                for row in results:
-                    users.append({
-                        "id": str(row['id']),
-                        "name": row['name'],
-                        "email": row['email'],
-                        "is_admin": row['is_admin'],
-                        "email_verified": row['email_verified'],
-                        "verification_email": row['verification_email'],
-                        "created_at": row['created_at'],
-                        "updated_at": row['updated_at']
-                    })
-                
-                return users
+            return await self.db.count_users()
         except Exception as e:
-            print(f"❌ 获取用户列表失败: {e}")
-            return []
+            print(f"❌ 获取用户数量失败: {e}")
+            return 0
     
     async def get_user_by_email(self, email: str) -> Optional[Dict]:
         """根据邮箱获取用户信息"""
@@ -125,11 +111,11 @@ class UserManager:
     
     async def delete_user_by_email(self, email: str) -> bool:
         """根据邮箱删除用户"""
-        query = "DELETE FROM users WHERE email = $1"
+        query = "DELETE FROM users WHERE lower(email) = $1"
         
         try:
             async with self.db.pool.acquire() as connection:
-                result = await connection.execute(query, email.lower())
+                result = await connection.execute(query, email.strip().lower())
                 return result != "DELETE 0"
         except Exception as e:
             print(f"❌ 删除用户失败: {e}")
@@ -241,17 +227,25 @@ async def interactive_menu(user_manager: UserManager):
 async def list_users_action(user_manager: UserManager):
     """显示所有用户"""
     print("\n🔍 获取用户列表...")
-    users = await user_manager.list_all_users()
+    total = await user_manager.count_users()
     
-    if not users:
+    if not total:
         print("📭 暂无用户")
         return
     
-    print(f"\n📊 共找到 {len(users)} 个用户:")
+    print(f"\n📊 共找到 {total} 个用户:")
     print("-" * 60)
     
-    for i, user in enumerate(users):
-        print(format_user_info(user, i))
+    i = 0
+    try:
+        async for user in user_manager.list_all_users():
+            if i and i % LIST_PAGE_SIZE == 0:
+                if input(f"\n--- 已显示 {i}/{total}，回车继续，q 返回菜单: ").strip().lower() == "q":
+                    break
+            print(format_user_info(user, i))
+            i += 1
+    except Exception as e:
+        print(f"❌ 获取用户列表失败: {e}")
     
     print("-" * 60)
 
@@ -404,8 +398,7 @@ async def main():
     
     try:
         # 显示基本信息
-        users = await user_manager.list_all_users()
-        print(f"📊 数据库中共有 {len(users)} 个用户")
+        print(f"📊 数据库中共有 {await user_manager.count_users()} 个用户")
         
         # 启动交互菜单
         await interactive_menu(user_manager)